@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,6 +50,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # Added below middleware
     "corsheaders.middleware.CorsMiddleware",
+    # Compresses what every later middleware produced
+    "trip_api.middleware.CompressionMiddleware",
 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -70,6 +73,11 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 ]
 
+# Let the frontend revalidate trip plans (If-None-Match -> 304) and read
+# the ETag and Server-Timing response headers cross-origin
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag", "Server-Timing"]
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -97,6 +105,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # The ORS caches are written from concurrent request threads; take the
+        # write lock up front instead of failing on a read->write upgrade
+        # (transaction_mode needs Django 5.1, see requirements.txt).
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
     }
 }
 
@@ -144,4 +159,124 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 load_dotenv()
-ORS_API_KEY = os.getenv("ORS_API_KEY")
\ No newline at end of file
+ORS_API_KEY = os.getenv("ORS_API_KEY")
+# Point at a local stand-in (python manage.py ors_stub) for offline perf tests and CI
+ORS_BASE_URL = os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org").rstrip("/")
+
+# Geocode cache (trip_api/cache.py): entries expire after the TTL and the
+# least recently used rows are evicted once the table exceeds MAX_ENTRIES.
+GEOCODE_CACHE_TTL_SECONDS = int(os.getenv("GEOCODE_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", 5000))
+
+# Route cache (trip_api/cache.py): waypoints are snapped to a grid of
+# ROUTE_CACHE_GRID_DEGREES before keying. A TTL of 0 disables expiry.
+ROUTE_CACHE_GRID_DEGREES = float(os.getenv("ROUTE_CACHE_GRID_DEGREES", 0.0001))
+ROUTE_CACHE_TTL_SECONDS = int(os.getenv("ROUTE_CACHE_TTL_SECONDS", 0))
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", 2000))
+
+# Upstream calls for a trip plan run on a bounded thread pool
+# (trip_api/concurrency.py); each call must finish within the timeout.
+TRIP_PLAN_MAX_WORKERS = int(os.getenv("TRIP_PLAN_MAX_WORKERS", 8))
+TRIP_PLAN_CALL_TIMEOUT_SECONDS = float(os.getenv("TRIP_PLAN_CALL_TIMEOUT_SECONDS", 20))
+# Batches (TripPlanBatchView) fan out on a pool of their own, so a large
+# batch can't take every thread from interactive plans.
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", 4))
+
+# ORS HTTP transport (trip_api/transport.py). The keep-alive pool matches the
+# request and batch thread pools so concurrent calls never wait for a connection.
+ORS_POOL_SIZE = int(os.getenv("ORS_POOL_SIZE", TRIP_PLAN_MAX_WORKERS + BATCH_MAX_WORKERS))
+ORS_CONNECT_TIMEOUT_SECONDS = float(os.getenv("ORS_CONNECT_TIMEOUT_SECONDS", 3.05))
+ORS_READ_TIMEOUT_SECONDS = float(os.getenv("ORS_READ_TIMEOUT_SECONDS", 15))
+ORS_MAX_RETRIES = int(os.getenv("ORS_MAX_RETRIES", 2))
+ORS_BACKOFF_BASE_SECONDS = float(os.getenv("ORS_BACKOFF_BASE_SECONDS", 0.25))
+ORS_BACKOFF_MAX_SECONDS = float(os.getenv("ORS_BACKOFF_MAX_SECONDS", 2))
+ORS_BREAKER_THRESHOLD = int(os.getenv("ORS_BREAKER_THRESHOLD", 5))
+ORS_BREAKER_COOLDOWN_SECONDS = float(os.getenv("ORS_BREAKER_COOLDOWN_SECONDS", 30))
+# Open a keep-alive connection to ORS_BASE_URL in the background when a server
+# process starts (trip_api/startup.py), so the first plan doesn't wait on DNS,
+# TCP and TLS. On by default in the slim serverless profile
+# (backend/settings_slim.py); leave it off with a preloading server, whose
+# forked workers would share the socket.
+ORS_PREWARM = os.getenv("ORS_PREWARM", "False") == "True"
+
+# /api/trip-plan/async/ (trip_api/async_views.py), served when aiohttp is
+# installed unless this is False. Its connection pool (trip_api/async_transport.py)
+# is sized for hundreds of in-flight plans under ASGI.
+TRIP_PLAN_ASYNC_ENDPOINT = os.getenv("TRIP_PLAN_ASYNC_ENDPOINT", "True") == "True"
+ORS_ASYNC_POOL_SIZE = int(os.getenv("ORS_ASYNC_POOL_SIZE", 200))
+# Threads serving the ORM-backed caches for the async path. 1 suits SQLite,
+# which only allows one writer at a time; raise it on a client-server database.
+ASYNC_CACHE_THREADS = int(os.getenv("ASYNC_CACHE_THREADS", 1))
+
+# HOS schedule cache (trip_api/eld_logs.py ScheduleCache): per-process LRU
+# of simulated schedules keyed on route distance, average speed and cycle
+# used, so repeat lanes skip the simulation at any start time. Non-zero
+# quanta round the key (and the simulated inputs) to share one schedule
+# across nearly identical routes. 0 entries disables the cache.
+SCHEDULE_CACHE_MAX_ENTRIES = int(os.getenv("SCHEDULE_CACHE_MAX_ENTRIES", 2048))
+SCHEDULE_CACHE_DISTANCE_METERS = float(os.getenv("SCHEDULE_CACHE_DISTANCE_METERS", 0))
+SCHEDULE_CACHE_SPEED_MPS = float(os.getenv("SCHEDULE_CACHE_SPEED_MPS", 0))
+SCHEDULE_CACHE_CYCLE_HOURS = float(os.getenv("SCHEDULE_CACHE_CYCLE_HOURS", 0))
+
+# Geocoding backend (trip_api/geocoding.py): "ors" or "local", which looks
+# addresses up in the place gazetteer at GAZETTEER_PATH (see
+# trip_api/gazetteer.py) and falls back to ORS for anything it doesn't match,
+# unless GEOCODING_ORS_FALLBACK is False.
+GEOCODING_BACKEND = os.getenv("GEOCODING_BACKEND", "ors")
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", str(BASE_DIR / "trip_api" / "data" / "gazetteer_sample.csv"))
+GEOCODING_ORS_FALLBACK = os.getenv("GEOCODING_ORS_FALLBACK", "True") == "True"
+
+# Routing backend (trip_api/routing.py): "ors" or "local", which routes on
+# the road graph at ROAD_GRAPH_PATH (see trip_api/road_graph.py) and falls
+# back to ORS when a waypoint is more than ROAD_GRAPH_MAX_SNAP_METERS from
+# the graph or has no connecting road, unless ROUTING_ORS_FALLBACK is False.
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "ors")
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", str(BASE_DIR / "trip_api" / "data" / "road_graph_sample.json"))
+ROAD_GRAPH_MAX_SNAP_METERS = float(os.getenv("ROAD_GRAPH_MAX_SNAP_METERS", 5000))
+ROUTING_ORS_FALLBACK = os.getenv("ROUTING_ORS_FALLBACK", "True") == "True"
+
+# Planned stop placement (trip_api/poi.py): with STOP_SNAPPING on, fuel and
+# rest stops move to the nearest fuel station, truck stop or rest area in
+# the POI file at POI_PATH that is within POI_SNAP_MILES of where the
+# simulator put them. The index is loaded when a server process starts.
+STOP_SNAPPING = os.getenv("STOP_SNAPPING", "False") == "True"
+POI_PATH = os.getenv("POI_PATH", str(BASE_DIR / "trip_api" / "data" / "poi_sample.csv"))
+POI_SNAP_MILES = float(os.getenv("POI_SNAP_MILES", 5))
+
+# Default map detail level for trip-plan leg geometries
+# ("full", "high", "medium" or "low", see trip_api/geometry.py)
+ROUTE_DEFAULT_DETAIL = os.getenv("ROUTE_DEFAULT_DETAIL", "full")
+# Decimal places kept in plan coordinates (JSON leg geometries, stop and
+# geocoded points). 5 is about a meter and the precision of ORS geometries;
+# -1 keeps them unrounded.
+ROUTE_COORD_DECIMALS = int(os.getenv("ROUTE_COORD_DECIMALS", 5))
+
+# Trip-plan response compression (trip_api/middleware.py): bodies of at
+# least COMPRESSION_MIN_BYTES are sent brotli- or gzip-encoded, whichever the
+# client accepts (brotli needs requirements-speedups.txt).
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 5))
+
+# Batch trip planning (TripPlanBatchView). Simulations run on a process pool
+# of BATCH_SIMULATION_PROCESSES workers; 0 runs them inline.
+BATCH_MAX_TRIPS = int(os.getenv("BATCH_MAX_TRIPS", 500))
+BATCH_TIMEOUT_SECONDS = float(os.getenv("BATCH_TIMEOUT_SECONDS", 120))
+BATCH_SIMULATION_PROCESSES = int(os.getenv("BATCH_SIMULATION_PROCESSES", min(4, os.cpu_count() or 1)))
+
+# Re-planning (TripReplanView). The plan is sent back by the client, so it
+# is bounded before anything is simulated: trips of at most REPLAN_MAX_MILES
+# and REPLAN_MAX_HOURS of driving, at most REPLAN_MAX_UPDATES updates, and
+# delays adding up to at most REPLAN_MAX_DELAY_HOURS, the most an update's
+# time may also be past the planned dropoff.
+REPLAN_MAX_MILES = float(os.getenv("REPLAN_MAX_MILES", 10000))
+REPLAN_MAX_HOURS = float(os.getenv("REPLAN_MAX_HOURS", 500))
+REPLAN_MAX_UPDATES = int(os.getenv("REPLAN_MAX_UPDATES", 200))
+REPLAN_MAX_DELAY_HOURS = float(os.getenv("REPLAN_MAX_DELAY_HOURS", 168))
+
+# Trip plan cache (trip_api/cache.py): whole TripPlanView responses keyed on
+# the normalized inputs and the start time, which is floored to
+# PLAN_CACHE_GRANULARITY_MINUTES so requests within one window share a plan
+# (and an ETag). 0 disables the cache and simulates from the exact time.
+PLAN_CACHE_GRANULARITY_MINUTES = int(os.getenv("PLAN_CACHE_GRANULARITY_MINUTES", 15))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", 1000))
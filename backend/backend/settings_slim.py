@@ -0,0 +1,58 @@
+"""
+Slim runtime profile for serverless deployments (vercel.json), where every
+cold start is paid by a user's request.
+
+The trip-plan API is stateless: no admin, logins, sessions or messages.
+This profile keeps only the apps and middleware trip_api needs,
+routes without the admin, leaves out the async endpoint (aiohttp is a tenth
+of a second to import and nothing under WSGI awaits it), runs batch
+simulations without a process pool and opens the ORS connection while the
+first request is still being set up. backend/wsgi.py selects it on Vercel;
+elsewhere set DJANGO_SETTINGS_MODULE=backend.settings_slim.
+benchmarks/bench_cold_start.py compares it with the full profile.
+"""
+import os
+
+from backend.settings import *  # noqa: F401,F403
+
+
+INSTALLED_APPS = [
+    'rest_framework',
+    "corsheaders",
+    'trip_api',
+]
+
+MIDDLEWARE = [
+    "corsheaders.middleware.CorsMiddleware",
+    "trip_api.middleware.CompressionMiddleware",
+    'django.middleware.security.SecurityMiddleware',
+    "django.middleware.common.CommonMiddleware",
+]
+
+ROOT_URLCONF = 'backend.urls_slim'
+
+# Only the browsable API renders templates; without auth and messages
+# there is nothing for their context processors to add
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': ['django.template.context_processors.request'],
+        },
+    },
+]
+
+# Without django.contrib.auth: no authentication, request.user is None
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+    "DEFAULT_PERMISSION_CLASSES": [],
+    "UNAUTHENTICATED_USER": None,
+}
+
+TRIP_PLAN_ASYNC_ENDPOINT = os.getenv("TRIP_PLAN_ASYNC_ENDPOINT", "False") == "True"
+ORS_PREWARM = os.getenv("ORS_PREWARM", "True") == "True"
+# Batches simulate in-process: a function instance has a core or two, no
+# /dev/shm for a process pool's semaphores on AWS Lambda, and would pay
+# the forkserver start on its first batch
+BATCH_SIMULATION_PROCESSES = int(os.getenv("BATCH_SIMULATION_PROCESSES", 0))
@@ -0,0 +1,6 @@
+"""URL configuration for the slim profile (backend/settings_slim.py): the API only, no admin."""
+from django.urls import path, include
+
+urlpatterns = [
+    path("api/", include("trip_api.urls")),
+]
@@ -11,7 +11,15 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Vercel (which sets VERCEL=1) runs the slim serverless profile,
+# backend/settings_slim.py; everywhere else the full one
+os.environ.setdefault(
+    'DJANGO_SETTINGS_MODULE', 'backend.settings_slim' if os.environ.get('VERCEL') else 'backend.settings',
+)
 
 application = get_wsgi_application()
+
+from trip_api.startup import warm_up  # noqa: E402
+
+warm_up()
 app = application
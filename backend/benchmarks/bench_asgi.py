@@ -0,0 +1,180 @@
+"""
+Trip-plan throughput with one server process: the sync view under gunicorn
+(WSGI, gthread workers) against the async view under uvicorn (ASGI).
+
+ORS is replaced by the local stand-in (manage.py ors_stub) with a fixed
+latency per call, and every request uses fresh addresses so each plan
+really waits on three geocodes and one directions call. Requires
+requirements-async.txt. Run from backend/:
+    python -m benchmarks.bench_asgi
+    python -m benchmarks.bench_asgi --latency-ms 500 --concurrency 400 --requests 2000
+
+Reference run: a single shared CPU core running the load generator, the
+stand-in and the server, SQLite caches, 200 clients in flight:
+
+    ORS latency  server                   plans/s  p50 ms  p99 ms  errors
+    200 ms       wsgi-gunicorn (8 thr)       10.8   18069   19618       0
+                 asgi-uvicorn-sync-view      10.8   18182   19246       0
+                 asgi-uvicorn                16.8   11795   12669       0
+    1000 ms      wsgi-gunicorn (8 thr)        2.6   76735   77285       0
+                 asgi-uvicorn-sync-view       9.4   21032   21507     308
+                 asgi-uvicorn                14.9   12647   14547       0
+
+The thread-bound WSGI worker tops out at threads / (time per plan on ORS),
+so its throughput falls as ORS gets slower; the async view keeps ~200
+plans in flight and is bounded by CPU and the SQLite cache writes instead
+(errors on the sync view under ASGI are TRIP_PLAN_CALL_TIMEOUT_SECONDS
+timeouts while it queues for threads and the database lock).
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import aiohttp
+
+
+SERVERS = {
+    # name: (command, path)
+    "wsgi-gunicorn": (
+        lambda port, threads: [
+            "gunicorn", "backend.wsgi:application", "--workers", "1", "--worker-class", "gthread",
+            "--threads", str(threads), "--bind", f"127.0.0.1:{port}", "--log-level", "warning",
+        ],
+        "/api/trip-plan/",
+    ),
+    "asgi-uvicorn-sync-view": (
+        lambda port, threads: [
+            "uvicorn", "backend.asgi:application", "--workers", "1", "--port", str(port),
+            "--no-access-log", "--log-level", "warning",
+        ],
+        "/api/trip-plan/",
+    ),
+    "asgi-uvicorn": (
+        lambda port, threads: [
+            "uvicorn", "backend.asgi:application", "--workers", "1", "--port", str(port),
+            "--no-access-log", "--log-level", "warning",
+        ],
+        "/api/trip-plan/async/",
+    ),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port}")
+
+
+def trip(run, i):
+    return {
+        "currentLocation": f"Origin {run} {i}",
+        "pickupLocation": f"Pickup {run} {i}",
+        "dropoffLocation": f"Dropoff {run} {i}",
+        "cycleUsed": 12,
+        "detail": "medium",
+    }
+
+
+async def load(url, total, concurrency):
+    run = uuid.uuid4().hex[:8]
+    latencies = []
+    errors = 0
+    queue = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        async def worker():
+            nonlocal errors
+            for i in queue:
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=trip(run, i)) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "plans_per_second": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=int, default=200, help="stand-in latency per ORS call")
+    parser.add_argument("--concurrency", type=int, default=200, help="plans in flight at once")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn gthread threads")
+    parser.add_argument("--only", choices=sorted(SERVERS))
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="trip_api_bench_")
+    stub_port = free_port()
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "benchmarks.bench_settings",
+        "BENCH_DATABASE": os.path.join(tmp, "db.sqlite3"),
+        "ORS_BASE_URL": f"http://127.0.0.1:{stub_port}",
+    }
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--skip-checks", "--verbosity", "0"],
+        env=env, check=True,
+    )
+    stub = subprocess.Popen(
+        [sys.executable, "manage.py", "ors_stub", "--port", str(stub_port), "--latency-ms", str(args.latency_ms)],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+    print(f"ORS latency {args.latency_ms} ms, {args.concurrency} concurrent clients, "
+          f"{args.requests} plans, gunicorn threads {args.threads}")
+    print(f"{'server':<24} {'plans/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    try:
+        wait_for_port(stub_port)
+        for name, (command, path) in SERVERS.items():
+            if args.only and name != args.only:
+                continue
+            port = free_port()
+            server = subprocess.Popen(command(port, args.threads), env=env)
+            try:
+                wait_for_port(port)
+                url = f"http://127.0.0.1:{port}{path}"
+                asyncio.run(load(url, min(args.concurrency, 20), min(args.concurrency, 20)))  # warm up
+                result = asyncio.run(load(url, args.requests, args.concurrency))
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{name:<24} {result['plans_per_second']:>8.1f} {result['p50_ms']:>8.0f} "
+                  f"{result['p99_ms']:>8.0f} {result['errors']:>7}")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Serverless cold start: how long a fresh process takes to boot the WSGI
+application and to answer its first trip plan, for each settings profile.
+
+    full    backend.settings, admin, auth, sessions, messages and the
+            full middleware stack
+    slim    backend.settings_slim, what vercel.json deploys: trip_api
+            only, no async endpoint, batches simulated in-process, ORS
+            connection pre-warmed
+
+Every run is a new interpreter that imports backend.wsgi (boot), then
+calls the application directly for a trip plan with fresh addresses
+(first request, which also loads the URLconf and views, connects to the
+database and waits on ORS) and once more (second request, already warm).
+ORS is the local stand-in (manage.py ors_stub). Run from backend/:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --runs 20 --latency-ms 100
+
+Reference run (Python 3.11, one shared core, SQLite, stand-in with no
+added latency), median of 10 runs:
+
+    profile  process ms  boot ms  first ms  second ms  modules
+    full            628      271       171       35.4      841
+    slim            467      239        65       42.1      757
+
+Before the slim profile, when trip_api.metrics imported aiohttp eagerly,
+the full profile booted in 402 ms (923 modules); that import now happens
+only if the async endpoint is routed, on the first request. The pre-warmed
+connection saves nothing against a stand-in on localhost; against the real
+API it takes the DNS lookup and TLS handshake off the first plan.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from wsgiref.util import setup_testing_defaults
+
+
+PROFILES = {
+    "full": "benchmarks.bench_settings",
+    "slim": "benchmarks.bench_settings_slim",
+}
+PATH = "/api/trip-plan/"
+
+
+def trip(run, i):
+    # Not bench_asgi.trip: importing that module loads aiohttp into the child
+    return {
+        "currentLocation": f"Origin {run} {i}",
+        "pickupLocation": f"Pickup {run} {i}",
+        "dropoffLocation": f"Dropoff {run} {i}",
+        "cycleUsed": 12,
+    }
+
+
+def call(application, path, data):
+    """Status and body of a POST to the WSGI application, without a server."""
+    body = json.dumps(data).encode()
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": path,
+        "HTTP_HOST": "localhost",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    status = []
+    result = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        content = b"".join(result)
+    finally:
+        getattr(result, "close", lambda: None)()
+    return status[0], content
+
+
+def child():
+    """One cold start, reported as a JSON line on stdout."""
+    started = time.perf_counter()
+    from backend.wsgi import application
+    booted = time.perf_counter()
+    modules = len(sys.modules)
+
+    run = uuid.uuid4().hex[:8]
+    timings = []
+    for i in range(2):
+        request_started = time.perf_counter()
+        status, content = call(application, PATH, trip(run, i))
+        timings.append(time.perf_counter() - request_started)
+        if not status.startswith("200"):
+            raise SystemExit(f"{status}: {content[:200]!r}")
+
+    print(json.dumps({
+        "boot_ms": (booted - started) * 1000,
+        "first_ms": timings[0] * 1000,
+        "second_ms": timings[1] * 1000,
+        "modules": modules,
+    }))
+
+
+def cold_start(env, settings_module):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child"],
+        env={**env, "DJANGO_SETTINGS_MODULE": settings_module},
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return {**json.loads(output.splitlines()[-1]), "process_ms": (time.perf_counter() - started) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10, help="cold starts per profile")
+    parser.add_argument("--latency-ms", type=int, default=0, help="stand-in latency per ORS call")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+    from benchmarks.bench_asgi import free_port, wait_for_port
+
+    tmp = tempfile.mkdtemp(prefix="trip_api_bench_")
+    stub_port = free_port()
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": PROFILES["full"],
+        "BENCH_DATABASE": os.path.join(tmp, "db.sqlite3"),
+        "ORS_BASE_URL": f"http://127.0.0.1:{stub_port}",
+    }
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--skip-checks", "--verbosity", "0"],
+        env=env, check=True,
+    )
+    stub = subprocess.Popen(
+        [sys.executable, "manage.py", "ors_stub", "--port", str(stub_port), "--latency-ms", str(args.latency_ms)],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+    print(f"ORS latency {args.latency_ms} ms, median of {args.runs} cold starts")
+    print(f"{'profile':<8} {'process ms':>10} {'boot ms':>8} {'first ms':>9} {'second ms':>10} {'modules':>8}")
+    try:
+        wait_for_port(stub_port)
+        for name, settings_module in PROFILES.items():
+            runs = [cold_start(env, settings_module) for _ in range(args.runs)]
+            median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            print(f"{name:<8} {median['process_ms']:>10.0f} {median['boot_ms']:>8.0f} {median['first_ms']:>9.0f} "
+                  f"{median['second_ms']:>10.1f} {median['modules']:>8.0f}")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Fleet what-if sweep: vectorized simulate_fleet vs one scalar call per scenario.
+
+Sweeps cycle used 0..70 h and start times across a week for a set of lanes.
+Requires numpy (requirements-fleet.txt). Run from backend/:
+    python -m benchmarks.bench_fleet_sim
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+
+from trip_api.eld_logs import _simulate_events
+from trip_api.fleet_sim import simulate_fleet
+
+
+MILES = 1609.34
+LANES = [(180, 45), (650, 55), (1200, 58), (2100, 60), (2800, 61)]  # miles, mph
+
+
+def scenarios(count):
+    week = datetime(2025, 3, 3)
+    rng = np.random.default_rng(7)
+    lane = rng.integers(0, len(LANES), count)
+    miles = np.array([LANES[i][0] for i in lane], dtype=float)
+    mph = np.array([LANES[i][1] for i in lane], dtype=float)
+    cycle_used = rng.uniform(0, 70, count)
+    start = np.datetime64(week, "us") + rng.integers(0, 7 * 24 * 60, count).astype("timedelta64[m]")
+    return miles * MILES, miles / mph * 3600, cycle_used, start
+
+
+def main():
+    print(f"{'scenarios':>9} {'scalar s':>9} {'vector s':>9} {'speedup':>8} {'scenarios/s':>12}")
+    for count in (1_000, 10_000, 50_000):
+        distance, duration, cycle_used, start = scenarios(count)
+
+        t0 = time.perf_counter()
+        for i in range(count):
+            _simulate_events(distance[i], duration[i], cycle_used[i])
+        scalar = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        fleet = simulate_fleet(distance, duration, cycle_used, start)
+        vector = time.perf_counter() - t0
+
+        print(f"{count:>9} {scalar:>9.3f} {vector:>9.3f} {scalar / vector:>7.1f}x {count / vector:>12.0f}")
+
+    print(f"days per trip: {np.bincount(fleet['days']).nonzero()[0].tolist()}, "
+          f"restarts: {int(fleet['cycle_restarts'].sum())}, "
+          f"30m breaks: {int(fleet['rest_30m_stops'].sum())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Local gazetteer geocoder: load time, memory and lookup latency for a
+US-wide place list.
+
+The list is synthetic but shaped like the Census Bureau's national places
+gazetteer (~32k incorporated places and CDPs across 50 states, DC and PR,
+with many shared and multi-word names), written to a temporary CSV and
+loaded through the same path as GAZETTEER_PATH. Pass --gazetteer to measure
+a real file instead. Run from backend/:
+    python -m benchmarks.bench_gazetteer
+    python -m benchmarks.bench_gazetteer --gazetteer 2023_Gaz_place_national.txt
+
+Reference run (Python 3.11, one shared core), 32,000 places:
+
+    load        0.7-1.0 s  index 27 MB (tracemalloc)
+    exact       ~5 us      "Name, ST"
+    name only   ~4 us      "Name"
+    prefix      ~60 us     "Nam, ST", last word cut short
+    typo        ~60 us     two letters swapped in the name
+    miss        ~11 us     street address, left to ORS
+
+against ~50-300 ms for an ORS geocode round trip. The synthetic names
+share far fewer distinct tokens (5.4k) than real ones, which makes its
+posting lists longer and the prefix and typo paths slower than on the
+Census file.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+django.setup()
+
+from trip_api.gazetteer import STATES, Gazetteer, read_places  # noqa: E402
+
+
+SYLLABLES = ["ash", "bel", "bur", "can", "clay", "dal", "el", "fair", "glen", "har", "hol", "king",
+             "lan", "lin", "mar", "mil", "mont", "new", "oak", "pine", "red", "ros", "sal", "sum",
+             "ton", "ver", "wal", "wes", "wood", "york", "ber", "char", "dun", "field", "ham"]
+SUFFIXES = ["", "", "", "ville", "ton", "burg", "field", "wood", "dale", " City", " Springs",
+            " Heights", " Falls", " Lake", " Park", " Beach"]
+PREFIXES = ["", "", "", "", "", "", "North ", "South ", "East ", "West ", "New ", "Fort ", "Mount ",
+            "Saint ", "Lake "]
+
+
+def synthetic_places(count=32_000, seed=0):
+    rng = random.Random(seed)
+    states = sorted(set(STATES.values()))
+    names = []
+    # Common names recur across states, like Springfield or Franklin
+    while len(names) < count // 3:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.choice((1, 2, 2, 3))))
+        names.append((rng.choice(PREFIXES) + stem + rng.choice(SUFFIXES)).title())
+    for _ in range(count):
+        yield (
+            rng.choice(names), rng.choice(states).upper(),
+            round(rng.uniform(25, 49), 6), round(rng.uniform(-124, -67), 6),
+            int(rng.paretovariate(1.2) * 500),
+        )
+
+
+def typo(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def per_call(fn, queries, repeats=5):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for query in queries:
+            fn(query)
+        best = min(best, (time.perf_counter() - started) / len(queries))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--gazetteer", help="gazetteer file to load instead of the synthetic list")
+    parser.add_argument("--places", type=int, default=32_000)
+    args = parser.parse_args()
+
+    path = args.gazetteer
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".csv", prefix="gazetteer_")
+        with os.fdopen(fd, "w") as f:
+            f.write("name,state,lat,lng,population\n")
+            for place in synthetic_places(args.places):
+                f.write(",".join(map(str, place)) + "\n")
+
+    try:
+        started = time.perf_counter()
+        Gazetteer.load(path)
+        load = time.perf_counter() - started
+        tracemalloc.start()
+        gazetteer = Gazetteer.load(path)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        places = list(read_places(path))
+    finally:
+        if args.gazetteer is None:
+            os.remove(path)
+
+    rng = random.Random(1)
+    sample = [rng.choice(places) for _ in range(2000)]
+    longest = [max(name.split(), key=len) for name, *_ in sample]
+    queries = {
+        "exact": [f"{name}, {state}" for name, state, *_ in sample],
+        "name only": [name for name, *_ in sample],
+        "prefix": [f"{name[:len(name) - min(3, len(name.split()[-1]) - 3)]}, {state}" for name, state, *_ in sample],
+        "typo": [
+            f"{name.replace(word, typo(word, rng))}, {state}" if len(word) >= 4 else f"{name}, {state}"
+            for (name, state, *_), word in zip(sample, longest)
+        ],
+        "miss": [f"{rng.randrange(100, 9999)} Main St, {state} {rng.randrange(10000, 99999)}" for _, state, *_ in sample],
+    }
+
+    print(f"{len(gazetteer)} places, {len(gazetteer.vocabulary)} tokens")
+    print(f"load {load:.2f} s, index {memory / 1e6:.0f} MB")
+    for kind, batch in queries.items():
+        hits = sum(gazetteer.search(q) is not None for q in batch)
+        print(f"{kind:<10} {per_call(gazetteer.search, batch) * 1e6:>8.1f} us  {hits / len(batch):>6.1%} matched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Trip-plan response cost: render time and bytes on the wire, before and
+after the orjson renderer, coordinate rounding and compression.
+
+Each plan is a 2800 mile trip whose legs have the given number of vertices
+(full detail, "json" geometry format) with full-precision coordinates, as
+the local road graph produces them.
+
+    drf         DRF JSONRenderer, unrounded coordinates (the previous response)
+    orjson      PlanJSONRenderer, coordinates rounded to ROUTE_COORD_DECIMALS
+    gzip / br   the orjson body through CompressionMiddleware's codecs
+
+Run from backend/:
+    python -m benchmarks.bench_render
+
+Reference run (Python 3.11, one shared core, orjson 3.8, brotli 1.1):
+
+    vertices  drf ms  drf KB orjson ms orjson KB gzip ms gzip KB  br ms  br KB
+        1000     1.2      44      0.11        24     0.5     5.9    0.6    5.1
+       10000    11.8     403      1.05       206     7.1    50.1    4.7   42.0
+       50000    59.4    2001      5.55      1019    36.8   245.6   23.1  196.9
+
+Rounding costs ~0.45 us per vertex (4.5 ms for 10k), paid once when the
+plan is built; cached plans are stored rounded. A 10k-vertex plan goes
+from 403 KB to 42-50 KB on the wire, and compression now costs more CPU
+than rendering, so keep COMPRESSION_GZIP_LEVEL / _BROTLI_QUALITY modest.
+"""
+import gzip
+import os
+import time
+from datetime import datetime
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from trip_api import middleware  # noqa: E402
+from trip_api.eld_logs import generate_eld_sheets  # noqa: E402
+from trip_api.planner import build_plan  # noqa: E402
+from trip_api.renderers import PlanJSONRenderer, orjson  # noqa: E402
+from benchmarks.bench_route_index import synthetic_geometry  # noqa: E402
+
+
+MILES = 1609.34
+START = datetime(2025, 3, 3, 6, 30)
+
+
+def best(fn, repeat=10):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def plan(vertices):
+    geometry = synthetic_geometry(vertices)
+    distance, duration = 2800 * MILES, 2800 / 60 * 3600
+    half = vertices // 2
+    route1 = {"distance_meters": distance / 2, "duration_seconds": duration / 2, "geometry": geometry[:half + 1]}
+    route2 = {"distance_meters": distance / 2, "duration_seconds": duration / 2, "geometry": geometry[half:]}
+    eld_logs = generate_eld_sheets(distance, duration, 30, START, geometry)
+    ends = ({"lat": geometry[0][1], "lng": geometry[0][0]},) * 3
+    return build_plan(ends, route1, route2, eld_logs, "full", "json")
+
+
+def main():
+    if orjson is None or middleware.brotli is None:
+        print("orjson and brotli are not both installed (requirements-speedups.txt); "
+              "the fallbacks are measured instead")
+    print(f"{'vertices':>8} {'drf ms':>7} {'drf KB':>7} {'orjson ms':>9} {'orjson KB':>9} "
+          f"{'gzip ms':>7} {'gzip KB':>7} {'br ms':>6} {'br KB':>6}")
+    for vertices in (1_000, 10_000, 50_000):
+        with override_settings(ROUTE_COORD_DECIMALS=-1):
+            unrounded = plan(vertices)
+        rounded = plan(vertices)
+        drf_s, drf = best(lambda: JSONRenderer().render(unrounded))
+        fast_s, fast = best(lambda: PlanJSONRenderer().render(rounded))
+        gzip_s, gzipped = best(lambda: gzip.compress(fast, settings.COMPRESSION_GZIP_LEVEL, mtime=0))
+        if middleware.brotli is not None:
+            br_s, br = best(lambda: middleware.compress(fast, "br"))
+            br_cols = f"{br_s * 1e3:>6.1f} {len(br) / 1e3:>6.1f}"
+        else:
+            br_cols = f"{'-':>6} {'-':>6}"
+        print(f"{vertices:>8} {drf_s * 1e3:>7.1f} {len(drf) / 1e3:>7.0f} {fast_s * 1e3:>9.2f} "
+              f"{len(fast) / 1e3:>9.0f} {gzip_s * 1e3:>7.1f} {len(gzipped) / 1e3:>7.1f} {br_cols}")
+
+
+if __name__ == "__main__":
+    main()
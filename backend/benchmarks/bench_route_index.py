@@ -0,0 +1,72 @@
+"""
+Stop coordinate lookup: legacy linear scan vs RouteIndex.
+
+Run from backend/:
+    python -m benchmarks.bench_route_index
+"""
+import math
+import random
+import time
+
+from trip_api.eld_logs import RouteIndex, haversine_distance
+
+
+def legacy_coordinate_at_distance(geometry, target_distance_meters):
+    # The pre-RouteIndex implementation: walks the geometry from the start
+    # and recomputes haversine for every segment on every lookup.
+    current_dist = 0
+    for i in range(len(geometry) - 1):
+        p1 = geometry[i]
+        p2 = geometry[i + 1]
+        dist_segment = haversine_distance(p1[1], p1[0], p2[1], p2[0])
+        if current_dist + dist_segment >= target_distance_meters:
+            return {"lat": p2[1], "lng": p2[0]}
+        current_dist += dist_segment
+    last = geometry[-1]
+    return {"lat": last[1], "lng": last[0]}
+
+
+def synthetic_geometry(points, seed=0):
+    """A wiggly west-bound line from Dallas, roughly 150 m between vertices."""
+    rng = random.Random(seed)
+    lng, lat = -96.80, 32.78
+    geometry = []
+    for i in range(points):
+        geometry.append([lng, lat])
+        lng -= 0.0015
+        lat += 0.0004 * math.sin(i / 50) + rng.uniform(-0.0001, 0.0001)
+    return geometry
+
+
+def run(point_counts=(1_000, 10_000, 100_000), stops=40):
+    rows = []
+    for n in point_counts:
+        geometry = synthetic_geometry(n)
+        targets = [RouteIndex(geometry).length_meters * (i + 0.5) / stops for i in range(stops)]
+
+        t0 = time.perf_counter()
+        for d in targets:
+            legacy_coordinate_at_distance(geometry, d)
+        legacy = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index = RouteIndex(geometry)
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for d in targets:
+            index.coordinate_at(d)
+        lookup = time.perf_counter() - t0
+
+        rows.append((n, stops, legacy, build, lookup))
+    return rows
+
+
+def main():
+    print(f"{'points':>8} {'stops':>5} {'legacy ms':>10} {'build ms':>9} {'lookups ms':>11} {'speedup':>8}")
+    for n, stops, legacy, build, lookup in run():
+        print(f"{n:>8} {stops:>5} {legacy * 1e3:>10.2f} {build * 1e3:>9.2f} "
+              f"{lookup * 1e3:>11.3f} {legacy / (build + lookup):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
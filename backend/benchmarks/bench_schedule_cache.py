@@ -0,0 +1,91 @@
+"""
+HOS schedule cache: generate_eld_sheets per call with and without the
+ScheduleCache, and its hit rate on a repeat-lane workload.
+
+Trips are drawn from a fixed set of lanes with Zipf-like popularity (a few
+corridors carry most of the traffic) and start at random times over a
+month, which is what defeats the whole-plan cache but not the schedule
+cache. Each lane's route comes back with slightly different distance and
+duration now and then (a waypoint snapped a few meters off), which only the
+quantized keys absorb. Run from backend/:
+    python -m benchmarks.bench_schedule_cache
+
+Reference run (Python 3.11, one shared core), 20,000 trips over 400 lanes:
+
+    uncached                 ~130 us/trip
+    exact keys               ~100 us/trip   hit 88.0%
+    quantized keys           ~97 us/trip    hit 97.3%
+
+A hit skips the simulation (~35 us for this mix) but still pays for the
+day bucketing, which is now most of what's left of generate_eld_sheets.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+django.setup()
+
+from trip_api import eld_logs  # noqa: E402
+from trip_api.eld_logs import ScheduleCache, generate_eld_sheets  # noqa: E402
+
+
+MILES = 1609.34
+START = datetime(2025, 3, 1)
+
+
+def lanes(count, rng):
+    """(distance meters, duration seconds, cycle used hours) per lane."""
+    result = []
+    for _ in range(count):
+        miles = rng.choice((rng.uniform(40, 400), rng.uniform(400, 1500), rng.uniform(1500, 3000)))
+        mph = rng.uniform(45, 65)
+        result.append((miles * MILES, miles / mph * 3600, rng.choice((0, 10, 20, 35, 50))))
+    return result
+
+
+def workload(trips, lane_count, jitter, seed=0):
+    rng = random.Random(seed)
+    all_lanes = lanes(lane_count, rng)
+    weights = [1 / (rank + 1) for rank in range(lane_count)]
+    for distance, duration, cycle_used in rng.choices(all_lanes, weights, k=trips):
+        if rng.random() < jitter:
+            # The same lane routed a few meters differently
+            distance += rng.uniform(-20, 20)
+            duration += rng.uniform(-2, 2)
+        yield distance, duration, cycle_used, START + timedelta(minutes=rng.randrange(30 * 24 * 60))
+
+
+def run(trips, cache):
+    eld_logs._schedule_cache = cache
+    started = time.perf_counter()
+    for distance, duration, cycle_used, start in trips:
+        generate_eld_sheets(distance, duration, cycle_used, start)
+    return (time.perf_counter() - started) / len(trips)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trips", type=int, default=20_000)
+    parser.add_argument("--lanes", type=int, default=400)
+    parser.add_argument("--jitter", type=float, default=0.1, help="share of trips with a slightly different route")
+    args = parser.parse_args()
+
+    trips = list(workload(args.trips, args.lanes, args.jitter))
+    print(f"{len(trips)} trips over {args.lanes} lanes")
+    for name, cache in (
+        ("uncached", ScheduleCache(0)),
+        ("exact keys", ScheduleCache(2048)),
+        ("quantized keys", ScheduleCache(2048, distance_quantum=100, speed_quantum=0.01, cycle_quantum=0.25)),
+    ):
+        seconds = run(trips, cache)
+        hit = cache.info()["hit_ratio"]
+        print(f"{name:<16} {seconds * 1e6:>8.1f} us/trip" + (f"   hit {hit:.1%}" if hit is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""Project settings with the database moved out of the way for load tests."""
+import os
+
+from backend.settings import *  # noqa: F401,F403
+from backend.settings import DATABASES
+
+
+DATABASES = {
+    "default": {**DATABASES["default"], "NAME": os.environ.get("BENCH_DATABASE", "/tmp/trip_api_bench.sqlite3")},
+}
@@ -0,0 +1,3 @@
+"""The slim serverless profile with the database moved out of the way for load tests."""
+from backend.settings_slim import *  # noqa: F401,F403
+from benchmarks.bench_settings import DATABASES  # noqa: F401
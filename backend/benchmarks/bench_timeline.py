@@ -0,0 +1,66 @@
+"""
+HOS simulator memory and time: list-of-dicts events vs the compact Timeline.
+
+The "dicts" column materializes the same events/stops in the previous
+{status, start, end, ...} datetime form, which is what the simulator used to
+keep alive for the whole run.
+
+Run from backend/:
+    python -m benchmarks.bench_timeline
+"""
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+django.setup()
+
+from trip_api.eld_logs import _simulate_events, generate_eld_sheets  # noqa: E402
+from trip_api.tests import legacy_generate_eld_sheets  # noqa: E402
+
+
+MILES = 1609.34
+START = datetime(2025, 3, 3, 6, 30)
+
+
+def retained_bytes(build, batch):
+    tracemalloc.start()
+    kept = [build() for _ in range(batch)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main(batch=1000, repeat=200):
+    print(f"{'miles':>6} {'events':>6} {'dicts KB/trip':>13} {'timeline KB/trip':>16} "
+          f"{'legacy ms':>9} {'current ms':>10}")
+    for miles in (300, 1500, 6000, 20000):
+        args = (miles * MILES, miles / 55 * 3600, 30)
+
+        def as_dicts():
+            timeline = _simulate_events(*args)
+            return list(timeline.events(START)), list(timeline.stops(START))
+
+        events = len(_simulate_events(*args))
+        dicts = retained_bytes(as_dicts, batch) / batch / 1024
+        compact = retained_bytes(lambda: _simulate_events(*args), batch) / batch / 1024
+        legacy = timed(lambda: legacy_generate_eld_sheets(*args, start_time=START), repeat)
+        current = timed(lambda: generate_eld_sheets(*args, start_time=START), repeat)
+        print(f"{miles:>6} {events:>6} {dicts:>13.1f} {compact:>16.1f} "
+              f"{legacy * 1e3:>9.3f} {current * 1e3:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
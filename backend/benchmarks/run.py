@@ -0,0 +1,228 @@
+"""
+Reproducible benchmark suite for the trip-plan pipeline.
+
+Synthetic trips of increasing length are timed stage by stage:
+
+    simulate      HOS simulation (eld_logs._simulate_events)
+    bucket        day bucketing of the simulated timeline
+    stop_lookup   RouteIndex build plus coordinate lookup for every stop
+    serialize     PlanJSONRenderer rendering of the full trip-plan payload,
+                  as the views send it (orjson, see requirements-speedups.txt)
+
+stop_lookup and serialize are also run for route geometries of 100 to
+100k points.
+
+Shared CI runners change speed from minute to minute, so each stage is
+timed in rounds that run a fixed pure-Python calibration workload right
+before it, with the collector paused. Regressions are judged on the median
+of those per-round ratios, not on raw milliseconds, and the baseline keeps
+the median of --record-runs measurements.
+
+Run from backend/:
+    python -m benchmarks.run                   # compare against baseline.json
+    python -m benchmarks.run --update-baseline # record a new baseline
+    python -m benchmarks.run --only cross_country --threshold 0.5
+
+A stage counts as regressed when its ratio is more than the threshold
+(default 25%) above the baseline and it still is after --confirm
+re-measurements, and the slowdown is at least --min-delta-ms per call
+(default 0.01 ms), so stages of a few microseconds can't fail the run on
+timer noise alone. The run then exits with status 1. Record a new baseline
+whenever the Python version or hardware class of the runner changes.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import django
+
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+django.setup()
+
+from trip_api.eld_logs import RouteIndex, _bucket_into_days, _simulate_events, haversine_distance  # noqa: E402
+from trip_api.planner import build_plan  # noqa: E402
+from trip_api.renderers import PlanJSONRenderer  # noqa: E402
+from benchmarks.bench_route_index import synthetic_geometry  # noqa: E402
+
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+MILES = 1609.34
+START = datetime(2025, 3, 3, 6, 30)
+
+# name: (miles, average mph, cycle used hours)
+PROFILES = {
+    "short_hop": (45, 40, 0),
+    "regional": (450, 55, 20),
+    "cross_country": (2800, 60, 30),
+    "multi_restart": (6000, 58, 62),
+}
+GEOMETRY_POINTS = (100, 1_000, 10_000, 100_000)
+
+
+def calls_for(fn, min_time):
+    """How many back-to-back calls of fn it takes to fill min_time seconds."""
+    calls = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        if time.perf_counter() - t0 >= min_time or calls >= 1 << 20:
+            return calls
+        calls *= 2
+
+
+def per_call(fn, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls
+
+
+def calibration():
+    # Fixed workload in the same style as the code under test
+    for i in range(2000):
+        haversine_distance(32.78, -96.80, 32.78 + i * 1e-4, -96.80 - i * 1e-4)
+
+
+def timed(fn, rounds=7, min_time=0.05):
+    """
+    (best seconds per call, relative cost). Every round times the
+    calibration workload and fn back to back, and the relative cost is the
+    median of the per-round ratios, so the runner changing speed mid-run
+    moves both sides of a ratio alike and one disturbed round can't skew
+    it. The collector is paused while timing.
+    """
+    calls = calls_for(fn, min_time)
+    reference_calls = calls_for(calibration, min_time)
+    best = float("inf")
+    ratios = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            reference = per_call(calibration, reference_calls)
+            seconds = per_call(fn, calls)
+            best = min(best, seconds)
+            ratios.append(seconds / reference)
+    finally:
+        gc.enable()
+    return best, statistics.median(ratios)
+
+
+def benchmarks(name, miles, mph, cycle_used):
+    """Yields (key, fn) for every stage of one trip profile."""
+    distance = miles * MILES
+    duration = miles / mph * 3600
+
+    yield f"{name}/simulate", lambda: _simulate_events(distance, duration, cycle_used)
+
+    timeline = _simulate_events(distance, duration, cycle_used)
+    yield f"{name}/bucket", lambda: _bucket_into_days(timeline, START)
+
+    for points in GEOMETRY_POINTS:
+        geometry = synthetic_geometry(points)
+        stop_dists = list(timeline.stop_dist)
+
+        def stop_lookup():
+            index = RouteIndex(geometry)
+            for d in stop_dists:
+                index.coordinate_at(d)
+
+        yield f"{name}/stop_lookup/{points}", stop_lookup
+
+        eld_logs = _bucket_into_days(timeline, START, RouteIndex(geometry))
+        half = points // 2
+        route1 = {"distance_meters": distance / 2, "duration_seconds": duration / 2, "geometry": geometry[:half + 1]}
+        route2 = {"distance_meters": distance / 2, "duration_seconds": duration / 2, "geometry": geometry[half:]}
+        ends = ({"lat": geometry[0][1], "lng": geometry[0][0]},) * 3
+        plan = build_plan(ends, route1, route2, eld_logs, "full", "json")
+        renderer = PlanJSONRenderer()
+        yield f"{name}/serialize/{points}", lambda: renderer.render(plan)
+
+
+def slowdown(seconds, relative, base):
+    """(fractional change in relative cost, extra milliseconds per call) against base."""
+    return relative / base - 1, seconds * 1e3 * (1 - base / relative)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--update-baseline", action="store_true", help="write results to baseline.json")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown vs baseline as a fraction (default 0.25)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.01,
+                        help="smaller slowdowns per call are never reported (default 0.01 ms)")
+    parser.add_argument("--confirm", type=int, default=2,
+                        help="re-measurements of a suspected regression before it counts (default 2)")
+    parser.add_argument("--record-runs", type=int, default=3,
+                        help="measurements per stage, median kept, when updating the baseline (default 3)")
+    parser.add_argument("--only", action="append", choices=sorted(PROFILES), help="run only these profiles")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text())["results"]
+
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<40} {'ms':>10} {'relative':>10} {'baseline':>10} {'change':>8}")
+    for name in args.only or PROFILES:
+        for key, fn in benchmarks(name, *PROFILES[name]):
+            base = baseline.get(key, {}).get("relative")
+            if args.update_baseline:
+                runs = sorted((timed(fn) for _ in range(args.record_runs)), key=lambda run: run[1])
+                seconds, relative = runs[len(runs) // 2]
+            else:
+                seconds, relative = timed(fn)
+                # A suspected regression must survive re-measurement
+                for _ in range(args.confirm):
+                    if not base or slowdown(seconds, relative, base)[0] <= args.threshold:
+                        break
+                    seconds, relative = min((seconds, relative), timed(fn), key=lambda run: run[1])
+            results[key] = (seconds, relative)
+
+            change = ""
+            if base:
+                ratio, extra_ms = slowdown(seconds, relative, base)
+                change = f"{ratio:+.0%}"
+                if ratio > args.threshold and extra_ms >= args.min_delta_ms and not args.update_baseline:
+                    regressions.append(key)
+                    change += " !"
+            base_text = f"{base:.4g}" if base else "-"
+            print(f"{key:<40} {seconds * 1e3:>10.3f} {relative:>10.4g} {base_text:>10} {change:>8}", flush=True)
+
+    if args.update_baseline:
+        baseline.update({
+            key: {"ms": round(seconds * 1e3, 4), "relative": round(relative, 4)}
+            for key, (seconds, relative) in results.items()
+        })
+        BASELINE_PATH.write_text(json.dumps({
+            "meta": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+                "recorded": datetime.now().isoformat(timespec="seconds"),
+            },
+            "results": dict(sorted(baseline.items())),
+        }, indent=2) + "\n")
+        print(f"\nBaseline written to {BASELINE_PATH}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}:")
+        for key in regressions:
+            print(f"  {key}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
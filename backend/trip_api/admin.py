@@ -1,3 +1,20 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GeocodeCacheEntry, PlanCacheEntry, RouteCacheEntry
+
+
+@admin.register(GeocodeCacheEntry)
+class GeocodeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("address", "lat", "lng", "hits", "last_used_at")
+    search_fields = ("address",)
+
+
+@admin.register(RouteCacheEntry)
+class RouteCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("waypoints", "distance_meters", "duration_seconds", "hits", "last_used_at")
+
+
+@admin.register(PlanCacheEntry)
+class PlanCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("inputs", "etag", "hits", "last_used_at")
+    search_fields = ("inputs",)
@@ -0,0 +1,95 @@
+"""
+Async versions of ors_client.geocode_address and ors_client.get_route for
+the async trip-plan view. Requests, parsing and caching are shared with the
+blocking client; only the network calls differ.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from . import cache
+from .async_transport import get_transport
+from .metrics import stage
+from .ors_client import (
+    _geocode_request, _needs_fetch, _parse_geocode, _parse_route, _route_request, _route_result,
+)
+
+
+_cache_executor = None
+_cache_executor_lock = threading.Lock()
+
+
+def _get_cache_executor():
+    global _cache_executor
+    with _cache_executor_lock:
+        if _cache_executor is None:
+            _cache_executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_CACHE_THREADS,
+                thread_name_prefix="trip-cache",
+            )
+        return _cache_executor
+
+
+def _run_cache(fn, args):
+    try:
+        return fn(*args)
+    finally:
+        # Don't keep a connection open across an unusable database
+        connections["default"].close_if_unusable_or_obsolete()
+
+
+async def in_cache_thread(fn, *args):
+    """
+    Run a blocking cache (ORM) call off the event loop. Every call shares a
+    small dedicated pool (ASYNC_CACHE_THREADS) instead of asgiref's
+    per-request threads, so hundreds of in-flight plans don't all queue on
+    SQLite's single write lock at once.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_cache_executor(), _run_cache, fn, args)
+
+
+async def geocode_address(address):
+    with stage("cache"):
+        coord = await in_cache_thread(cache.get_geocode, address)
+    if coord is None:
+        url, params = _geocode_request(address)
+        with stage("ors-geocode"):
+            res = await get_transport().get(url, params=params)
+            data = res.json()
+        coord = _parse_geocode(data, address)
+        with stage("cache"):
+            await in_cache_thread(cache.set_geocode, address, coord)
+    return coord
+
+
+async def get_route(coord_list, split_legs=False):
+    with stage("cache"):
+        route = await in_cache_thread(cache.get_route, coord_list)
+    if _needs_fetch(route, coord_list, split_legs):
+        url, kwargs = _route_request(coord_list)
+        with stage("ors-directions"):
+            res = await get_transport().post(url, **kwargs)
+            data = res.json()
+        route = _parse_route(data)
+        with stage("cache"):
+            await in_cache_thread(cache.set_route, coord_list, route)
+    return _route_result(route, split_legs)
+
+
+async def gather(*calls, timeout=None):
+    """
+    Await calls concurrently and return their results in order, like
+    concurrency.run_concurrently: the first failure is re-raised and the
+    whole set must finish within timeout seconds (default
+    TRIP_PLAN_CALL_TIMEOUT_SECONDS).
+    """
+    if timeout is None:
+        timeout = settings.TRIP_PLAN_CALL_TIMEOUT_SECONDS
+    try:
+        return await asyncio.wait_for(asyncio.gather(*calls), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Upstream calls timed out after {timeout}s") from None
@@ -0,0 +1,146 @@
+"""
+Async variant of TripPlanView for ASGI deployments (e.g.
+`uvicorn backend.asgi:application`). Geocoding and routing await the
+aiohttp-based client instead of blocking a worker thread, so one process can
+keep hundreds of plans waiting on ORS at once; the CPU-bound simulation and
+payload build run on a worker thread to keep the event loop responsive.
+
+Accepts the same JSON body and returns the same plan, ETag and 304
+handling as TripPlanView. NDJSON streaming stays on the sync endpoint.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.views import View
+
+from .async_ors_client import gather, geocode_address, get_route, in_cache_thread
+from .cache import get_plan, plan_etag, plan_key, set_plan
+from .eld_logs import generate_eld_sheets
+from .gazetteer import gazetteer_loaded
+from .geocoding import local_geocode
+from .metrics import request_timer, stage
+from .planner import (
+    assign_legs, build_plan, plan_legs, plan_start_time, simulation_args, simulation_block,
+    validate_options,
+)
+from .renderers import dumps
+from .routing import local_route
+from .views import etag_header, etag_matches
+
+
+def _simulate_and_build(geocoded, route1, route2, cycle_used, start_time, detail, geometry_format):
+    with stage("simulate"):
+        eld_logs = generate_eld_sheets(*simulation_args(route1, route2, cycle_used, start_time))
+    with stage("build"):
+        plan = build_plan(
+            geocoded, route1, route2, eld_logs, detail, geometry_format,
+            simulation_block(route1, route2, cycle_used, start_time),
+        )
+        etag = plan_etag(plan)
+    return plan, etag
+
+
+_simulate_and_build_async = sync_to_async(_simulate_and_build, thread_sensitive=False)
+_local_route_async = sync_to_async(local_route, thread_sensitive=False)
+_local_geocode_async = sync_to_async(local_geocode, thread_sensitive=False)
+
+
+async def geocode(address):
+    """geocoding.geocode_address(address) without blocking the loop."""
+    # A gazetteer lookup takes microseconds, no need for a thread; the first
+    # one reads the whole gazetteer file, which must not stall the loop
+    if settings.GEOCODING_BACKEND == "local" and not gazetteer_loaded():
+        coord = await _local_geocode_async(address)
+    else:
+        coord = local_geocode(address)
+    if coord is None:
+        coord = await geocode_address(address)
+    return coord
+
+
+async def route_legs(waypoints):
+    """routing.get_route(waypoints, split_legs=True) without blocking the loop."""
+    route = None
+    if settings.ROUTING_BACKEND == "local":
+        # A* is CPU-bound, keep it off the event loop
+        route = await _local_route_async(waypoints, True)
+    if route is None:
+        route = await get_route(waypoints, split_legs=True)
+    return route
+
+
+class TripPlanAsyncView(View):
+
+    async def post(self, request):
+        with request_timer(type(self).__name__) as timer:
+            timer.response = await self.plan(request)
+        return timer.response
+
+    def plan_response(self, request, plan, etag):
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            response = HttpResponseNotModified()
+            # Vary as on the 200, which CompressionMiddleware adds
+            response["Vary"] = "Accept-Encoding"
+        else:
+            with stage("render"):
+                response = HttpResponse(dumps(plan), content_type="application/json")
+        response["ETag"] = etag_header(etag)
+        return response
+
+    async def plan(self, request):
+        try:
+            data = json.loads(request.body or b"{}")
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object")
+        except ValueError as e:
+            return JsonResponse({"error": f"Invalid JSON body: {e}"}, status=400)
+
+        current = data.get("currentLocation")
+        pickup = data.get("pickupLocation")
+        dropoff = data.get("dropoffLocation")
+        detail = data.get("detail", settings.ROUTE_DEFAULT_DETAIL)
+        geometry_format = data.get("geometryFormat", "json")
+
+        try:
+            if str(data.get("stream", "")).lower() in ("1", "true"):
+                raise ValueError("Streaming is only available on /api/trip-plan/")
+            validate_options(detail, geometry_format)
+            cycle_used = float(data.get("cycleUsed", 0))
+            start_time = plan_start_time()
+
+            caching = bool(settings.PLAN_CACHE_GRANULARITY_MINUTES)
+            if caching:
+                key, inputs = plan_key(current, pickup, dropoff, cycle_used, start_time, detail, geometry_format)
+                with stage("cache"):
+                    cached = await in_cache_thread(get_plan, key)
+                if cached is not None:
+                    return self.plan_response(request, *cached)
+
+            #  Geocode all 3 locations concurrently
+            with stage("geocode"):
+                current_c, pickup_c, dropoff_c = await gather(
+                    geocode(current),
+                    geocode(pickup),
+                    geocode(dropoff),
+                )
+
+            # Both legs come back from a single multi-waypoint directions call
+            routes, waypoints, to_route = plan_legs(current_c, pickup_c, dropoff_c)
+            if to_route:
+                with stage("route"):
+                    assign_legs(routes, to_route, await route_legs(waypoints))
+            route1, route2 = routes
+
+            plan, etag = await _simulate_and_build_async(
+                (current_c, pickup_c, dropoff_c), route1, route2, cycle_used, start_time,
+                detail, geometry_format,
+            )
+            if caching:
+                with stage("cache"):
+                    await in_cache_thread(set_plan, key, inputs, plan, etag)
+            return self.plan_response(request, plan, etag)
+
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=400)
@@ -0,0 +1,255 @@
+"""
+Persistent caches in front of the ORS client.
+
+Entries live in the project database so that every gunicorn worker shares
+them and they survive restarts. If the database is unavailable (e.g. the
+tables were never migrated) lookups simply miss and the caller falls back
+to the network.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import GeocodeCacheEntry, PlanCacheEntry, RouteCacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for this worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+geocode_stats = CacheStats()
+route_stats = CacheStats()
+plan_stats = CacheStats()
+
+
+# --- Geocode cache ---
+
+def normalize_address(address):
+    """
+    Normalize free-text addresses so trivially different spellings share a key:
+    "Dallas, TX " / "dallas tx" / "DALLAS,  TX." all map to "dallas tx".
+    """
+    text = str(address).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _geocode_key(normalized):
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def get_geocode(address):
+    """Returns the cached {"lat", "lng"} for address, or None on a miss."""
+    entry = _lookup(
+        GeocodeCacheEntry, _geocode_key(normalize_address(address)),
+        settings.GEOCODE_CACHE_TTL_SECONDS, geocode_stats,
+    )
+    if entry is None:
+        return None
+    return {"lat": entry.lat, "lng": entry.lng}
+
+
+def set_geocode(address, coord):
+    """Stores coord for address and evicts least recently used rows over the limit."""
+    normalized = normalize_address(address)
+    _store(
+        GeocodeCacheEntry, _geocode_key(normalized),
+        settings.GEOCODE_CACHE_MAX_ENTRIES,
+        {"address": normalized, "lat": coord["lat"], "lng": coord["lng"]},
+    )
+
+
+# --- Route cache ---
+
+def snap_waypoints(coord_list, grid=None):
+    """
+    Snap [lng, lat] waypoints to integer grid cells. With the default grid of
+    0.0001 degrees (the tolerance TripPlanView.coords_are_same uses) points a
+    few meters apart share a cell and therefore a cached route.
+    """
+    if grid is None:
+        grid = settings.ROUTE_CACHE_GRID_DEGREES
+    return [(round(lng / grid), round(lat / grid)) for lng, lat in coord_list]
+
+
+def route_key(coord_list):
+    cells = ";".join(f"{x},{y}" for x, y in snap_waypoints(coord_list))
+    return hashlib.sha256(cells.encode("ascii")).hexdigest(), cells
+
+
+def get_route(coord_list):
+    """
+    Returns the cached {"distance_meters", "duration_seconds", "geometry",
+    "segments", "way_points"} for the waypoints, with geometry still
+    polyline-encoded, or None on a miss.
+    """
+    key, _ = route_key(coord_list)
+    entry = _lookup(RouteCacheEntry, key, settings.ROUTE_CACHE_TTL_SECONDS, route_stats)
+    if entry is None:
+        return None
+    return {
+        "distance_meters": entry.distance_meters,
+        "duration_seconds": entry.duration_seconds,
+        "geometry": entry.geometry,
+        "segments": entry.segments,
+        "way_points": entry.way_points,
+    }
+
+
+def set_route(coord_list, route):
+    """Stores an ORS route whose geometry is still the encoded polyline."""
+    key, cells = route_key(coord_list)
+    _store(
+        RouteCacheEntry, key, settings.ROUTE_CACHE_MAX_ENTRIES,
+        {
+            "waypoints": cells,
+            "distance_meters": route["distance_meters"],
+            "duration_seconds": route["duration_seconds"],
+            "geometry": route["geometry"],
+            "segments": route["segments"],
+            "way_points": route["way_points"],
+        },
+    )
+
+
+# --- Plan cache ---
+
+def plan_key(current, pickup, dropoff, cycle_used, start_time, detail, geometry_format):
+    """
+    Key for a whole trip plan. start_time must already be rounded (see
+    planner.plan_start_time); it is part of the key, so plans from an
+    earlier window are never served and simply age out through LRU.
+    """
+    inputs = "|".join([
+        normalize_address(current), normalize_address(pickup), normalize_address(dropoff),
+        repr(float(cycle_used)), start_time.isoformat(), detail, geometry_format,
+    ])
+    return hashlib.sha256(inputs.encode("utf-8")).hexdigest(), inputs
+
+
+def plan_etag(plan):
+    """Digest of the response body, stable across workers and restarts."""
+    body = json.dumps(plan, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def get_plan(key):
+    """Returns the cached (plan, etag) for key, or None on a miss."""
+    entry = _lookup(PlanCacheEntry, key, 0, plan_stats)
+    if entry is None:
+        return None
+    return entry.plan, entry.etag
+
+
+def set_plan(key, inputs, plan, etag):
+    _store(
+        PlanCacheEntry, key, settings.PLAN_CACHE_MAX_ENTRIES,
+        {"inputs": inputs, "plan": plan, "etag": etag},
+    )
+
+
+# --- Shared helpers ---
+
+def _lookup(model, key, ttl, stats):
+    """
+    Fetches the row for key, touching it for LRU. Expired rows (ttl in
+    seconds, falsy for no expiry) count as a miss and are removed.
+    """
+    now = timezone.now()
+    try:
+        entry = model.objects.filter(key=key).first()
+        if entry is not None:
+            if ttl and entry.created_at < now - timedelta(seconds=ttl):
+                entry.delete()
+                entry = None
+            else:
+                # F() keeps concurrent workers from losing hits
+                model.objects.filter(pk=entry.pk).update(hits=F("hits") + 1, last_used_at=now)
+    except DatabaseError:
+        logger.warning("%s unavailable, falling back to ORS", model.__name__, exc_info=True)
+        entry = None
+
+    stats.record(entry is not None)
+    return entry
+
+
+def _store(model, key, max_entries, values):
+    now = timezone.now()
+    try:
+        model.objects.update_or_create(
+            key=key,
+            defaults={**values, "created_at": now, "last_used_at": now},
+        )
+        _evict_lru(model, max_entries)
+    except DatabaseError:
+        logger.warning("Could not write %s", model.__name__, exc_info=True)
+
+
+def _evict_lru(model, max_entries):
+    if not max_entries:
+        return
+    overflow = model.objects.count() - max_entries
+    if overflow > 0:
+        stale = model.objects.order_by("last_used_at").values_list("pk", flat=True)[:overflow]
+        model.objects.filter(pk__in=list(stale)).delete()
+
+
+def geocode_cache_info():
+    """Process-local counters plus shared table totals."""
+    return _cache_info(GeocodeCacheEntry, geocode_stats)
+
+
+def route_cache_info():
+    return _cache_info(RouteCacheEntry, route_stats)
+
+
+def plan_cache_info():
+    return _cache_info(PlanCacheEntry, plan_stats)
+
+
+def _cache_info(model, stats):
+    info = stats.as_dict()
+    try:
+        info["entries"] = model.objects.count()
+        info["total_hits"] = model.objects.aggregate(n=Sum("hits"))["n"] or 0
+    except DatabaseError:
+        info["entries"] = None
+        info["total_hits"] = None
+    return info
@@ -0,0 +1,174 @@
+"""
+Bounded thread pool for fanning out blocking upstream calls (ORS geocoding
+and routing) from a single request, plus a process pool for CPU-bound HOS
+simulations over a batch of trips.
+"""
+import contextvars
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ALL_COMPLETED, FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+_process_pool = None
+_process_pool_lock = threading.Lock()
+# Set once the process pool failed to start; batches then run inline
+_process_pool_unavailable = False
+
+
+def get_executor():
+    # Created lazily so forked gunicorn workers each get their own threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TRIP_PLAN_MAX_WORKERS,
+                thread_name_prefix="trip-plan",
+            )
+        return _executor
+
+
+def get_batch_executor():
+    """The thread pool for batch requests, kept apart from get_executor()'s."""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH_MAX_WORKERS,
+                thread_name_prefix="trip-plan-batch",
+            )
+        return _batch_executor
+
+
+def _run(fn, args):
+    try:
+        return fn(*args)
+    finally:
+        # Pool threads sit outside the request cycle, so release the DB
+        # connections the caches opened on this thread.
+        connections.close_all()
+
+
+def run_concurrently(calls, timeout=None, return_exceptions=False, executor=None):
+    """
+    Run calls, a list of (fn, args) tuples, on executor (default the shared
+    request pool) and return their results in the same order.
+
+    Every call must finish within timeout seconds (default
+    TRIP_PLAN_CALL_TIMEOUT_SECONDS). As soon as one call fails the rest are
+    cancelled and its exception is re-raised unchanged; calls still running
+    at the deadline raise TimeoutError. With return_exceptions=True every
+    call runs to completion and failures (including timeouts) are returned
+    in place of their results instead of being raised.
+    """
+    if timeout is None:
+        timeout = settings.TRIP_PLAN_CALL_TIMEOUT_SECONDS
+
+    if executor is None:
+        executor = get_executor()
+    # Each call runs in a copy of the caller's context so request-scoped
+    # state (the metrics request timer) follows it onto the pool thread.
+    futures = [
+        executor.submit(contextvars.copy_context().run, _run, fn, args)
+        for fn, args in calls
+    ]
+    done, pending = wait(
+        futures, timeout=timeout,
+        return_when=ALL_COMPLETED if return_exceptions else FIRST_EXCEPTION,
+    )
+    for future in pending:
+        future.cancel()
+
+    if return_exceptions:
+        return [
+            future.exception() or future.result() if future in done
+            else TimeoutError(f"{fn.__name__} timed out after {timeout}s")
+            for (fn, _), future in zip(calls, futures)
+        ]
+
+    for future in futures:
+        if future in done and future.exception() is not None:
+            raise future.exception()
+
+    for (fn, _), future in zip(calls, futures):
+        if future in pending:
+            raise TimeoutError(f"{fn.__name__} timed out after {timeout}s")
+
+    return [future.result() for future in futures]
+
+
+def get_process_pool():
+    """
+    Shared process pool for CPU-bound work, or None when
+    BATCH_SIMULATION_PROCESSES is 0 and work should run inline. Uses
+    forkserver so children are not forked from a multi-threaded worker.
+    """
+    global _process_pool
+    if not settings.BATCH_SIMULATION_PROCESSES or _process_pool_unavailable:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.BATCH_SIMULATION_PROCESSES,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _process_pool
+
+
+def map_in_processes(fn, args_list):
+    """
+    Returns [fn(*args) for args in args_list], computed on the process pool
+    when one is configured and can be started, inline otherwise. fn must be
+    a picklable module-level function. Failures are returned in place of
+    their results.
+    """
+    global _process_pool, _process_pool_unavailable
+    pool = None
+    try:
+        pool = get_process_pool()
+        if pool is not None:
+            futures = [pool.submit(fn, *args) for args in args_list]
+            results = [future.exception() or future.result() for future in futures]
+            if not any(isinstance(result, BrokenProcessPool) for result in results):
+                return results
+            raise BrokenProcessPool("worker terminated abruptly")
+    except BrokenProcessPool:
+        # A child died (e.g. OOM-killed); drop the pool so the next
+        # batch gets a fresh one and finish this batch inline.
+        logger.warning("Simulation process pool broke, running inline", exc_info=True)
+        _drop_process_pool(pool)
+    except Exception:
+        # The pool can't start here at all (no /dev/shm for its semaphores
+        # on AWS Lambda, process limits, ...): stop trying for this process
+        logger.warning("Simulation process pool unavailable, running batches inline", exc_info=True)
+        _process_pool_unavailable = True
+        _drop_process_pool(pool)
+
+    results = []
+    for args in args_list:
+        try:
+            results.append(fn(*args))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _drop_process_pool(pool):
+    global _process_pool
+    if pool is None:
+        return
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -1,8 +1,15 @@
 import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
-# 1 mile ≈ 1.60934 km
-MILES_TO_METERS = 1609.34
+from django.conf import settings
+
+from .geometry import MILES_TO_METERS
+from .poi import STOP_KINDS, get_poi_index
+
 HOURS_TO_SECONDS = 3600
 
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -19,32 +26,69 @@ def haversine_distance(lat1, lon1, lat2, lon2):
 
     return R * c
 
+class RouteIndex:
+    """
+    Cumulative-distance index over a route geometry (list of [lng, lat]).
+    Built once per plan in O(n); each coordinate_at lookup is then a binary
+    search plus linear interpolation inside the matching segment, O(log n).
+    """
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        cumulative = [0.0]
+        total = 0.0
+        for i in range(len(geometry) - 1):
+            p1 = geometry[i]
+            p2 = geometry[i + 1]
+            # geometry is [lng, lat]
+            total += haversine_distance(p1[1], p1[0], p2[1], p2[0])
+            cumulative.append(total)
+        self.cumulative = cumulative
+
+    @property
+    def length_meters(self):
+        return self.cumulative[-1]
+
+    def coordinate_at(self, target_distance_meters):
+        """
+        Returns {"lat", "lng"} at target_distance_meters along the route,
+        clamped to the first/last vertex.
+        """
+        geometry = self.geometry
+        if not geometry:
+            return None
+
+        i = bisect_left(self.cumulative, target_distance_meters)
+        if i == 0:
+            first = geometry[0]
+            return {"lat": first[1], "lng": first[0]}
+        if i >= len(geometry):
+            # If we run out of geometry, return the last point
+            last = geometry[-1]
+            return {"lat": last[1], "lng": last[0]}
+
+        p1 = geometry[i - 1]
+        p2 = geometry[i]
+        seg_start = self.cumulative[i - 1]
+        seg_length = self.cumulative[i] - seg_start
+        fraction = (target_distance_meters - seg_start) / seg_length if seg_length > 0 else 1.0
+        return {
+            "lat": p1[1] + (p2[1] - p1[1]) * fraction,
+            "lng": p1[0] + (p2[0] - p1[0]) * fraction,
+        }
+
+
 def get_coordinate_at_distance(geometry, target_distance_meters):
     """
     Finds the coordinate along the path at the specified distance.
     geometry: List of [lng, lat]
+
+    Builds a throwaway RouteIndex; callers with several lookups on the same
+    geometry should build one RouteIndex and reuse it.
     """
     if not geometry:
         return None
-    
-    current_dist = 0
-    for i in range(len(geometry) - 1):
-        p1 = geometry[i]
-        p2 = geometry[i+1]
-        
-        # geometry is [lng, lat]
-        dist_segment = haversine_distance(p1[1], p1[0], p2[1], p2[0])
-        
-        if current_dist + dist_segment >= target_distance_meters:
-            # Interpolate or just return p2 (simple approach)
-            # For better precision, we could interpolate, but p2 is close enough for map markers usually
-            return {"lat": p2[1], "lng": p2[0]}
-        
-        current_dist += dist_segment
-        
-    # If we run out of geometry, return the last point
-    last = geometry[-1]
-    return {"lat": last[1], "lng": last[0]}
+    return RouteIndex(geometry).coordinate_at(target_distance_meters)
 
 def generate_daily_logs(route_distance_meters, route_duration_seconds, cycle_used_hours):
     # Deprecated in favor of generate_eld_sheets
@@ -60,60 +104,229 @@ def generate_eld_sheets(route_distance_meters, route_duration_seconds, cycle_use
     - summary: {distance, drive_hours, on_duty_hours, ...}
     - stops: list of {type, location, time}
     """
+    return list(iter_eld_sheets(route_distance_meters, route_duration_seconds, cycle_used_hours, start_time, route_geometry))
+
+
+def iter_eld_sheets(route_distance_meters, route_duration_seconds, cycle_used_hours, start_time=None, route_geometry=None):
+    """
+    Same daily logs as generate_eld_sheets, yielded one day at a time so a
+    caller can stream each sheet before the next one is built. Nothing is
+    simulated until the first day is requested.
+    """
     if start_time is None:
         start_time = datetime.now()
 
-    # Constants
-    HOURS_TO_SECONDS = 3600
-    MILES_TO_METERS = 1609.34
-    MAX_DRIVE_HOURS = 11
-    MAX_ON_DUTY_HOURS = 14
-    CYCLE_LIMIT_HOURS = 70
-    FUEL_RANGE_METERS = 1000 * MILES_TO_METERS
-    
-    # --- STEP 1: Generate Continuous Stream of Events ---
-    # We simulate the trip event-by-event without worrying about day boundaries yet.
-    
-    raw_events = [] # {status, start, end, duration, start_dist, end_dist}
-    stops_data = [] # {type, time, dist}
-    
-    current_time = start_time
-    remaining_distance = route_distance_meters
-    avg_speed_mps = route_distance_meters / route_duration_seconds if route_duration_seconds > 0 else 0
-    
-    cycle_used_seconds = cycle_used_hours * HOURS_TO_SECONDS
+    # Shared with every other trip of the same lane, whatever its start time
+    timeline = get_schedule_cache().get(route_distance_meters, route_duration_seconds, cycle_used_hours)
+
+    # Stop coordinates are looked up against one shared index
+    route_index = RouteIndex(route_geometry) if route_geometry else None
+
+    yield from _iter_days(timeline, start_time, route_index, pois=_stop_pois(route_index))
+
+
+def _stop_pois(route_index):
+    """The POI index stops are snapped to, or None when STOP_SNAPPING is off."""
+    if route_index is None or not settings.STOP_SNAPPING:
+        return None
+    return get_poi_index()
+
+
+# Duty status and stop type codes stored in a Timeline
+OFF_DUTY, SLEEPER, DRIVING, ON_DUTY = range(4)
+STATUS_NAMES = ("OFF_DUTY", "SLEEPER", "DRIVING", "ON_DUTY")
+
+PICKUP, DROPOFF, FUEL, REST_30M, REST_10H, CYCLE_RESTART, DELAY = range(7)
+STOP_NAMES = ("Pickup", "Dropoff", "Fuel", "Rest (30m)", "Rest (10h)", "Cycle Restart (34h)", "Delay")
+
+
+_ONE_US = timedelta(microseconds=1)
+
+
+def _to_us(seconds):
+    """
+    Whole microseconds for a float number of seconds, rounded exactly like
+    timedelta(seconds=...) so timeline offsets match datetime arithmetic.
+    """
+    whole = int(seconds)
+    return whole * 1000000 + round((seconds - whole) * 1e6)
+
+
+class Timeline:
+    """
+    Compact output of the HOS simulator: parallel typed arrays instead of a
+    list of dicts holding datetimes. Times are integer microseconds relative
+    to the trip start; they only become datetimes/ISO strings when the day
+    sheets are built.
+
+    Events are contiguous (each starts where the previous ended):
+        status, start_us, end_us, duration (seconds), start_dist, end_dist
+    Stops, in time order:
+        stop_type, stop_us, stop_dist
+    """
+    __slots__ = (
+        "status", "start_us", "end_us", "duration", "start_dist", "end_dist",
+        "stop_type", "stop_us", "stop_dist",
+    )
+
+    def __init__(self):
+        self.status = array("b")
+        self.start_us = array("q")
+        self.end_us = array("q")
+        self.duration = array("d")
+        self.start_dist = array("d")
+        self.end_dist = array("d")
+        self.stop_type = array("b")
+        self.stop_us = array("q")
+        self.stop_dist = array("d")
+
+    def __len__(self):
+        return len(self.status)
+
+    @property
+    def end(self):
+        return self.end_us[-1] if self.end_us else 0
+
+    def add_event(self, status, duration, start_dist, end_dist):
+        start = self.end
+        self.status.append(status)
+        self.start_us.append(start)
+        self.end_us.append(start + _to_us(duration))
+        self.duration.append(duration)
+        self.start_dist.append(start_dist)
+        self.end_dist.append(end_dist)
+
+    def add_stop(self, stop_type, dist):
+        # Stops are recorded at the current end of the timeline
+        self.stop_type.append(stop_type)
+        self.stop_us.append(self.end)
+        self.stop_dist.append(dist)
+
+    def events(self, start_time):
+        """The events as {status, start, end, duration, start_dist, end_dist} dicts."""
+        for i in range(len(self.status)):
+            yield {
+                "status": STATUS_NAMES[self.status[i]],
+                "start": start_time + timedelta(microseconds=self.start_us[i]),
+                "end": start_time + timedelta(microseconds=self.end_us[i]),
+                "duration": self.duration[i],
+                "start_dist": self.start_dist[i],
+                "end_dist": self.end_dist[i],
+            }
+
+    def stops(self, start_time):
+        """The stops as {type, time, dist} dicts."""
+        for i in range(len(self.stop_type)):
+            yield {
+                "type": STOP_NAMES[self.stop_type[i]],
+                "time": start_time + timedelta(microseconds=self.stop_us[i]),
+                "dist": self.stop_dist[i],
+            }
+
+
+MAX_DRIVE_HOURS = 11
+MAX_ON_DUTY_HOURS = 14
+CYCLE_LIMIT_HOURS = 70
+FUEL_RANGE_METERS = 1000 * MILES_TO_METERS
+
+
+class HosState:
+    """
+    The simulator's counters at one point of a trip: everything _drive needs
+    to carry the simulation on from there. apply() advances it over one
+    already simulated event, so the state at any point of a Timeline can be
+    rebuilt by replaying the events before it.
+    """
+    __slots__ = (
+        "remaining_distance", "avg_speed_mps", "cumulative_distance", "distance_since_fuel",
+        "shift_drive_seconds", "shift_on_duty_seconds", "cycle_used_seconds", "rest_taken",
+    )
+
+    def __init__(self, route_distance_meters, route_duration_seconds, cycle_used_hours):
+        self.remaining_distance = route_distance_meters
+        self.avg_speed_mps = route_distance_meters / route_duration_seconds if route_duration_seconds > 0 else 0
+        self.cumulative_distance = 0
+        self.distance_since_fuel = 0
+        self.shift_drive_seconds = 0
+        self.shift_on_duty_seconds = 0
+        self.cycle_used_seconds = cycle_used_hours * HOURS_TO_SECONDS
+        # Whether this shift's 30 minute break has been taken
+        self.rest_taken = False
+
+    def apply(self, status, stop_type, duration, distance):
+        """
+        Advance over one event: status and duration as in the Timeline,
+        stop_type the stop that opened it (None for driving) and distance
+        the meters driven.
+        """
+        if status == DRIVING:
+            self.remaining_distance -= distance
+            self.cumulative_distance += distance
+            self.distance_since_fuel += distance
+            self.shift_drive_seconds += duration
+            self.shift_on_duty_seconds += duration
+            self.cycle_used_seconds += duration
+        elif stop_type in (REST_10H, CYCLE_RESTART):
+            self.shift_drive_seconds = 0
+            self.shift_on_duty_seconds = 0
+            self.rest_taken = False
+            if stop_type == CYCLE_RESTART:
+                self.cycle_used_seconds = 0
+        elif stop_type == REST_30M:
+            # Off duty does not pause the 14h clock
+            self.shift_on_duty_seconds += duration
+            self.rest_taken = True
+        elif stop_type != DROPOFF:
+            # Pickup, fuel and delays are on duty
+            self.shift_on_duty_seconds += duration
+            self.cycle_used_seconds += duration
+            if stop_type == FUEL:
+                self.distance_since_fuel = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _simulate_events(route_distance_meters, route_duration_seconds, cycle_used_hours):
+    """
+    --- STEP 1: Generate Continuous Stream of Events ---
+    We simulate the trip event-by-event without worrying about day boundaries
+    or the wall clock; returns a Timeline relative to the trip start.
+    """
+    timeline = Timeline()
+    state = HosState(route_distance_meters, route_duration_seconds, cycle_used_hours)
+
+    # Initial Pickup (1 hour On Duty)
+    duration = 3600
+    timeline.add_stop(PICKUP, 0)
+    timeline.add_event(ON_DUTY, duration, 0, 0)
+    state.apply(ON_DUTY, PICKUP, duration, 0)
+
+    _drive(timeline, state)
+    return timeline
+
+
+def _drive(timeline, state):
+    """
+    Simulate from state to the dropoff, appending to timeline, and leave
+    state at the end of the trip.
+    """
+    remaining_distance = state.remaining_distance
+    avg_speed_mps = state.avg_speed_mps
+
+    cycle_used_seconds = state.cycle_used_seconds
     cycle_limit_seconds = CYCLE_LIMIT_HOURS * HOURS_TO_SECONDS
-    
-    cumulative_distance = 0
-    distance_since_fuel = 0
-    
+
+    cumulative_distance = state.cumulative_distance
+    distance_since_fuel = state.distance_since_fuel
+
     # Shift State
-    shift_start_time = current_time
-    shift_drive_seconds = 0
-    shift_on_duty_seconds = 0
-    time_since_last_break = 0
-    
+    shift_drive_seconds = state.shift_drive_seconds
+    shift_on_duty_seconds = state.shift_on_duty_seconds
+    rest_taken = state.rest_taken
+
     trip_complete = False
     
-    # Initial Pickup (1 hour On Duty)
-    duration = 3600
-    raw_events.append({
-        "status": "ON_DUTY",
-        "start": current_time,
-        "end": current_time + timedelta(seconds=duration),
-        "duration": duration,
-        "start_dist": cumulative_distance,
-        "end_dist": cumulative_distance
-    })
-    stops_data.append({
-        "type": "Pickup",
-        "time": current_time,
-        "dist": cumulative_distance
-    })
-    current_time += timedelta(seconds=duration)
-    shift_on_duty_seconds += duration
-    cycle_used_seconds += duration
-    
     while not trip_complete:
         # Determine constraints
         
@@ -125,24 +338,16 @@ def generate_eld_sheets(route_distance_meters, route_duration_seconds, cycle_use
         time_to_dest = remaining_distance / avg_speed_mps if avg_speed_mps > 0 else 0
         
         # 3. Shift Limits (11h drive, 14h duty)
-        time_left_drive = (11 * HOURS_TO_SECONDS) - shift_drive_seconds
-        time_left_duty = (14 * HOURS_TO_SECONDS) - shift_on_duty_seconds
+        time_left_drive = (MAX_DRIVE_HOURS * HOURS_TO_SECONDS) - shift_drive_seconds
+        time_left_duty = (MAX_ON_DUTY_HOURS * HOURS_TO_SECONDS) - shift_on_duty_seconds
         
         # 4. Cycle Limit
         time_left_cycle = cycle_limit_seconds - cycle_used_seconds
         
         # 5. 8h Break Rule (Must take 30m break if driving > 8h since last break)
-        # Simplified: If we have driven 8h in this shift without a break, we need one.
-        # We track continuous drive time? Or just cumulative in shift? 
-        # DOT: "May drive only if 8 hours or less have passed since end of driver's last off-duty/sleeper period of at least 30 minutes."
-        # Actually it's: Drive limit is 11h. But you must stop for 30m before driving beyond the 8th hour of COMING ON DUTY? No, since last break.
-        # Let's use a simplified counter: time_since_last_break (counts driving time only? No, counts all time since break).
-        # Actually, let's just enforce: After 8h of DRIVING in a shift, force a 30m break.
-        time_to_8h_break = (8 * HOURS_TO_SECONDS) - shift_drive_seconds 
-        # If we already took a break, this logic might be too strict, but it's safe.
-        # Better: reset shift_drive_seconds only on 10h break. 
-        # We need a separate counter for 8h rule if we want to be precise, but for this app, 
-        # let's assume we take a break at 8h of driving.
+        # Simplified: after 8h of DRIVING in a shift, force a 30m break.
+        # shift_drive_seconds is only reset by the 10h break, so there is no
+        # separate "drive since break" counter.
         
         # DECISION LOGIC
         
@@ -150,45 +355,23 @@ def generate_eld_sheets(route_distance_meters, route_duration_seconds, cycle_use
         if time_left_drive <= 0 or time_left_duty <= 0:
             # Must take 10h break (Sleeper)
             duration = 10 * HOURS_TO_SECONDS
-            raw_events.append({
-                "status": "SLEEPER",
-                "start": current_time,
-                "end": current_time + timedelta(seconds=duration),
-                "duration": duration,
-                "start_dist": cumulative_distance,
-                "end_dist": cumulative_distance
-            })
-            stops_data.append({
-                "type": "Rest (10h)",
-                "time": current_time,
-                "dist": cumulative_distance
-            })
-            current_time += timedelta(seconds=duration)
+            timeline.add_stop(REST_10H, cumulative_distance)
+            timeline.add_event(SLEEPER, duration, cumulative_distance, cumulative_distance)
             # Reset Shift
             shift_drive_seconds = 0
             shift_on_duty_seconds = 0
+            rest_taken = False
             continue # Loop again to decide next action
             
         if time_left_cycle <= 0:
             # Must take 34h restart
             duration = 34 * HOURS_TO_SECONDS
-            raw_events.append({
-                "status": "OFF_DUTY",
-                "start": current_time,
-                "end": current_time + timedelta(seconds=duration),
-                "duration": duration,
-                "start_dist": cumulative_distance,
-                "end_dist": cumulative_distance
-            })
-            stops_data.append({
-                "type": "Cycle Restart (34h)",
-                "time": current_time,
-                "dist": cumulative_distance
-            })
-            current_time += timedelta(seconds=duration)
+            timeline.add_stop(CYCLE_RESTART, cumulative_distance)
+            timeline.add_event(OFF_DUTY, duration, cumulative_distance, cumulative_distance)
             cycle_used_seconds = 0
             shift_drive_seconds = 0
             shift_on_duty_seconds = 0
+            rest_taken = False
             continue
 
         # We can drive. How long?
@@ -197,72 +380,37 @@ def generate_eld_sheets(route_distance_meters, route_duration_seconds, cycle_use
         
         # Check 8h break
         if shift_drive_seconds < 8 * HOURS_TO_SECONDS and (shift_drive_seconds + next_event_time) > 8 * HOURS_TO_SECONDS:
-            # Cap drive at 8h mark
+            # Cap drive at 8h mark; the next loop sees we are at 8h and takes the break
             time_to_cap = (8 * HOURS_TO_SECONDS) - shift_drive_seconds
             if time_to_cap < next_event_time:
                 next_event_time = time_to_cap
-                # We will stop here, and next loop will see we are at 8h and force break?
-                # No, we need to explicitly force break if we are AT 8h.
         
-        # If we are AT 8h drive (approx), take break
-        if abs(shift_drive_seconds - 8 * HOURS_TO_SECONDS) < 60: # Tolerance
-             duration = 1800 # 30 mins
-             raw_events.append({
-                "status": "OFF_DUTY",
-                "start": current_time,
-                "end": current_time + timedelta(seconds=duration),
-                "duration": duration,
-                "start_dist": cumulative_distance,
-                "end_dist": cumulative_distance
-            })
-             stops_data.append({
-                "type": "Rest (30m)",
-                "time": current_time,
-                "dist": cumulative_distance
-            })
-             current_time += timedelta(seconds=duration)
-             # Break extends shift time but doesn't count as drive
-             shift_on_duty_seconds += duration 
-             # Actually 30m break is Off Duty, so it does NOT count to 14h window? 
-             # DOT: "The 14-hour driving window... consecutive hours." Off duty does NOT pause the 14h clock.
-             # So yes, it counts towards shift elapsed time.
-             
-             # But it allows driving to continue.
-             # Hack: reduce shift_drive_seconds to allow more driving? 
-             # No, 8h rule is "since last break". 
-             # So we need to track "drive_since_break".
-             # For simplicity: We just took a break, so we can drive another 3h (until 11h limit).
-             # We don't need to reset shift_drive_seconds (that's 11h limit).
-             # We just pass the 8h check.
-             # To avoid infinite loop of taking breaks, we need to know we JUST took one.
-             # Let's just nudge shift_drive_seconds by 1 sec to pass the equality check? 
-             # Or better, logic: if we just drove, and we are at 8h, take break.
-             # If we just took a break, we drive.
-             # Let's rely on the loop. Next iteration: shift_drive is 8h. 
-             # We need to ensure we don't trigger "If AT 8h" again.
-             # We can check if last event was OFF_DUTY.
-             if raw_events[-1]["status"] == "OFF_DUTY":
-                 pass # Don't take another break
-             else:
-                 continue # Go take the break
+        # If we are AT 8h drive (approx), take break. A re-planned trip can
+        # resume past the mark (a drive that ran long) without having had it.
+        if abs(shift_drive_seconds - 8 * HOURS_TO_SECONDS) < 60 or ( # Tolerance
+                shift_drive_seconds > 8 * HOURS_TO_SECONDS and not rest_taken):
+            duration = 1800 # 30 mins
+            timeline.add_stop(REST_30M, cumulative_distance)
+            timeline.add_event(OFF_DUTY, duration, cumulative_distance, cumulative_distance)
+            # Off duty does NOT pause the 14h clock, so the break counts
+            # towards shift elapsed time but not towards driving.
+            shift_on_duty_seconds += duration 
+            rest_taken = True
+            # shift_drive_seconds is left alone (that's the 11h limit); having
+            # just logged OFF_DUTY we carry on driving in this same iteration
+            # rather than looping back into another break.
+            if timeline.status[-1] != OFF_DUTY:
+                continue # Go take the break
         
         # DRIVE
         if next_event_time > 0:
-            raw_events.append({
-                "status": "DRIVING",
-                "start": current_time,
-                "end": current_time + timedelta(seconds=next_event_time),
-                "duration": next_event_time,
-                "start_dist": cumulative_distance,
-                "end_dist": cumulative_distance + (next_event_time * avg_speed_mps)
-            })
-            
             dist_covered = next_event_time * avg_speed_mps
+            timeline.add_event(DRIVING, next_event_time, cumulative_distance, cumulative_distance + dist_covered)
+            
             remaining_distance -= dist_covered
             cumulative_distance += dist_covered
             distance_since_fuel += dist_covered
             
-            current_time += timedelta(seconds=next_event_time)
             shift_drive_seconds += next_event_time
             shift_on_duty_seconds += next_event_time
             cycle_used_seconds += next_event_time
@@ -272,126 +420,367 @@ def generate_eld_sheets(route_distance_meters, route_duration_seconds, cycle_use
                 trip_complete = True
                 # Dropoff
                 duration = 3600
-                raw_events.append({
-                    "status": "ON_DUTY",
-                    "start": current_time,
-                    "end": current_time + timedelta(seconds=duration),
-                    "duration": duration,
-                    "start_dist": cumulative_distance,
-                    "end_dist": cumulative_distance
-                })
-                stops_data.append({
-                    "type": "Dropoff",
-                    "time": current_time,
-                    "dist": cumulative_distance
-                })
-                current_time += timedelta(seconds=duration)
+                timeline.add_stop(DROPOFF, cumulative_distance)
+                timeline.add_event(ON_DUTY, duration, cumulative_distance, cumulative_distance)
                 
             elif distance_since_fuel >= FUEL_RANGE_METERS - 100:
                 # Fuel
                 duration = 1800
-                raw_events.append({
-                    "status": "ON_DUTY",
-                    "start": current_time,
-                    "end": current_time + timedelta(seconds=duration),
-                    "duration": duration,
-                    "start_dist": cumulative_distance,
-                    "end_dist": cumulative_distance
-                })
-                stops_data.append({
-                    "type": "Fuel",
-                    "time": current_time,
-                    "dist": cumulative_distance
-                })
-                current_time += timedelta(seconds=duration)
+                timeline.add_stop(FUEL, cumulative_distance)
+                timeline.add_event(ON_DUTY, duration, cumulative_distance, cumulative_distance)
                 distance_since_fuel = 0
                 shift_on_duty_seconds += duration
                 cycle_used_seconds += duration
+        else:
+            # Zero-length (or zero-duration) route: nothing to drive, so go
+            # straight to dropoff instead of spinning on a 0s drive forever.
+            trip_complete = True
+            duration = 3600
+            timeline.add_stop(DROPOFF, cumulative_distance)
+            timeline.add_event(ON_DUTY, duration, cumulative_distance, cumulative_distance)
 
-    # --- STEP 2: Bucket into Calendar Days (Midnight to Midnight) ---
-    
-    daily_logs = []
-    
-    # Helper to get midnight of a datetime
-    def get_midnight(dt):
-        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    trip_start = raw_events[0]["start"]
-    trip_end = raw_events[-1]["end"]
-    
-    current_day_start = get_midnight(trip_start)
-    
-    while current_day_start < trip_end:
-        current_day_end = current_day_start + timedelta(days=1)
-        
-        day_log = {
-            "day_no": len(daily_logs) + 1,
-            "date": current_day_start.strftime("%Y-%m-%d"),
-            "grid_events": [],
-            "stops": [],
-            "summary": {
-                "drive_hours": 0,
-                "on_duty_hours": 0,
-                "distance_miles": 0
+    state.remaining_distance = remaining_distance
+    state.cumulative_distance = cumulative_distance
+    state.distance_since_fuel = distance_since_fuel
+    state.shift_drive_seconds = shift_drive_seconds
+    state.shift_on_duty_seconds = shift_on_duty_seconds
+    state.cycle_used_seconds = cycle_used_seconds
+    state.rest_taken = rest_taken
+
+
+class ScheduleCache:
+    """
+    LRU of simulated Timelines. A Timeline is relative to the trip start and
+    only depends on the distance, average speed and cycle used, so one
+    schedule serves a lane at any start time: callers bucket it into days
+    against their own start_time.
+
+    Keys are those three inputs rounded to the given quanta (0 keeps them
+    exact). With quanta the schedule is simulated for the rounded inputs,
+    so every trip in a bucket gets the same one whichever came first.
+    Timelines handed out are shared and must not be modified.
+    """
+
+    def __init__(self, max_entries, distance_quantum=0, speed_quantum=0, cycle_quantum=0):
+        self.max_entries = max_entries
+        self.quanta = (distance_quantum, speed_quantum, cycle_quantum)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, route_distance_meters, route_duration_seconds, cycle_used_hours):
+        """The Timeline _simulate_events would return for these inputs."""
+        if not self.max_entries:
+            return _simulate_events(route_distance_meters, route_duration_seconds, cycle_used_hours)
+
+        speed = route_distance_meters / route_duration_seconds if route_duration_seconds > 0 else 0
+        key = tuple(
+            round(value / quantum) * quantum if quantum else value
+            for value, quantum in zip((route_distance_meters, speed, cycle_used_hours), self.quanta)
+        )
+        with self._lock:
+            timeline = self._entries.get(key)
+            if timeline is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return timeline
+            self.misses += 1
+
+        # Simulated outside the lock; two threads missing on the same key
+        # both simulate and store the same schedule
+        if any(self.quanta):
+            distance, speed, cycle_used = key
+            timeline = _simulate_events(distance, distance / speed if speed > 0 else 0, cycle_used)
+        else:
+            timeline = _simulate_events(route_distance_meters, route_duration_seconds, cycle_used_hours)
+        with self._lock:
+            self._entries[key] = timeline
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return timeline
+
+    def info(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "entries": len(self._entries),
             }
-        }
-        
-        # Find events that overlap with this day
-        for event in raw_events:
-            # Event interval: [e_start, e_end]
-            # Day interval: [d_start, d_end]
-            
-            e_start = event["start"]
-            e_end = event["end"]
-            
-            # Overlap logic
-            overlap_start = max(e_start, current_day_start)
-            overlap_end = min(e_end, current_day_end)
-            
-            if overlap_start < overlap_end:
-                # There is an overlap
-                duration = (overlap_end - overlap_start).total_seconds()
-                
-                day_log["grid_events"].append({
-                    "status": event["status"],
-                    "start": overlap_start.isoformat(),
-                    "end": overlap_end.isoformat(),
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_schedule_cache = None
+_schedule_cache_lock = threading.Lock()
+
+
+def get_schedule_cache():
+    """The per-process ScheduleCache, configured from the SCHEDULE_CACHE_* settings."""
+    global _schedule_cache
+    with _schedule_cache_lock:
+        if _schedule_cache is None:
+            _schedule_cache = ScheduleCache(
+                settings.SCHEDULE_CACHE_MAX_ENTRIES,
+                settings.SCHEDULE_CACHE_DISTANCE_METERS,
+                settings.SCHEDULE_CACHE_SPEED_MPS,
+                settings.SCHEDULE_CACHE_CYCLE_HOURS,
+            )
+        return _schedule_cache
+
+
+def _replay(timeline, state, end):
+    """Advance state over the first `end` events of timeline."""
+    stop = 0
+    for i in range(end):
+        status = timeline.status[i]
+        if status == DRIVING:
+            state.apply(status, None, timeline.duration[i], timeline.end_dist[i] - timeline.start_dist[i])
+        else:
+            # Every other event opens with its stop, in the same order
+            state.apply(status, timeline.stop_type[stop], timeline.duration[i], 0)
+            stop += 1
+
+
+def _truncate(timeline, end):
+    """A new Timeline of the first `end` events and the stops before them."""
+    kept = Timeline()
+    boundary = timeline.start_us[end] if end < len(timeline) else timeline.end
+    stops = bisect_left(timeline.stop_us, boundary)
+    for name in Timeline.__slots__:
+        column = getattr(timeline, name)
+        setattr(kept, name, column[:stops] if name.startswith("stop_") else column[:end])
+    return kept
+
+
+def _apply_update(timeline, fixed, state_args, elapsed_meters, at_us=None, delay_seconds=0):
+    """
+    Re-plan timeline after the truck reports elapsed_meters driven and,
+    optionally, the actual clock at_us (relative to the trip start) and
+    delay_seconds of extra on-duty time from there on.
+
+    The events up to the point the truck reached are kept, the drive it is
+    in is cut short there (ending at at_us instead of the planned time),
+    the delay is logged and everything after is simulated again from the
+    rebuilt HosState. Nothing before the first `fixed` events (the pickup
+    and earlier updates) is changed.
+
+    Returns (new timeline, its fixed event count, HosState at the cut as a
+    dict, microseconds of the first changed instant).
+    """
+    if elapsed_meters < 0 or delay_seconds < 0:
+        raise ValueError("Elapsed distance and delay must not be negative")
+    if elapsed_meters > timeline.end_dist[-1] + 1:
+        raise ValueError("Elapsed distance is past the dropoff")
+    elapsed_meters = min(elapsed_meters, timeline.end_dist[-1])
+
+    # The drive the truck is in, if it got past the fixed events
+    cut = None
+    if elapsed_meters > timeline.end_dist[fixed - 1]:
+        cut = next(
+            i for i in range(fixed, len(timeline))
+            if timeline.status[i] == DRIVING and timeline.end_dist[i] >= elapsed_meters
+        )
+
+    state = HosState(*state_args)
+    if cut is None:
+        # Hasn't driven since the last checkpoint: any time past it was spent on duty
+        new = _truncate(timeline, fixed)
+        _replay(new, state, fixed)
+        if at_us is not None:
+            if at_us < new.end:
+                raise ValueError("Actual time is before the last checkpoint")
+            delay_seconds += (at_us - new.end) / 1e6
+    else:
+        new = _truncate(timeline, cut)
+        _replay(new, state, cut)
+        start_dist = timeline.start_dist[cut]
+        distance = elapsed_meters - start_dist
+        planned = timeline.duration[cut] * distance / (timeline.end_dist[cut] - start_dist)
+        if at_us is None:
+            duration = planned
+        elif at_us <= new.end:
+            raise ValueError("Actual time is before the current drive started")
+        else:
+            duration = (at_us - new.end) / 1e6
+        new.add_event(DRIVING, duration, start_dist, elapsed_meters)
+        state.apply(DRIVING, None, duration, distance)
+    changed_us = timeline.start_us[cut] if cut is not None else new.end
+
+    if delay_seconds > 0:
+        new.add_stop(DELAY, state.cumulative_distance)
+        new.add_event(ON_DUTY, delay_seconds, state.cumulative_distance, state.cumulative_distance)
+        state.apply(ON_DUTY, DELAY, delay_seconds, 0)
+    checkpoint = state.as_dict()
+    fixed = len(new)
+
+    # A cut right where the drive would have ended owes the stop that ended it
+    if state.remaining_distance <= 100:
+        new.add_stop(DROPOFF, state.cumulative_distance)
+        new.add_event(ON_DUTY, 3600, state.cumulative_distance, state.cumulative_distance)
+    else:
+        if state.distance_since_fuel >= FUEL_RANGE_METERS - 100:
+            new.add_stop(FUEL, state.cumulative_distance)
+            new.add_event(ON_DUTY, 1800, state.cumulative_distance, state.cumulative_distance)
+            state.apply(ON_DUTY, FUEL, 1800, 0)
+        _drive(new, state)
+    return new, fixed, checkpoint, changed_us
+
+
+def replan_timeline(route_distance_meters, route_duration_seconds, cycle_used_hours, updates):
+    """
+    The Timeline of a trip after a sequence of updates, each an
+    (elapsed_meters, at_us or None, delay_seconds) applied after the
+    previous one. Returns (timeline, HosState dict at the last update,
+    microseconds of the first instant the last update changed).
+    """
+    state_args = (route_distance_meters, route_duration_seconds, cycle_used_hours)
+    timeline = get_schedule_cache().get(*state_args)
+    # The pickup is never re-planned
+    fixed = 1
+    checkpoint = None
+    changed_us = timeline.end
+    for update in updates:
+        timeline, fixed, checkpoint, changed_us = _apply_update(timeline, fixed, state_args, *update)
+    return timeline, checkpoint, changed_us
+
+
+def replan_eld_sheets(route_distance_meters, route_duration_seconds, cycle_used_hours, start_time,
+                      updates, previous_days, route_geometry=None):
+    """
+    Daily logs of a trip re-planned with updates (see replan_timeline),
+    where previous_days are the logs of the same trip with all but the last
+    update. Days that end before the last update changed anything are
+    reused from previous_days as they are; only the rest are bucketed.
+    Returns (days, HosState dict at the last update, days reused).
+    """
+    timeline, checkpoint, changed_us = replan_timeline(
+        route_distance_meters, route_duration_seconds, cycle_used_hours, updates,
+    )
+    changed = start_time + timedelta(microseconds=changed_us)
+    first_day = min((_get_midnight(changed) - _get_midnight(start_time)).days, len(previous_days))
+    route_index = RouteIndex(route_geometry) if route_geometry else None
+    days = list(previous_days[:first_day])
+    days.extend(_iter_days(timeline, start_time, route_index, first_day, _stop_pois(route_index)))
+    return days, checkpoint, first_day
+
+
+def _get_midnight(dt):
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_into_days(timeline, start_time, route_index=None, pois=None):
+    """All of _iter_days as a list."""
+    return list(_iter_days(timeline, start_time, route_index, pois=pois))
+
+
+def _iter_days(timeline, start_time, route_index=None, first_day=0, pois=None):
+    """
+    Buckets the timeline's events and stops into calendar days (midnight to
+    midnight), anchored at start_time, yielding each day's log as soon as it
+    is complete. first_day skips that many leading days (a re-plan reuses
+    them from the previous plan). With a poi.PoiIndex, fuel and rest stops
+    are moved to the nearest suitable place and carry it as "poi".
+
+    Single sweep over the time-ordered events and stops: each event is split
+    at the midnight boundaries it crosses, with event and stop pointers that
+    only move forward, so the cost is O(days + events + stops) and only one
+    day's log is built at a time. All comparisons use integer microsecond
+    offsets; datetimes are only built for the output.
+    """
+    trip_end = start_time + timedelta(microseconds=timeline.end)
+    if pois is not None:
+        snap_meters = settings.POI_SNAP_MILES * MILES_TO_METERS
+
+    num_events = len(timeline)
+    num_stops = len(timeline.stop_type)
+    day_no = first_day
+    day_date = _get_midnight(start_time) + timedelta(days=first_day)
+    # Pointers as the sweep would have left them at day_date
+    day_start = (day_date - start_time) // _ONE_US
+    event = bisect_right(timeline.end_us, day_start)
+    stop = bisect_left(timeline.stop_us, day_start)
+
+    while day_date < trip_end:
+        next_date = day_date + timedelta(days=1)
+        day_start = (day_date - start_time) // _ONE_US
+        day_end = (next_date - start_time) // _ONE_US
+        day_no += 1
+
+        grid_events = []
+        drive_seconds = 0
+        on_duty_seconds = 0
+        distance_miles = 0
+
+        # Events are contiguous, so every event overlapping this day starts
+        # at or after the first one that had not ended by the previous midnight
+        i = event
+        while i < num_events and timeline.start_us[i] < day_end:
+            e_start = timeline.start_us[i]
+            e_end = timeline.end_us[i]
+            if e_start < e_end and e_end > day_start:
+                status = timeline.status[i]
+                overlap_start = max(e_start, day_start)
+                overlap_end = min(e_end, day_end)
+                duration = (overlap_end - overlap_start) / 1e6
+
+                grid_events.append({
+                    "status": STATUS_NAMES[status],
+                    "start": (start_time + timedelta(microseconds=overlap_start)).isoformat(),
+                    "end": (start_time + timedelta(microseconds=overlap_end)).isoformat(),
                     "duration": duration
                 })
-                
-                # Update summary
-                if event["status"] == "DRIVING":
-                    day_log["summary"]["drive_hours"] += duration
+
+                if status == DRIVING:
+                    drive_seconds += duration
                     # Pro-rate distance
-                    total_event_dist = event["end_dist"] - event["start_dist"]
-                    total_event_dur = event["duration"]
+                    total_event_dur = timeline.duration[i]
                     if total_event_dur > 0:
+                        total_event_dist = timeline.end_dist[i] - timeline.start_dist[i]
                         dist_fraction = duration / total_event_dur
-                        day_log["summary"]["distance_miles"] += (total_event_dist * dist_fraction / MILES_TO_METERS)
-                
-                if event["status"] in ["DRIVING", "ON_DUTY"]:
-                    day_log["summary"]["on_duty_hours"] += duration
-                    
-        # Find stops in this day
-        for stop in stops_data:
-            if current_day_start <= stop["time"] < current_day_end:
-                # Get coord
+                        distance_miles += (total_event_dist * dist_fraction / MILES_TO_METERS)
+
+                if status == DRIVING or status == ON_DUTY:
+                    on_duty_seconds += duration
+            i += 1
+        while event < num_events and timeline.end_us[event] <= day_end:
+            event += 1
+
+        stops = []
+        while stop < num_stops and timeline.stop_us[stop] < day_end:
+            stop_us = timeline.stop_us[stop]
+            if stop_us >= day_start:
+                stop_name = STOP_NAMES[timeline.stop_type[stop]]
                 coord = None
-                if route_geometry:
-                    coord = get_coordinate_at_distance(route_geometry, stop["dist"])
-                
-                day_log["stops"].append({
-                    "type": stop["type"],
-                    "time": stop["time"].strftime("%H:%M"),
+                if route_index:
+                    coord = route_index.coordinate_at(timeline.stop_dist[stop])
+
+                entry = {
+                    "type": stop_name,
+                    "time": (start_time + timedelta(microseconds=stop_us)).strftime("%H:%M"),
                     "coord": coord
-                })
-        
-        # Round summary
-        day_log["summary"]["drive_hours"] = round(day_log["summary"]["drive_hours"] / 3600, 2)
-        day_log["summary"]["on_duty_hours"] = round(day_log["summary"]["on_duty_hours"] / 3600, 2)
-        day_log["summary"]["distance_miles"] = round(day_log["summary"]["distance_miles"], 2)
-        
-        daily_logs.append(day_log)
-        current_day_start = current_day_end
+                }
+                if pois is not None and coord and stop_name in STOP_KINDS:
+                    entry["coord"], entry["poi"] = pois.snap(stop_name, coord, snap_meters)
+                stops.append(entry)
+            stop += 1
+
+        yield {
+            "day_no": day_no,
+            "date": day_date.strftime("%Y-%m-%d"),
+            "grid_events": grid_events,
+            "stops": stops,
+            "summary": {
+                "drive_hours": round(drive_seconds / 3600, 2),
+                "on_duty_hours": round(on_duty_seconds / 3600, 2),
+                "distance_miles": round(distance_miles, 2)
+            }
+        }
+        day_date = next_date
 
-    return daily_logs
\ No newline at end of file
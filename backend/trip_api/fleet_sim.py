@@ -0,0 +1,174 @@
+"""
+Vectorized HOS simulator for fleet-scale what-if sweeps.
+
+Advances many trips in lockstep with NumPy, applying the same rules, in the
+same order and with the same float arithmetic, as the scalar
+eld_logs._simulate_events loop: 1h pickup, fuel every 1000 miles, 30m break
+at 8h of driving, 10h sleeper at the 11h drive / 14h duty limits, 34h
+restart at the 70h cycle limit and 1h dropoff. Only per-trip summaries are
+produced; full log sheets come from the scalar engine, and only for the
+trips asked for.
+
+NumPy is not part of the serverless bundle; install requirements-fleet.txt.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from .eld_logs import HOURS_TO_SECONDS, MILES_TO_METERS, generate_eld_sheets
+
+
+MAX_DRIVE_SECONDS = 11 * HOURS_TO_SECONDS
+MAX_ON_DUTY_SECONDS = 14 * HOURS_TO_SECONDS
+BREAK_AFTER_DRIVE_SECONDS = 8 * HOURS_TO_SECONDS
+CYCLE_LIMIT_SECONDS = 70 * HOURS_TO_SECONDS
+FUEL_RANGE_METERS = 1000 * MILES_TO_METERS
+
+US = 1000000
+DAY_US = 24 * HOURS_TO_SECONDS * US
+
+
+def _to_us(seconds):
+    """Vectorized eld_logs._to_us: float seconds to whole microseconds, timedelta rounding."""
+    whole = np.trunc(seconds)
+    return whole.astype(np.int64) * US + np.round((seconds - whole) * 1e6).astype(np.int64)
+
+
+def simulate_fleet(route_distance_meters, route_duration_seconds, cycle_used_hours,
+                   start_times=None, log_sheets=None):
+    """
+    Simulate every scenario at once. Arguments broadcast against each other,
+    so a single route can be swept over arrays of cycle_used_hours and
+    start_times (datetimes or datetime64).
+
+    Returns a dict of arrays, one entry per scenario:
+        arrival          datetime64[us] end of the dropoff
+        elapsed_hours    trip start to end of dropoff
+        days             number of daily log sheets
+        fuel_stops, rest_30m_stops, rest_10h_stops, cycle_restarts
+    log_sheets, an iterable of scenario indexes, adds "log_sheets":
+    {index: generate_eld_sheets(...)} for just those scenarios.
+    """
+    if start_times is None:
+        start_times = datetime.now()
+
+    distance, duration, cycle_hours, start = np.broadcast_arrays(
+        np.asarray(route_distance_meters, dtype=np.float64),
+        np.asarray(route_duration_seconds, dtype=np.float64),
+        np.asarray(cycle_used_hours, dtype=np.float64),
+        np.asarray(start_times, dtype="datetime64[us]"),
+    )
+    distance = distance.ravel()
+    duration = duration.ravel()
+    cycle_hours = cycle_hours.ravel()
+    start = start.ravel()
+    n = distance.size
+
+    has_speed = duration > 0
+    avg_speed = np.where(has_speed, distance / np.where(has_speed, duration, 1.0), 0.0)
+    moving = avg_speed > 0
+    safe_speed = np.where(moving, avg_speed, 1.0)
+
+    remaining = distance.copy()
+    distance_since_fuel = np.zeros(n)
+    shift_drive = np.zeros(n)
+    shift_on_duty = np.zeros(n)
+    cycle_used = cycle_hours * HOURS_TO_SECONDS
+    elapsed_us = np.zeros(n, dtype=np.int64)
+
+    fuel_stops = np.zeros(n, dtype=np.int64)
+    rest_30m = np.zeros(n, dtype=np.int64)
+    rest_10h = np.zeros(n, dtype=np.int64)
+    restarts = np.zeros(n, dtype=np.int64)
+
+    # Initial Pickup (1 hour On Duty)
+    elapsed_us += HOURS_TO_SECONDS * US
+    shift_on_duty += HOURS_TO_SECONDS
+    cycle_used += HOURS_TO_SECONDS
+
+    active = np.ones(n, dtype=bool)
+    while active.any():
+        time_to_fuel = np.where(moving, (FUEL_RANGE_METERS - distance_since_fuel) / safe_speed, 999999)
+        time_to_dest = np.where(moving, remaining / safe_speed, 0)
+        time_left_drive = MAX_DRIVE_SECONDS - shift_drive
+        time_left_duty = MAX_ON_DUTY_SECONDS - shift_on_duty
+        time_left_cycle = CYCLE_LIMIT_SECONDS - cycle_used
+
+        # 10h sleeper at the shift limits
+        sleeper = active & ((time_left_drive <= 0) | (time_left_duty <= 0))
+        # 34h restart at the cycle limit
+        restart = active & ~sleeper & (time_left_cycle <= 0)
+        go = active & ~sleeper & ~restart
+
+        elapsed_us += np.where(sleeper, 10 * HOURS_TO_SECONDS * US, 0)
+        elapsed_us += np.where(restart, 34 * HOURS_TO_SECONDS * US, 0)
+        rest_10h += sleeper
+        restarts += restart
+        cycle_used = np.where(restart, 0, cycle_used)
+        reset = sleeper | restart
+        shift_drive = np.where(reset, 0, shift_drive)
+        shift_on_duty = np.where(reset, 0, shift_on_duty)
+
+        # How long can we drive?
+        next_event_time = np.minimum.reduce(
+            [time_to_fuel, time_to_dest, time_left_drive, time_left_duty, time_left_cycle]
+        )
+        time_to_cap = BREAK_AFTER_DRIVE_SECONDS - shift_drive
+        capped = ((shift_drive < BREAK_AFTER_DRIVE_SECONDS)
+                  & (shift_drive + next_event_time > BREAK_AFTER_DRIVE_SECONDS)
+                  & (time_to_cap < next_event_time))
+        next_event_time = np.where(capped, time_to_cap, next_event_time)
+
+        # 30m break at 8h of driving; like the scalar loop, driving then
+        # continues in the same step with the already computed drive time
+        take_break = go & (np.abs(shift_drive - BREAK_AFTER_DRIVE_SECONDS) < 60)
+        elapsed_us += np.where(take_break, 1800 * US, 0)
+        shift_on_duty = np.where(take_break, shift_on_duty + 1800, shift_on_duty)
+        rest_30m += take_break
+
+        drive = go & (next_event_time > 0)
+        dist_covered = next_event_time * avg_speed
+        remaining = np.where(drive, remaining - dist_covered, remaining)
+        distance_since_fuel = np.where(drive, distance_since_fuel + dist_covered, distance_since_fuel)
+        elapsed_us += np.where(drive, _to_us(np.where(drive, next_event_time, 0)), 0)
+        shift_drive = np.where(drive, shift_drive + next_event_time, shift_drive)
+        shift_on_duty = np.where(drive, shift_on_duty + next_event_time, shift_on_duty)
+        cycle_used = np.where(drive, cycle_used + next_event_time, cycle_used)
+
+        # Dropoff when arrived, or right away when there is nothing to drive
+        arrived = (drive & (remaining <= 100)) | (go & ~drive)
+        fuel = drive & ~arrived & (distance_since_fuel >= FUEL_RANGE_METERS - 100)
+
+        elapsed_us += np.where(arrived, HOURS_TO_SECONDS * US, 0)
+        active &= ~arrived
+
+        elapsed_us += np.where(fuel, 1800 * US, 0)
+        distance_since_fuel = np.where(fuel, 0, distance_since_fuel)
+        shift_on_duty = np.where(fuel, shift_on_duty + 1800, shift_on_duty)
+        cycle_used = np.where(fuel, cycle_used + 1800, cycle_used)
+        fuel_stops += fuel
+
+    start_us = start.astype(np.int64)
+    midnight_us = start.astype("datetime64[D]").astype("datetime64[us]").astype(np.int64)
+    end_us = start_us + elapsed_us
+
+    result = {
+        "arrival": end_us.astype("datetime64[us]"),
+        "elapsed_hours": elapsed_us / (HOURS_TO_SECONDS * US),
+        "days": (end_us - midnight_us + DAY_US - 1) // DAY_US,
+        "fuel_stops": fuel_stops,
+        "rest_30m_stops": rest_30m,
+        "rest_10h_stops": rest_10h,
+        "cycle_restarts": restarts,
+    }
+
+    if log_sheets is not None:
+        result["log_sheets"] = {
+            int(i): generate_eld_sheets(
+                float(distance[i]), float(duration[i]), float(cycle_hours[i]),
+                start_time=start[i].astype(datetime),
+            )
+            for i in log_sheets
+        }
+
+    return result
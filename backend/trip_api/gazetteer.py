@@ -0,0 +1,277 @@
+"""
+In-process geocoding of place names ("Chicago, IL", "saint louis missouri")
+from a gazetteer file, without a network call.
+
+The file is CSV with a header of name, state, lat, lng and optionally
+population, like the sample in trip_api/data/. The US Census Bureau's
+national places gazetteer (tab-separated NAME, USPS, INTPTLAT, INTPTLONG
+columns) loads as is: its "city"/"town"/"CDP" suffixes are dropped and,
+having no population, its places are ranked by land area instead.
+
+Names are normalized to tokens (lowercase, no accents or punctuation,
+"saint" to "st" and so on) and indexed, together with the state's code and
+name, in an inverted index from token to places. A query matches the places that have a
+token for every query token: the same token, a token it is a prefix of
+("chica") or one edit away ("chicgo"), and that account for the whole place
+name. The best has the most exact tokens, then the largest population.
+Anything else in the input (a street, a ZIP code, another country, just a
+state) leaves a token unmatched and the lookup returns None.
+"""
+import csv
+import logging
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "district of columbia": "dc",
+    "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id", "illinois": "il",
+    "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or",
+    "pennsylvania": "pa", "puerto rico": "pr", "rhode island": "ri", "south carolina": "sc",
+    "south dakota": "sd", "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt",
+    "virginia": "va", "washington": "wa", "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+}
+
+ABBREVIATIONS = {"saint": "st", "sainte": "ste", "mount": "mt", "fort": "ft", "point": "pt"}
+
+# State names are single tokens ("new_york") that also match the state code:
+# a place is indexed under both, and "Chicago, Illinois" matches the "il"
+# of Chicago, IL. Longest names first so "west virginia" wins over "virginia".
+STATE_PHRASES = re.compile(r"\b(" + "|".join(sorted(STATES, key=len, reverse=True)) + r")\b")
+STATE_CODES = {name.replace(" ", "_"): code for name, code in STATES.items()}
+STATE_TOKENS = {code: name for name, code in STATE_CODES.items()}
+COUNTRY = re.compile(r"\b(usa|united states( of america)?)$")
+CENSUS_SUFFIX = re.compile(r"\s+(city|town|village|borough|CDP|municipality|\(balance\))$")
+
+# Prefixes shorter than this don't expand ("s" would match half the index),
+# typos are only forgiven in tokens at least FUZZY_MIN_LENGTH long and a
+# query token expands to at most MAX_EXPANSIONS index tokens.
+PREFIX_MIN_LENGTH = 3
+FUZZY_MIN_LENGTH = 4
+MAX_EXPANSIONS = 64
+
+EXACT, PREFIX, FUZZY = 2, 1, 0
+
+
+def normalize(text):
+    """Tokens of text, normalized the same way for places and queries."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"[^a-z0-9]+", " ", text).strip()
+    text = COUNTRY.sub("", text)
+    text = STATE_PHRASES.sub(lambda m: m.group(1).replace(" ", "_"), text)
+    return [ABBREVIATIONS.get(token, token) for token in text.split()]
+
+
+def state_tokens(state):
+    """The code and name tokens of a state given either way ("IL", "Illinois")."""
+    tokens = normalize(state)
+    if len(tokens) == 1:
+        code = STATE_CODES.get(tokens[0], tokens[0])
+        if code in STATE_TOKENS:
+            return [code, STATE_TOKENS[code]]
+    return tokens
+
+
+def deletes(token):
+    """token with each of its characters removed in turn."""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class Gazetteer:
+
+    def __init__(self, places):
+        """places is an iterable of (name, state, lat, lng, weight)."""
+        self.names = []
+        self.lat = array("d")
+        self.lng = array("d")
+        # Tie-breaker between equally good matches, e.g. the population
+        self.weight = array("q")
+        # Per place: its distinct name tokens followed by its state tokens
+        self.tokens = []
+        self.name_lengths = array("b")
+
+        postings = {}
+        # Sorted tokens of "name", "name, ST" and "name, State" -> the
+        # heaviest place with exactly that name, which answers well-formed
+        # queries in one dict lookup
+        exact = {}
+        for name, state, lat, lng, weight in places:
+            i = len(self.names)
+            name_tokens = normalize(name)
+            states = state_tokens(state)
+            tokens = tuple(dict.fromkeys(name_tokens + states))
+            self.names.append(f"{name}, {state}")
+            self.lat.append(lat)
+            self.lng.append(lng)
+            self.weight.append(weight)
+            self.tokens.append(tokens)
+            self.name_lengths.append(len(set(name_tokens)))
+            for token in tokens:
+                postings.setdefault(token, array("i")).append(i)
+            for key in [name_tokens] + [name_tokens + [token] for token in states]:
+                key = tuple(sorted(key))
+                if key not in exact or weight > self.weight[exact[key]]:
+                    exact[key] = i
+
+        self.postings = postings
+        self.exact = exact
+        # Sorted vocabulary for prefix ranges and a symmetric-delete index
+        # for one-edit typos: two tokens are within one insertion, deletion,
+        # substitution or adjacent swap when they share a deletion variant
+        # (or one is a deletion of the other)
+        self.vocabulary = sorted(postings)
+        variants = {}
+        for token in self.vocabulary:
+            if len(token) >= FUZZY_MIN_LENGTH:
+                for variant in deletes(token):
+                    variants.setdefault(variant, []).append(token)
+        self.variants = {variant: tuple(tokens) for variant, tokens in variants.items()}
+
+    @classmethod
+    def load(cls, path):
+        return cls(read_places(path))
+
+    def __len__(self):
+        return len(self.names)
+
+    def expand(self, token):
+        """{index token: EXACT/PREFIX/FUZZY} that token can match."""
+        if token in self.postings:
+            matches = {token: EXACT}
+        else:
+            matches = {}
+            if len(token) >= PREFIX_MIN_LENGTH:
+                i = bisect_left(self.vocabulary, token)
+                while i < len(self.vocabulary) and self.vocabulary[i].startswith(token) and len(matches) < MAX_EXPANSIONS:
+                    matches[self.vocabulary[i]] = PREFIX
+                    i += 1
+            if not matches and len(token) >= FUZZY_MIN_LENGTH:
+                found = set(self.variants.get(token, ()))
+                for variant in deletes(token):
+                    if variant in self.postings:
+                        found.add(variant)
+                    found.update(self.variants.get(variant, ()))
+                matches = {t: FUZZY for t in sorted(found)[:MAX_EXPANSIONS]}
+        # A state name also matches the code, even where a place name
+        # claims the token ("Kansas" City)
+        for name, quality in list(matches.items()):
+            if name in STATE_CODES:
+                matches.setdefault(STATE_CODES[name], quality)
+        return matches
+
+    def search(self, text):
+        """The best matching place index for text, or None."""
+        tokens = normalize(text)
+        if not tokens:
+            return None
+        place = self.exact.get(tuple(sorted(tokens)))
+        if place is not None:
+            return place
+
+        expanded = []
+        for token in tokens:
+            matches = self.expand(token)
+            if not matches:
+                return None
+            expanded.append(matches)
+
+        # Start from the query token with the fewest places and keep those
+        # that have a match for every other query token too
+        walk = sorted(expanded, key=lambda matches: sum(len(self.postings[t]) for t in matches))
+        candidates = set().union(*(self.postings[t] for t in walk[0]))
+        for matches in walk[1:]:
+            candidates = [place for place in candidates if any(t in matches for t in self.tokens[place])]
+
+        best = None
+        best_score = None
+        for place in candidates:
+            # Each query token takes the best unused place token it matches,
+            # so "Kansas City, Kansas" needs a third token (the "ks")
+            tokens = self.tokens[place]
+            used = set()
+            score = 0
+            for matches in expanded:
+                pick = None
+                for t in tokens:
+                    if t in matches and t not in used and (pick is None or matches[t] > matches[pick]):
+                        pick = t
+                if pick is None:
+                    break
+                used.add(pick)
+                score += matches[pick]
+            else:
+                # "Oklahoma" is not Oklahoma City
+                if not all(t in used for t in tokens[:self.name_lengths[place]]):
+                    continue
+                key = (score, self.weight[place])
+                if best_score is None or key > best_score:
+                    best = place
+                    best_score = key
+        return best
+
+    def geocode(self, text):
+        """{"lat", "lng"} of the best match for text, or None."""
+        place = self.search(text)
+        if place is None:
+            return None
+        return {"lat": self.lat[place], "lng": self.lng[place]}
+
+
+def read_places(path):
+    """Yields (name, state, lat, lng, weight) from a gazetteer file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = f.readline()
+        delimiter = "\t" if "\t" in header else ","
+        columns = [column.strip() for column in header.split(delimiter)]
+        census = "USPS" in columns
+        for row in csv.reader(f, delimiter=delimiter):
+            if not row:
+                continue
+            record = dict(zip(columns, (value.strip() for value in row)))
+            if census:
+                yield (
+                    CENSUS_SUFFIX.sub("", record["NAME"]), record["USPS"],
+                    float(record["INTPTLAT"]), float(record["INTPTLONG"]), int(record.get("ALAND") or 0),
+                )
+            else:
+                yield (
+                    record["name"], record["state"], float(record["lat"]), float(record["lng"]),
+                    int(record.get("population") or 0),
+                )
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def gazetteer_loaded():
+    """True once get_gazetteer has loaded GAZETTEER_PATH in this process."""
+    return _gazetteer is not None
+
+
+def get_gazetteer():
+    """The gazetteer at GAZETTEER_PATH, loaded on first use and kept per process."""
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            started = time.perf_counter()
+            _gazetteer = Gazetteer.load(settings.GAZETTEER_PATH)
+            logger.info(
+                "Loaded gazetteer %s: %d places, %d tokens in %.2fs",
+                settings.GAZETTEER_PATH, len(_gazetteer), len(_gazetteer.vocabulary),
+                time.perf_counter() - started,
+            )
+        return _gazetteer
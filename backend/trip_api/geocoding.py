@@ -0,0 +1,34 @@
+"""
+Geocoding backend selection. GEOCODING_BACKEND = "ors" geocodes every
+address through ORS; "local" first looks the address up in the gazetteer
+(gazetteer.py), which answers known place names in-process, and falls back
+to ORS for anything it doesn't match, unless GEOCODING_ORS_FALLBACK is off.
+"""
+from django.conf import settings
+
+from . import ors_client
+from .gazetteer import get_gazetteer
+from .metrics import stage
+
+
+def local_geocode(address):
+    """
+    geocode_address from the gazetteer. Returns None when ORS should be
+    asked instead: the backend is "ors", or the gazetteer has no match and
+    GEOCODING_ORS_FALLBACK is on.
+    """
+    if settings.GEOCODING_BACKEND != "local":
+        return None
+    with stage("local-geocode"):
+        coord = get_gazetteer().geocode(address)
+    if coord is None and not settings.GEOCODING_ORS_FALLBACK:
+        raise ValueError(f"Address not found: {address}")
+    return coord
+
+
+def geocode_address(address):
+    """ors_client.geocode_address through the configured backend."""
+    coord = local_geocode(address)
+    if coord is None:
+        coord = ors_client.geocode_address(address)
+    return coord
@@ -0,0 +1,190 @@
+"""
+Route geometry simplification and wire encoding for map payloads.
+
+A radial-distance pre-pass followed by Douglas–Peucker over [lng, lat]
+polylines, with the tolerance given in meters. Distances are measured in a
+local equirectangular projection, which is accurate to well under a meter
+at the tolerances used here.
+"""
+import base64
+import math
+import struct
+
+import polyline
+
+
+METERS_PER_DEGREE = 111320
+# 1 mile ≈ 1.60934 km
+MILES_TO_METERS = 1609.34
+
+# Tolerance in meters for each detail level accepted by the trip-plan API.
+# "full" returns the geometry untouched.
+DETAIL_TOLERANCES = {
+    "full": 0,
+    "high": 5,
+    "medium": 25,
+    "low": 100,
+}
+
+
+def simplify(geometry, tolerance_meters):
+    """
+    Returns a simplified copy of geometry (list of [lng, lat]). Dropped
+    vertices lie within about tolerance_meters of the result (at most twice
+    that, counting the radial pre-pass). The first and last vertices are
+    always kept, unchanged.
+    """
+    n = len(geometry)
+    if tolerance_meters <= 0 or n < 3:
+        return list(geometry)
+
+    # Project once to local meters around the route's mean latitude
+    mean_lat = sum(p[1] for p in geometry) / n
+    kx = METERS_PER_DEGREE * math.cos(math.radians(mean_lat))
+    ky = METERS_PER_DEGREE
+
+    # Radial pre-pass: drop vertices closer than the tolerance to the last
+    # kept one. Dense ORS polylines shrink a lot here, which keeps the
+    # quadratic-worst-case Douglas–Peucker pass cheap.
+    indices = [0]
+    xs = [geometry[0][0] * kx]
+    ys = [geometry[0][1] * ky]
+    tol_sq = tolerance_meters * tolerance_meters
+    for i in range(1, n - 1):
+        x = geometry[i][0] * kx
+        y = geometry[i][1] * ky
+        dx = x - xs[-1]
+        dy = y - ys[-1]
+        if dx * dx + dy * dy > tol_sq:
+            indices.append(i)
+            xs.append(x)
+            ys.append(y)
+    indices.append(n - 1)
+    xs.append(geometry[-1][0] * kx)
+    ys.append(geometry[-1][1] * ky)
+
+    m = len(indices)
+    keep = [False] * m
+    keep[0] = keep[-1] = True
+    stack = [(0, m - 1)]
+    while stack:
+        start, end = stack.pop()
+        ax = xs[start]
+        ay = ys[start]
+        dx = xs[end] - ax
+        dy = ys[end] - ay
+        length_sq = dx * dx + dy * dy
+        max_dist_sq = 0.0
+        max_index = -1
+        # Squared distance from each vertex to the segment start..end
+        for i in range(start + 1, end):
+            px = xs[i] - ax
+            py = ys[i] - ay
+            if length_sq:
+                t = (px * dx + py * dy) / length_sq
+                if t < 0:
+                    t = 0.0
+                elif t > 1:
+                    t = 1.0
+                px -= t * dx
+                py -= t * dy
+            dist_sq = px * px + py * py
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                max_index = i
+        if max_dist_sq > tol_sq:
+            keep[max_index] = True
+            stack.append((start, max_index))
+            stack.append((max_index, end))
+
+    return [geometry[indices[i]] for i in range(m) if keep[i]]
+
+
+def round_geometry(geometry, decimals):
+    """
+    geometry (list of [lng, lat]) with coordinates rounded to decimals
+    places, which is what shortens their JSON; a negative decimals leaves
+    it as is.
+    """
+    if decimals < 0:
+        return geometry
+    # Twice as fast as round(x, decimals), with the same result
+    scale = 10.0 ** decimals
+    return [[round(lng * scale) / scale, round(lat * scale) / scale] for lng, lat in geometry]
+
+
+def round_coord(coord, decimals):
+    """A {"lat", "lng"} point (or None) rounded like round_geometry."""
+    if decimals < 0 or coord is None:
+        return coord
+    return {"lat": round(coord["lat"], decimals), "lng": round(coord["lng"], decimals)}
+
+
+def simplify_for_detail(geometry, detail):
+    """Simplify geometry for a detail level name; raises ValueError if unknown."""
+    if detail not in DETAIL_TOLERANCES:
+        raise ValueError(
+            f"Unknown detail level: {detail} (expected one of {', '.join(DETAIL_TOLERANCES)})"
+        )
+    return simplify(geometry, DETAIL_TOLERANCES[detail])
+
+
+# Wire formats for leg geometries (trip-plan "geometryFormat" parameter):
+#   json         list of [lng, lat] (default)
+#   polyline     Google encoded polyline string, precision 5, [lat, lng] order
+#   float32      base64 of little-endian float32 pairs [lng, lat, lng, lat, ...]
+#   int32-delta  base64 of little-endian int32 pairs of [lng, lat] * 1e5; the
+#                first pair is absolute, every later pair a delta from the previous
+GEOMETRY_FORMATS = ("json", "polyline", "float32", "int32-delta")
+
+# ORS geometries are precision 5 polylines, so 1e5 fixed point is lossless
+FIXED_POINT_SCALE = 100000
+
+
+def encode_geometry(geometry, geometry_format):
+    """Encode a list of [lng, lat] in one of GEOMETRY_FORMATS; raises ValueError if unknown."""
+    if geometry_format == "json":
+        return geometry
+    if geometry_format == "polyline":
+        return polyline.encode([(lat, lng) for lng, lat in geometry], 5)
+    if geometry_format == "float32":
+        flat = [value for point in geometry for value in point]
+        return base64.b64encode(struct.pack(f"<{len(flat)}f", *flat)).decode("ascii")
+    if geometry_format == "int32-delta":
+        flat = []
+        prev_x = prev_y = 0
+        for lng, lat in geometry:
+            x = round(lng * FIXED_POINT_SCALE)
+            y = round(lat * FIXED_POINT_SCALE)
+            flat.append(x - prev_x)
+            flat.append(y - prev_y)
+            prev_x, prev_y = x, y
+        return base64.b64encode(struct.pack(f"<{len(flat)}i", *flat)).decode("ascii")
+    raise ValueError(
+        f"Unknown geometry format: {geometry_format} (expected one of {', '.join(GEOMETRY_FORMATS)})"
+    )
+
+
+def decode_geometry(encoded, geometry_format):
+    """The list of [lng, lat] encode_geometry(geometry, geometry_format) came from."""
+    if geometry_format == "json":
+        return [list(point) for point in encoded]
+    if geometry_format == "polyline":
+        return [[lng, lat] for lat, lng in polyline.decode(encoded, 5)]
+    if geometry_format == "float32":
+        data = base64.b64decode(encoded)
+        flat = struct.unpack(f"<{len(data) // 4}f", data)
+        return [[flat[i], flat[i + 1]] for i in range(0, len(flat), 2)]
+    if geometry_format == "int32-delta":
+        data = base64.b64decode(encoded)
+        flat = struct.unpack(f"<{len(data) // 4}i", data)
+        geometry = []
+        x = y = 0
+        for i in range(0, len(flat), 2):
+            x += flat[i]
+            y += flat[i + 1]
+            geometry.append([x / FIXED_POINT_SCALE, y / FIXED_POINT_SCALE])
+        return geometry
+    raise ValueError(
+        f"Unknown geometry format: {geometry_format} (expected one of {', '.join(GEOMETRY_FORMATS)})"
+    )
@@ -0,0 +1,173 @@
+"""
+Preprocess an OpenStreetMap XML extract (.osm, .osm.gz or .osm.bz2) into the
+road graph file read by trip_api/road_graph.py:
+
+    python manage.py build_road_graph region.osm.bz2 road_graph.json
+
+Only drivable highway classes are kept (see SPEEDS_KPH). Edge speeds come
+from maxspeed tags where present and the class default otherwise; oneway
+tags and motorways are one-way. Every way node is kept as a graph node, so
+the route geometry follows the roads. By default only the largest connected
+component survives, so a waypoint never snaps onto an isolated fragment.
+"""
+import bz2
+import gzip
+import json
+import re
+import time
+import xml.etree.ElementTree as ET
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Default speed per highway class, for ways without a usable maxspeed
+SPEEDS_KPH = {
+    "motorway": 105,
+    "motorway_link": 60,
+    "trunk": 90,
+    "trunk_link": 50,
+    "primary": 75,
+    "primary_link": 45,
+    "secondary": 65,
+    "secondary_link": 40,
+    "tertiary": 55,
+    "tertiary_link": 35,
+    "unclassified": 45,
+    "residential": 35,
+    "service": 20,
+}
+
+MAXSPEED = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(mph)?\s*$")
+
+
+def parse_maxspeed(value):
+    """A maxspeed tag in km/h, or None for values like "signals" or "none"."""
+    match = MAXSPEED.match(value or "")
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * 1.609344 if match.group(2) else speed
+
+
+def open_extract(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_osm(path, classes):
+    """Returns ({node id: (lng, lat)}, [(node ids, speed_kph, oneway)])."""
+    coords = {}
+    ways = []
+    with open_extract(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "node":
+                coords[int(elem.get("id"))] = (float(elem.get("lon")), float(elem.get("lat")))
+                elem.clear()
+            elif elem.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                highway = tags.get("highway")
+                if highway in classes:
+                    refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                    speed = parse_maxspeed(tags.get("maxspeed")) or SPEEDS_KPH[highway]
+                    oneway = tags.get("oneway")
+                    if oneway == "-1":
+                        refs.reverse()
+                    is_oneway = oneway in ("yes", "true", "1", "-1") or (
+                        highway == "motorway" and oneway not in ("no", "false", "0")
+                    )
+                    ways.append((refs, speed, is_oneway))
+                elem.clear()
+            elif elem.tag == "relation":
+                elem.clear()
+    return coords, ways
+
+
+def largest_component(edges, n):
+    """Nodes of the largest weakly connected component (union-find)."""
+    parent = list(range(n))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for u, v, *_ in edges:
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            parent[ru] = rv
+    sizes = {}
+    for i in range(n):
+        root = find(i)
+        sizes[root] = sizes.get(root, 0) + 1
+    biggest = max(sizes, key=sizes.get) if sizes else None
+    return {i for i in range(n) if find(i) == biggest}
+
+
+def build_graph(coords, ways, keep_all_components=False):
+    """Renumber the nodes used by ways and return {"nodes", "edges"}."""
+    index = {}
+    nodes = []
+    edges = []
+    for refs, speed, oneway in ways:
+        # Ways can reference nodes cut off at the extract boundary
+        refs = [ref for ref in refs if ref in coords]
+        for a, b in zip(refs, refs[1:]):
+            if a == b:
+                continue
+            for ref in (a, b):
+                if ref not in index:
+                    index[ref] = len(nodes)
+                    nodes.append(coords[ref])
+            edge = [index[a], index[b], round(speed, 1)]
+            if oneway:
+                edge.append(1)
+            edges.append(edge)
+
+    if not keep_all_components:
+        keep = largest_component(edges, len(nodes))
+        renumber = {}
+        kept_nodes = []
+        for i, node in enumerate(nodes):
+            if i in keep:
+                renumber[i] = len(kept_nodes)
+                kept_nodes.append(node)
+        edges = [[renumber[u], renumber[v], *rest] for u, v, *rest in edges if u in keep]
+        nodes = kept_nodes
+
+    return {"nodes": [[round(lng, 7), round(lat, 7)] for lng, lat in nodes], "edges": edges}
+
+
+class Command(BaseCommand):
+    help = "Build a trip_api road graph file from an OpenStreetMap XML extract."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("extract", help=".osm, .osm.gz or .osm.bz2 file")
+        parser.add_argument("output", help="road graph JSON to write (set ROAD_GRAPH_PATH to it)")
+        parser.add_argument("--classes", default=",".join(SPEEDS_KPH),
+                            help="comma-separated highway classes to keep")
+        parser.add_argument("--keep-all-components", action="store_true",
+                            help="keep road fragments not connected to the main network")
+
+    def handle(self, *args, **options):
+        classes = set(options["classes"].split(","))
+        unknown = classes - set(SPEEDS_KPH)
+        if unknown:
+            raise CommandError(f"Unknown highway classes: {', '.join(sorted(unknown))}")
+
+        started = time.perf_counter()
+        coords, ways = read_osm(options["extract"], classes)
+        graph = build_graph(coords, ways, options["keep_all_components"])
+        if not graph["edges"]:
+            raise CommandError("No drivable ways found in the extract")
+
+        with open(options["output"], "w") as f:
+            json.dump(graph, f, separators=(",", ":"))
+        self.stdout.write(
+            f"{len(graph['nodes'])} nodes, {len(graph['edges'])} edges from {len(ways)} ways "
+            f"in {time.perf_counter() - started:.1f}s -> {options['output']}"
+        )
@@ -0,0 +1,267 @@
+"""
+Local stand-in for the openrouteservice endpoints ors_client uses:
+
+    GET  /geocode/search?text=...
+    POST /v2/directions/driving-car
+
+Modes:
+    synthetic (default)  deterministic fake answers for any input
+    --fixtures DIR       replay recorded responses from DIR
+    --record --upstream  forward to the real API and save each response
+
+Point the backend at it with ORS_BASE_URL=http://127.0.0.1:8090.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import polyline
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from trip_api.eld_logs import haversine_distance
+
+
+GEOCODE_PATH = "/geocode/search"
+DIRECTIONS_PATH = "/v2/directions/driving-car"
+
+# Synthetic routes: road distance vs great circle, average speed, vertex spacing
+ROAD_FACTOR = 1.25
+SPEED_MPS = 24.6  # ~55 mph
+VERTEX_SPACING_METERS = 2000
+
+
+def fixture_key(method, path, params, body):
+    """
+    Stable key for a request, ignoring credentials: api_key is dropped from
+    the query and the JSON body is canonicalized.
+    """
+    params = sorted((k, v) for k, v in params if k != "api_key")
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":")) if body is not None else ""
+    raw = f"{method} {path}?{urlencode(params)} {canonical}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def synthetic_geocode(text):
+    """Deterministic point inside the continental US for any address text."""
+    normalized = " ".join(str(text).lower().replace(",", " ").split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).digest()
+    lat = 30 + int.from_bytes(digest[:4], "big") / 2 ** 32 * 15
+    lng = -120 + int.from_bytes(digest[4:8], "big") / 2 ** 32 * 45
+    return 200, {
+        "features": [{
+            "geometry": {"type": "Point", "coordinates": [round(lng, 6), round(lat, 6)]},
+            "properties": {"label": text},
+        }]
+    }
+
+
+def synthetic_directions(body):
+    """Straight-line legs between the requested coordinates, ORS response shape."""
+    coords = (body or {}).get("coordinates") or []
+    if len(coords) < 2:
+        return 400, {"error": {"code": 2003, "message": "Need at least 2 coordinates"}}
+
+    points = [(coords[0][1], coords[0][0])]
+    way_points = [0]
+    segments = []
+    for (lng1, lat1), (lng2, lat2) in zip(coords, coords[1:]):
+        distance = haversine_distance(lat1, lng1, lat2, lng2) * ROAD_FACTOR
+        steps = max(1, min(2000, int(distance / VERTEX_SPACING_METERS)))
+        for i in range(1, steps + 1):
+            points.append((lat1 + (lat2 - lat1) * i / steps, lng1 + (lng2 - lng1) * i / steps))
+        way_points.append(len(points) - 1)
+        segments.append({"distance": round(distance, 1), "duration": round(distance / SPEED_MPS, 1)})
+
+    route = {
+        "summary": {
+            "distance": round(sum(s["distance"] for s in segments), 1),
+            "duration": round(sum(s["duration"] for s in segments), 1),
+        },
+        "geometry": polyline.encode(points, 5),
+        "way_points": way_points,
+    }
+    # Like ORS, per-leg segments only come with instructions (on by default)
+    if body.get("instructions", True):
+        route["segments"] = [{**segment, "steps": []} for segment in segments]
+    return 200, {"routes": [route]}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once
+    request_queue_size = 1024
+
+    def __init__(self, address, fixtures=None, record=False, upstream=None, fallback=False,
+                 latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=503, seed=None):
+        super().__init__(address, StubHandler)
+        self.fixtures = Path(fixtures) if fixtures else None
+        self.record = record
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.fallback = fallback
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.session = requests.Session()
+        self.verbose = False
+        self.counters = {"requests": 0, "injected_errors": 0, "replayed": 0, "recorded": 0, "synthetic": 0}
+
+    def count(self, name):
+        with self.random_lock:
+            self.counters[name] += 1
+
+    def roll(self):
+        """(delay seconds, inject error?) for one request."""
+        with self.random_lock:
+            delay = (self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000
+            return delay, self.random.random() < self.error_rate
+
+    def respond(self, method, path, params, body, headers):
+        if path not in (GEOCODE_PATH, DIRECTIONS_PATH):
+            return 404, {"error": f"Unknown path {path}"}
+
+        key = fixture_key(method, path, params, body)
+        if self.fixtures and not self.record:
+            fixture = self.fixtures / f"{key}.json"
+            if fixture.exists():
+                self.count("replayed")
+                data = json.loads(fixture.read_text())
+                return data["status"], data["body"]
+            if not self.fallback:
+                return 404, {"error": f"No fixture {key} for {method} {path}"}
+
+        if self.record:
+            response = self.session.request(
+                method, self.upstream + path, params=params, json=body,
+                headers={k: v for k, v in headers.items() if k.lower() == "authorization"},
+                timeout=(5, 30),
+            )
+            status, data = response.status_code, response.json()
+            self.fixtures.mkdir(parents=True, exist_ok=True)
+            (self.fixtures / f"{key}.json").write_text(json.dumps({
+                "request": {
+                    "method": method, "path": path,
+                    "params": [[k, v] for k, v in params if k != "api_key"], "body": body,
+                },
+                "status": status,
+                "body": data,
+            }, indent=1))
+            self.count("recorded")
+            return status, data
+
+        self.count("synthetic")
+        if path == GEOCODE_PATH:
+            return synthetic_geocode(dict(params).get("text", ""))
+        return synthetic_directions(body)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # keep-alive response stalls on the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method):
+        server = self.server
+        url = urlsplit(self.path)
+
+        body = None
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = json.loads(self.rfile.read(length) or b"null")
+
+        # Counters are never delayed or failed, so harnesses can always poll them
+        if url.path == "/__stats":
+            return self.send_json(200, dict(server.counters))
+
+        server.count("requests")
+        delay, inject_error = server.roll()
+        if delay:
+            time.sleep(delay)
+
+        if inject_error:
+            server.count("injected_errors")
+            return self.send_json(server.error_status, {"error": "Injected error"})
+
+        params = parse_qsl(url.query, keep_blank_values=True)
+        try:
+            status, data = server.respond(method, url.path, params, body, dict(self.headers))
+        except Exception as e:
+            status, data = 502, {"error": f"Stub failure: {e}"}
+        self.send_json(status, data)
+
+    def send_json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    help = "Run a local openrouteservice stand-in for offline load tests and CI."
+    # A standalone server; the project's checks don't apply to it
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8090)
+        parser.add_argument("--fixtures", help="directory of recorded responses to replay (or record into)")
+        parser.add_argument("--record", action="store_true", help="forward to --upstream and save responses")
+        parser.add_argument("--upstream", default="https://api.openrouteservice.org")
+        parser.add_argument("--fallback", action="store_true",
+                            help="answer synthetically when a replay fixture is missing")
+        parser.add_argument("--latency-ms", type=float, default=0, help="added to every response")
+        parser.add_argument("--jitter-ms", type=float, default=0, help="extra uniform random latency")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests to fail")
+        parser.add_argument("--error-status", type=int, default=503)
+        parser.add_argument("--seed", type=int, help="seed latency/error injection for repeatable runs")
+
+    def handle(self, *args, **options):
+        if options["record"] and not options["fixtures"]:
+            raise CommandError("--record needs --fixtures DIR to write to")
+
+        server = StubServer(
+            (options["host"], options["port"]),
+            fixtures=options["fixtures"],
+            record=options["record"],
+            upstream=options["upstream"],
+            fallback=options["fallback"],
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            error_status=options["error_status"],
+            seed=options["seed"],
+        )
+        server.verbose = options["verbosity"] > 1
+
+        mode = "record" if options["record"] else "replay" if options["fixtures"] else "synthetic"
+        self.stdout.write(
+            f"ORS stub ({mode}) on http://{options['host']}:{server.server_port} - "
+            f"set ORS_BASE_URL to use it. Counters at /__stats."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
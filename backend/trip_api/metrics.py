@@ -0,0 +1,278 @@
+"""
+Stage-level latency metrics for the trip-planning endpoints.
+
+Code under `with stage("name"):` is timed into a per-process histogram and,
+while a request is being served, into that request's timer, which
+ServerTimingMixin emits as a Server-Timing header. snapshot() gathers the
+histograms together with the ORS transport and cache counters (including
+the in-process HOS schedule cache) for the metrics endpoint.
+
+Everything here is per worker process; scrape every worker (or sum the
+Prometheus output) to get fleet-wide numbers.
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from rest_framework.renderers import BaseRenderer
+
+from . import cache, transport
+from .eld_logs import get_schedule_cache
+
+
+# Upper bounds in milliseconds, roughly log-spaced from cache hits to
+# upstream timeouts. The last bucket is +Inf.
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, math.inf)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket latency histogram with an error counter."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.errors = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms, error=False):
+        index = next(i for i, bound in enumerate(BUCKETS_MS) if ms <= bound)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Estimate, interpolating linearly inside the bucket that holds q."""
+        with self._lock:
+            counts, total, max_ms = list(self.counts), self.count, self.max_ms
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(BUCKETS_MS, counts):
+            if n and seen + n >= rank:
+                upper = min(bound, max_ms)
+                return round(lower + (upper - lower) * (rank - seen) / n, 3)
+            seen += n
+            lower = bound
+        return round(max_ms, 3)
+
+    def as_dict(self):
+        info = {
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+        }
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, n in zip(BUCKETS_MS, self.counts):
+                cumulative += n
+                buckets["+Inf" if bound == math.inf else str(bound)] = cumulative
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "error_rate": round(self.errors / self.count, 4) if self.count else None,
+                "sum_ms": round(self.sum_ms, 3),
+                "mean_ms": round(self.sum_ms / self.count, 3) if self.count else None,
+                "max_ms": round(self.max_ms, 3),
+                **info,
+                "buckets": buckets,
+            }
+
+
+class Registry:
+    """Named histograms, created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def get(self, name):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            return histogram
+
+    def as_dict(self):
+        with self._lock:
+            items = sorted(self._histograms.items())
+        return {name: histogram.as_dict() for name, histogram in items}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+stages = Registry()
+endpoints = Registry()
+
+
+class RequestTimer:
+    """Per-request stage totals, in the order stages first finished."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = {}
+        self.response = None  # set by the view before the timer closes
+
+    def add(self, name, ms):
+        with self._lock:
+            total, calls = self.entries.get(name, (0.0, 0))
+            self.entries[name] = (total + ms, calls + 1)
+
+    def header(self):
+        with self._lock:
+            entries = list(self.entries.items())
+        parts = []
+        for name, (total, calls) in entries:
+            part = f"{name};dur={total:.1f}"
+            if calls > 1:
+                # Summed across calls, which may have overlapped on the pool
+                part += f';desc="{calls} calls"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+# Copied into pool threads by run_concurrently, so upstream calls made on
+# behalf of a request still land in its timer.
+_current_timer = contextvars.ContextVar("trip_api_request_timer", default=None)
+
+
+def record(name, ms, error=False):
+    stages.get(name).observe(ms, error)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, ms)
+
+
+@contextmanager
+def stage(name):
+    """Time the block as stage `name`; an escaping exception counts as an error."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(name, (time.perf_counter() - started) * 1000, error)
+
+
+@contextmanager
+def request_timer(endpoint):
+    """
+    Collect the stages of one request into a RequestTimer. On exit the
+    total feeds the `endpoint` histogram and, once the caller has set
+    timer.response, it gets a Server-Timing header; any 4xx or 5xx response
+    counts as an error.
+    """
+    timer = RequestTimer()
+    token = _current_timer.set(timer)
+    started = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+        timer.add("total", total_ms)
+        response = timer.response
+        endpoints.get(endpoint).observe(total_ms, error=response is None or response.status_code >= 400)
+        if response is not None:
+            response["Server-Timing"] = timer.header()
+
+
+class ServerTimingMixin:
+    """
+    APIView mixin: times the request with request_timer and renders the
+    response inside it, as the "render" stage.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with request_timer(type(self).__name__) as timer:
+            response = super().dispatch(request, *args, **kwargs)
+            # Streaming responses have nothing to render up front
+            if not getattr(response, "is_rendered", True):
+                with stage("render"):
+                    response.render()
+            timer.response = response
+        return response
+
+
+def async_transport_stats():
+    # Imported here: aiohttp takes ~0.1 s to load, which every process
+    # (and serverless cold start) would otherwise pay through this module
+    try:
+        from . import async_transport
+    except ImportError:  # aiohttp not installed, see requirements-async.txt
+        return None
+    return async_transport.stats()
+
+
+def snapshot():
+    return {
+        "stages": stages.as_dict(),
+        "endpoints": endpoints.as_dict(),
+        "upstream": transport.stats(),
+        "upstream_async": async_transport_stats(),
+        "caches": {
+            "geocode": cache.geocode_cache_info(),
+            "route": cache.route_cache_info(),
+            "plan": cache.plan_cache_info(),
+            "schedule": get_schedule_cache().info(),
+        },
+    }
+
+
+def reset():
+    stages.reset()
+    endpoints.reset()
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Renders snapshot() in the Prometheus text exposition format (?format=prometheus)."""
+
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        lines = []
+        for metric, label, histograms in (
+            ("trip_api_stage_duration_seconds", "stage", data.get("stages", {})),
+            ("trip_api_request_duration_seconds", "endpoint", data.get("endpoints", {})),
+        ):
+            lines.append(f"# TYPE {metric} histogram")
+            for name, info in histograms.items():
+                for bound, n in info["buckets"].items():
+                    le = bound if bound == "+Inf" else repr(float(bound) / 1000)
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{le}"}} {n}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {info["sum_ms"] / 1000}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {info["count"]}')
+            errors = metric.replace("_duration_seconds", "_errors_total")
+            lines.append(f"# TYPE {errors} counter")
+            for name, info in histograms.items():
+                lines.append(f'{errors}{{{label}="{name}"}} {info["errors"]}')
+
+        lines.append("# TYPE trip_api_upstream_total counter")
+        for client in ("upstream", "upstream_async"):
+            for name, value in (data.get(client) or {}).items():
+                # pool_size and event_loops are configuration, not counters
+                if isinstance(value, int) and name not in ("pool_size", "event_loops"):
+                    lines.append(f'trip_api_upstream_total{{client="{client}",counter="{name}"}} {value}')
+
+        for kind in ("hits", "misses"):
+            lines.append(f"# TYPE trip_api_cache_{kind}_total counter")
+            for name, info in data.get("caches", {}).items():
+                lines.append(f'trip_api_cache_{kind}_total{{cache="{name}"}} {info[kind]}')
+        return ("\n".join(lines) + "\n").encode(self.charset)
@@ -0,0 +1,108 @@
+"""
+Response compression with Accept-Encoding negotiation.
+
+A cross-country trip plan is hundreds of KB of JSON that compresses 4-8x.
+Django's GZipMiddleware only does gzip, from 200 bytes on, so this one
+prefers brotli when the client accepts it and the brotli package is
+installed (see requirements-speedups.txt), falls back to gzip and leaves
+bodies under COMPRESSION_MIN_BYTES alone, where the framing costs more
+than it saves. Streaming responses (NDJSON plans) pass through untouched
+so each record still reaches the client as soon as it is produced.
+"""
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .metrics import stage
+
+try:
+    import brotli
+except ImportError:  # speedups not installed, see requirements-speedups.txt
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header, without refused (q=0) codings."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        if coding and q > 0:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """"br", "gzip" or None for an Accept-Encoding header; br wins ties."""
+    accepted = accepted_encodings(header or "")
+    wildcard = accepted.get("*", 0)
+    candidates = [("gzip", accepted.get("gzip", wildcard))]
+    if brotli is not None:
+        candidates.insert(0, ("br", accepted.get("br", wildcard)))
+    coding, q = max(candidates, key=lambda candidate: candidate[1])
+    return coding if q > 0 else None
+
+
+def compress(body, coding):
+    if coding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    # Runs natively under ASGI too, so /trip-plan/async/ requests don't hop
+    # to a thread just to be compressed
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+        # Whatever the outcome, the response depends on Accept-Encoding
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+        coding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if coding is None:
+            return response
+
+        # After the request's Server-Timing is written, so only in /metrics
+        with stage(f"compress-{coding}"):
+            compressed = compress(response.content, coding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = coding
+        # The encoded bytes differ, so a strong ETag must become weak
+        # (RFC 9110 8.8.1); TripPlanView compares ETags weakly anyway
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
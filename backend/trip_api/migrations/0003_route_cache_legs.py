@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip_api', '0002_route_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routecacheentry',
+            name='segments',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='routecacheentry',
+            name='way_points',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -1,3 +1,59 @@
 from django.db import models
 
-# Create your models here.
+
+class GeocodeCacheEntry(models.Model):
+    """
+    Cached result of an ORS /geocode/search lookup.
+    Rows are keyed on the normalized address (see cache.normalize_address)
+    so every worker process shares the same cache and it survives restarts.
+    """
+    key = models.CharField(max_length=64, unique=True)  # sha256 of normalized address
+    address = models.TextField()  # normalized address, kept for inspection
+    lat = models.FloatField()
+    lng = models.FloatField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)  # drives LRU eviction
+
+    def __str__(self):
+        return self.address
+
+
+class RouteCacheEntry(models.Model):
+    """
+    Cached ORS directions result keyed on waypoints snapped to a grid
+    (see cache.route_key). The geometry is kept as the ORS encoded polyline,
+    which is several times smaller than the decoded coordinate list.
+    """
+    key = models.CharField(max_length=64, unique=True)  # sha256 of snapped waypoints
+    waypoints = models.TextField()  # snapped grid cells, kept for inspection
+    distance_meters = models.FloatField()
+    duration_seconds = models.FloatField()
+    geometry = models.TextField()  # encoded polyline, [lat, lng] precision 5
+    segments = models.JSONField(default=list)  # [distance, duration] per leg
+    way_points = models.JSONField(default=list)  # geometry index of each waypoint
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.waypoints
+
+
+class PlanCacheEntry(models.Model):
+    """
+    Cached TripPlanView response keyed on the normalized request inputs and
+    the rounded start time (see cache.plan_key). etag is a digest of the
+    stored plan, so a conditional re-request can be answered from the key
+    alone.
+    """
+    key = models.CharField(max_length=64, unique=True)  # sha256 of the inputs
+    inputs = models.TextField()  # normalized inputs, kept for inspection
+    plan = models.JSONField()
+    etag = models.CharField(max_length=64)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.inputs
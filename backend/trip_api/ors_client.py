@@ -1,21 +1,44 @@
-import requests
 from django.conf import settings
 
 import polyline
 
-
-BASE_URL = "https://api.openrouteservice.org"
+from . import cache
+from .metrics import stage
+from .transport import get_transport
 
 
 def geocode_address(address):
-    url = f"{BASE_URL}/geocode/search"
+    """
+    Geocode address to {"lat", "lng"}, serving repeat lookups from the
+    shared geocode cache so a warm request makes no network call.
+    """
+    with stage("cache"):
+        coord = cache.get_geocode(address)
+    if coord is None:
+        coord = _fetch_geocode(address)
+        with stage("cache"):
+            cache.set_geocode(address, coord)
+    return coord
+
+
+def _fetch_geocode(address):
+    url, params = _geocode_request(address)
+    with stage("ors-geocode"):
+        res = get_transport().get(url, params=params)
+        data = res.json()
+    return _parse_geocode(data, address)
+
+
+def _geocode_request(address):
+    url = f"{settings.ORS_BASE_URL}/geocode/search"
     params = {
         "api_key": settings.ORS_API_KEY,
         "text": address
     }
-    res = requests.get(url, params=params)
-    data = res.json()
+    return url, params
+
 
+def _parse_geocode(data, address):
     if "features" not in data or not data["features"]:
         raise ValueError(f"Address not found: {address}")
 
@@ -24,9 +47,74 @@ def geocode_address(address):
     return {"lat": coords[1], "lng": coords[0]}
 
 
-def get_route(coord_list):
-    url = f"{BASE_URL}/v2/directions/driving-car"
-    
+def get_route(coord_list, split_legs=False):
+    """
+    Route through coord_list ([lng, lat] pairs). Results are cached on the
+    snapped waypoints, so repeat lanes skip the directions call entirely.
+
+    With split_legs=True the result also carries "legs": one
+    {distance_meters, duration_seconds, geometry} per consecutive pair of
+    waypoints, split out of the single upstream response. Adjacent legs
+    share their boundary vertex.
+    """
+    with stage("cache"):
+        route = cache.get_route(coord_list)
+    if _needs_fetch(route, coord_list, split_legs):
+        route = _fetch_route(coord_list)
+        with stage("cache"):
+            cache.set_route(coord_list, route)
+    return _route_result(route, split_legs)
+
+
+def _needs_fetch(cached, coord_list, split_legs):
+    # Rows cached before legs were stored can't be split
+    return cached is None or (split_legs and len(cached["segments"]) != len(coord_list) - 1)
+
+
+def _route_result(route, split_legs):
+    with stage("decode"):
+        # polyline.decode → returns [lat, lng]
+        decoded = polyline.decode(route["geometry"])
+
+        # Convert to ORS format [lng, lat] so frontend can convert properly
+        polyline_coords = [[lng, lat] for lat, lng in decoded]
+
+    result = {
+        "distance_meters": route["distance_meters"],
+        "duration_seconds": route["duration_seconds"],
+        "geometry": polyline_coords
+    }
+
+    if split_legs:
+        way_points = route["way_points"]
+        result["legs"] = [
+            {
+                "distance_meters": distance,
+                "duration_seconds": duration,
+                "geometry": polyline_coords[way_points[i]:way_points[i + 1] + 1],
+            }
+            for i, (distance, duration) in enumerate(route["segments"])
+        ]
+
+    return result
+
+
+def _fetch_route(coord_list):
+    """
+    Calls ORS directions; the returned geometry is still the encoded polyline.
+    "segments" holds [distance, duration] per leg and "way_points" the
+    geometry index of every input coordinate.
+    """
+    url, kwargs = _route_request(coord_list)
+    with stage("ors-directions"):
+        res = get_transport().post(url, **kwargs)
+        data = res.json()
+    return _parse_route(data)
+
+
+def _route_request(coord_list):
+    url = f"{settings.ORS_BASE_URL}/v2/directions/driving-car"
+
     headers = {
         "Authorization": settings.ORS_API_KEY,
         "Content-Type": "application/json"
@@ -38,27 +126,30 @@ def get_route(coord_list):
 
     body = {
         "coordinates": coord_list,
-        "instructions": False,
+        # ORS only returns the per-leg "segments" get_route(split_legs=True)
+        # reads when instructions are on; their steps are dropped on parsing
+        "instructions": True,
         # "geometry_format": "geojson"
         "geometry_simplify": False
     }
 
-    res = requests.post(url, params=params, json=body, headers=headers)
-    data = res.json()
+    return url, {"params": params, "json": body, "headers": headers}
+
 
+def _parse_route(data):
     if "routes" not in data or not data["routes"]:
         raise ValueError("No route found")
 
     route = data["routes"][0]
 
-    # polyline.decode → returns [lat, lng]
-    decoded = polyline.decode(route["geometry"])
-
-    # Convert to ORS format [lng, lat] so frontend can convert properly
-    polyline_coords = [[lng, lat] for lat, lng in decoded]
-
+    # ORS omits zero-valued summary fields
     return {
-        "distance_meters": route["summary"]["distance"],
-        "duration_seconds": route["summary"]["duration"],
-        "geometry": polyline_coords
+        "distance_meters": route["summary"].get("distance", 0),
+        "duration_seconds": route["summary"].get("duration", 0),
+        "geometry": route["geometry"],
+        "segments": [
+            [segment.get("distance", 0), segment.get("duration", 0)]
+            for segment in route.get("segments", [])
+        ],
+        "way_points": route.get("way_points", []),
     }
@@ -0,0 +1,332 @@
+"""
+Building blocks of a trip plan, shared by the single and batch trip-plan
+views: leg planning around near-identical points, the HOS simulation
+arguments and the response payload, whole or as streamed records.
+"""
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .eld_logs import MILES_TO_METERS, get_schedule_cache, replan_eld_sheets
+from .geometry import (
+    DETAIL_TOLERANCES, GEOMETRY_FORMATS, decode_geometry, encode_geometry, round_coord, round_geometry,
+    simplify_for_detail,
+)
+from .transport import UpstreamError
+
+
+def coords_are_same(c1, c2):
+    """Two {"lat", "lng"} points closer than ~10 m in both axes."""
+    return abs(c1["lat"] - c2["lat"]) < 0.0001 and abs(c1["lng"] - c2["lng"]) < 0.0001
+
+
+def validate_options(detail, geometry_format):
+    # Checked as strings first: a JSON list or object isn't hashable
+    if not isinstance(detail, str) or detail not in DETAIL_TOLERANCES:
+        raise ValueError(f"Unknown detail level: {detail}")
+    if not isinstance(geometry_format, str) or geometry_format not in GEOMETRY_FORMATS:
+        raise ValueError(f"Unknown geometry format: {geometry_format}")
+
+
+def plan_legs(current_c, pickup_c, dropoff_c):
+    """
+    ROUTE LEG 1: current -> pickup
+    ROUTE LEG 2: pickup -> dropoff
+
+    Legs between (nearly) identical points need no routing and are filled in
+    directly. Returns (routes, waypoints, to_route): routes has None for legs
+    still to route, waypoints is the [lng, lat] list for one multi-waypoint
+    directions call and to_route the indexes of the legs it returns.
+    """
+    legs = [(current_c, pickup_c), (pickup_c, dropoff_c)]
+    routes = [None, None]
+    waypoints = []
+    to_route = []
+    for i, (start, end) in enumerate(legs):
+        if coords_are_same(start, end):
+            routes[i] = {
+                "distance_meters": 0,
+                "duration_seconds": 0,
+                "geometry": [[start["lng"], start["lat"]]]
+            }
+        else:
+            if not waypoints:
+                waypoints.append([start["lng"], start["lat"]])
+            waypoints.append([end["lng"], end["lat"]])
+            to_route.append(i)
+    return routes, waypoints, to_route
+
+
+def assign_legs(routes, to_route, route):
+    """Fill routes in place from a get_route(..., split_legs=True) result."""
+    legs = route.get("legs", [])
+    if len(legs) != len(to_route):
+        raise UpstreamError(f"Routing returned {len(legs)} legs, expected {len(to_route)}")
+    for i, leg in zip(to_route, legs):
+        routes[i] = leg
+    return routes
+
+
+def plan_start_time(now=None):
+    """
+    When the simulated trip starts: now, floored to
+    PLAN_CACHE_GRANULARITY_MINUTES so every request in the same window
+    produces the same plan and can share its cache entry.
+    """
+    if now is None:
+        now = datetime.now()
+    minutes = settings.PLAN_CACHE_GRANULARITY_MINUTES
+    if not minutes:
+        return now
+    floored = now.replace(second=0, microsecond=0)
+    return floored - timedelta(minutes=(floored.hour * 60 + floored.minute) % minutes)
+
+
+def simulation_args(route1, route2, cycle_used, start_time):
+    """Positional arguments for eld_logs.generate_eld_sheets over both legs."""
+    total_distance = route1["distance_meters"] + route2["distance_meters"]
+    total_duration = route1["duration_seconds"] + route2["duration_seconds"]
+    combined_geometry = route1["geometry"] + route2["geometry"]
+    return (total_distance, total_duration, cycle_used, start_time, combined_geometry)
+
+
+def simulation_block(route1, route2, cycle_used, start_time):
+    """
+    The HOS simulation inputs, carried in the plan so /trip-plan/replan/
+    can rebuild the timeline without routing again. The full route geometry
+    goes along as a polyline (lossless for ORS routes) since the map legs
+    are simplified and rounded.
+    """
+    total_distance = route1["distance_meters"] + route2["distance_meters"]
+    total_duration = route1["duration_seconds"] + route2["duration_seconds"]
+    return {
+        "distanceMeters": total_distance,
+        "durationSeconds": total_duration,
+        "cycleUsed": cycle_used,
+        "startTime": start_time.isoformat(),
+        "geometry": encode_geometry(route1["geometry"] + route2["geometry"], "polyline"),
+        "updates": [],
+    }
+
+
+def route_summary(route1, route2, detail, geometry_format):
+    total_distance = route1["distance_meters"] + route2["distance_meters"]
+    total_duration = route1["duration_seconds"] + route2["duration_seconds"]
+    return {
+        "geometryFormat": geometry_format,
+        "distanceMiles": round(total_distance / MILES_TO_METERS, 2),
+        "durationHours": round(total_duration / 3600, 2),
+        "detail": detail,
+    }
+
+
+def leg_geometries(route1, route2, detail, geometry_format):
+    # Simplify only what goes to the map; stops were placed on the full
+    # geometry and leg endpoints are always kept.
+    leg1 = simplify_for_detail(route1["geometry"], detail)
+    leg2 = simplify_for_detail(route2["geometry"], detail)
+    if geometry_format == "json":
+        # The binary formats have a fixed precision of their own
+        leg1 = round_geometry(leg1, settings.ROUTE_COORD_DECIMALS)
+        leg2 = round_geometry(leg2, settings.ROUTE_COORD_DECIMALS)
+    return {
+        "leg1": encode_geometry(leg1, geometry_format),  # current -> pickup
+        "leg2": encode_geometry(leg2, geometry_format),  # pickup -> dropoff
+        "vertexCount": {
+            "before": len(route1["geometry"]) + len(route2["geometry"]),
+            "after": len(leg1) + len(leg2),
+        },
+    }
+
+
+def round_points(geocoded):
+    """The (current, pickup, dropoff) points rounded to ROUTE_COORD_DECIMALS."""
+    return [round_coord(point, settings.ROUTE_COORD_DECIMALS) for point in geocoded]
+
+
+def round_stops(day):
+    """A daily log with its stop coordinates rounded to ROUTE_COORD_DECIMALS."""
+    decimals = settings.ROUTE_COORD_DECIMALS
+    if decimals < 0:
+        return day
+    return {**day, "stops": [{**stop, "coord": round_coord(stop["coord"], decimals)} for stop in day["stops"]]}
+
+
+def build_plan(geocoded, route1, route2, eld_logs, detail, geometry_format, simulation=None):
+    """
+    The trip-plan response body; geocoded is (current, pickup, dropoff).
+    simulation (see simulation_block) makes the plan re-plannable.
+    """
+    current_c, pickup_c, dropoff_c = round_points(geocoded)
+    legs = leg_geometries(route1, route2, detail, geometry_format)
+
+    plan = {
+        "routeMap": {
+            "leg1": legs["leg1"],
+            "leg2": legs["leg2"],
+            **route_summary(route1, route2, detail, geometry_format),
+            "vertexCount": legs["vertexCount"],
+            # "polyline": combined_geometry,
+        },
+        "geocoded": {
+            "current": current_c,
+            "pickup": pickup_c,
+            "dropoff": dropoff_c
+        },
+        "eldLogs": [round_stops(day) for day in eld_logs]
+    }
+    if simulation is not None:
+        plan["simulation"] = simulation
+    return plan
+
+
+def _local_datetime(value):
+    """A naive local datetime from an ISO string, like the plan's start time."""
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when
+
+
+def _bounded(value, name, high):
+    """value as a float between 0 and high; NaN and infinities are refused too."""
+    # float(True) is 1.0, but a JSON boolean isn't a number
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    # NaN fails both comparisons
+    if not 0 <= number <= high:
+        raise ValueError(f"{name} must be between 0 and {high:g}")
+    return number
+
+
+def _parse_update(update, max_miles):
+    """An update from the road checked and parsed, with "at" as a naive datetime or None."""
+    if not isinstance(update, dict):
+        raise ValueError("update must be an object")
+    if "elapsedMiles" not in update:
+        raise ValueError("update needs elapsedMiles, an optional ISO at and delayMinutes")
+    try:
+        at = _local_datetime(update["at"]) if update.get("at") else None
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("at must be an ISO time")
+    return {
+        "elapsedMiles": _bounded(update["elapsedMiles"], "elapsedMiles", max_miles),
+        "at": at,
+        "delayMinutes": _bounded(update.get("delayMinutes") or 0, "delayMinutes",
+                                 settings.REPLAN_MAX_DELAY_HOURS * 60),
+    }
+
+
+def replan(plan, update):
+    """
+    plan (a trip-plan response) re-planned after an update from the road:
+    {"elapsedMiles": miles driven since the trip start, "at": ISO time the
+    truck got there (default: as planned), "delayMinutes": extra on-duty
+    time from there on}. Only the days from the update on are rebuilt; the
+    response adds {"replan": {"checkpoint": the HOS state at the update,
+    "reusedDays": days kept from plan}}.
+
+    The plan comes back from the client, so its simulation block is checked
+    against routeMap and the REPLAN_* limits before anything is simulated.
+    """
+    try:
+        simulation = plan["simulation"]
+        route_map = plan["routeMap"]
+        previous_days = plan["eldLogs"]
+        # Naive local time, like the update times it is compared with
+        start_time = _local_datetime(simulation["startTime"])
+        inputs = (simulation["distanceMeters"], simulation["durationSeconds"], simulation["cycleUsed"])
+        map_totals = (float(route_map["distanceMiles"]), float(route_map["durationHours"]))
+        previous_updates = list(simulation.get("updates", []))
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise ValueError("plan must be a trip plan with its simulation block")
+    if not isinstance(previous_days, list) or not all(isinstance(day, dict) for day in previous_days):
+        raise ValueError("plan eldLogs must be a list of daily logs")
+
+    args = (
+        _bounded(inputs[0], "simulation.distanceMeters", settings.REPLAN_MAX_MILES * MILES_TO_METERS),
+        _bounded(inputs[1], "simulation.durationSeconds", settings.REPLAN_MAX_HOURS * 3600),
+        # On duty in the last 8 days can't be more than all of them
+        _bounded(inputs[2], "simulation.cycleUsed", 8 * 24),
+    )
+    # routeMap totals are rounded to the hundredth
+    if abs(args[0] / MILES_TO_METERS - map_totals[0]) > 0.01 or abs(args[1] / 3600 - map_totals[1]) > 0.01:
+        raise ValueError("simulation block doesn't match routeMap")
+    if len(previous_updates) >= settings.REPLAN_MAX_UPDATES:
+        raise ValueError(f"A plan takes at most {settings.REPLAN_MAX_UPDATES} updates")
+
+    max_miles = math.ceil(args[0] / MILES_TO_METERS * 100) / 100
+    updates = [_parse_update(u, max_miles) for u in previous_updates + [update]]
+
+    # However late the truck runs, the trip stays within reach of the plan
+    max_delay = timedelta(hours=settings.REPLAN_MAX_DELAY_HOURS)
+    if sum(u["delayMinutes"] for u in updates) > settings.REPLAN_MAX_DELAY_HOURS * 60:
+        raise ValueError(f"Delays add up to more than {settings.REPLAN_MAX_DELAY_HOURS:g} hours")
+    latest = start_time + timedelta(microseconds=get_schedule_cache().get(*args).end) + max_delay
+    for u in updates:
+        if u["at"] is not None and not start_time <= u["at"] <= latest:
+            raise ValueError(f"at must be between the trip start and {latest.isoformat()}")
+
+    timeline_updates = [
+        (
+            u["elapsedMiles"] * MILES_TO_METERS,
+            (u["at"] - start_time) // timedelta(microseconds=1) if u["at"] else None,
+            u["delayMinutes"] * 60,
+        )
+        for u in updates
+    ]
+
+    # Stops are placed on the full route, as in the original plan; plans
+    # made before it was carried fall back to the legs sent to the map
+    try:
+        if "geometry" in simulation:
+            geometry = decode_geometry(simulation["geometry"], "polyline")
+        else:
+            geometry_format = route_map.get("geometryFormat", "json")
+            geometry = (decode_geometry(route_map["leg1"], geometry_format)
+                        + decode_geometry(route_map["leg2"], geometry_format))
+    except (KeyError, TypeError, ValueError, IndexError):
+        raise ValueError("plan has no readable route geometry")
+
+    days, checkpoint, reused = replan_eld_sheets(
+        *args, start_time, timeline_updates, previous_days, geometry,
+    )
+    for u in updates:
+        u["at"] = u["at"].isoformat() if u["at"] else None
+    return {
+        **plan,
+        "simulation": {**simulation, "updates": updates},
+        "eldLogs": days[:reused] + [round_stops(day) for day in days[reused:]],
+        "replan": {"checkpoint": checkpoint, "reusedDays": reused},
+    }
+
+
+def plan_records(geocoded, route1, route2, days, detail, geometry_format):
+    """
+    The trip plan as a sequence of records for the streaming response:
+    {"type": "summary"} with the geocoded points and route totals,
+    {"type": "legs"} with the leg geometries, one {"type": "day"} per daily
+    log as `days` yields it and a closing {"type": "end"}. A failure after
+    the first record is reported as a final {"type": "error"}.
+    """
+    current_c, pickup_c, dropoff_c = round_points(geocoded)
+    yield {
+        "type": "summary",
+        "geocoded": {"current": current_c, "pickup": pickup_c, "dropoff": dropoff_c},
+        "routeMap": route_summary(route1, route2, detail, geometry_format),
+    }
+    try:
+        yield {"type": "legs", **leg_geometries(route1, route2, detail, geometry_format)}
+        count = 0
+        for day in days:
+            count += 1
+            yield {"type": "day", "day": round_stops(day)}
+        yield {"type": "end", "days": count}
+    except Exception as e:
+        # The 200 status is already on the wire
+        yield {"type": "error", "error": str(e)}
@@ -0,0 +1,141 @@
+"""
+Truck stops, fuel stations and rest areas for placing planned stops.
+
+The HOS simulator puts a fuel or rest stop wherever the clock runs out,
+usually mid-highway. With STOP_SNAPPING on, each such stop is moved to the
+nearest suitable place within POI_SNAP_MILES of that point: a fuel stop to
+a fuel station or truck stop, a rest to a truck stop or rest area. Only the
+map position changes; the schedule does not account for the detour.
+
+The POI file is CSV with a header of name, kind, lat, lng, kind being one
+of KINDS, like the sample in trip_api/data/. In memory the places are flat
+arrays bucketed on a uniform grid of POI_SNAP_MILES cells, so a lookup
+reads the 3x3 block of cells (wider in longitude at high latitudes) around
+the point. The index is built once per process and only read afterwards.
+"""
+import csv
+import logging
+import math
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from .geometry import METERS_PER_DEGREE, MILES_TO_METERS
+
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("fuel", "truck_stop", "rest_area")
+
+# Stop type name (eld_logs.STOP_NAMES) -> kinds it can be snapped to
+STOP_KINDS = {
+    "Fuel": ("fuel", "truck_stop"),
+    "Rest (30m)": ("truck_stop", "rest_area"),
+    "Rest (10h)": ("truck_stop", "rest_area"),
+    "Cycle Restart (34h)": ("truck_stop", "rest_area"),
+}
+
+# Grid cells are never smaller, whatever POI_SNAP_MILES is (0 turns
+# snapping into exact matches only)
+MIN_CELL_METERS = 100
+
+
+def local_distance(lat1, lng1, lat2, lng2):
+    """Meters between two nearby points, in an equirectangular projection."""
+    dx = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    dy = lat2 - lat1
+    return math.sqrt(dx * dx + dy * dy) * METERS_PER_DEGREE
+
+
+class PoiIndex:
+
+    def __init__(self, pois, cell_meters):
+        """pois is an iterable of (name, kind, lat, lng)."""
+        self.names = []
+        self.kinds = array("b")
+        self.lat = array("d")
+        self.lng = array("d")
+        self.cell = max(cell_meters, MIN_CELL_METERS) / METERS_PER_DEGREE
+        grid = {}
+        for name, kind, lat, lng in pois:
+            if kind not in KINDS:
+                raise ValueError(f"Unknown POI kind: {kind} (expected one of {', '.join(KINDS)})")
+            i = len(self.names)
+            self.names.append(name)
+            self.kinds.append(KINDS.index(kind))
+            self.lat.append(lat)
+            self.lng.append(lng)
+            grid.setdefault((math.floor(lat / self.cell), math.floor(lng / self.cell)), array("i")).append(i)
+        self.grid = grid
+
+    @classmethod
+    def load(cls, path, cell_meters):
+        return cls(read_pois(path), cell_meters)
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, lat, lng, max_meters, kinds=KINDS):
+        """Index of the closest place of one of kinds within max_meters, or None."""
+        wanted = {KINDS.index(kind) for kind in kinds}
+        cell = self.cell
+        cy = math.floor(lat / cell)
+        cx = math.floor(lng / cell)
+        ry = math.ceil(max_meters / METERS_PER_DEGREE / cell)
+        # A degree of longitude spans cos(lat) times the meters of a degree
+        # of latitude, so the search block widens toward the poles
+        rx = math.ceil(ry / math.cos(math.radians(min(abs(lat) + ry * cell, 89))))
+        best = None
+        best_distance = max_meters
+        for y in range(cy - ry, cy + ry + 1):
+            for x in range(cx - rx, cx + rx + 1):
+                for i in self.grid.get((y, x), ()):
+                    if self.kinds[i] in wanted:
+                        distance = local_distance(lat, lng, self.lat[i], self.lng[i])
+                        if distance <= best_distance:
+                            best = i
+                            best_distance = distance
+        return best
+
+    def snap(self, stop_type, coord, max_meters):
+        """
+        (coord, poi) for a stop of stop_type (a STOP_NAMES entry) planned at
+        coord: the nearest suitable place and its {"name", "kind",
+        "offsetMiles"}, or coord unchanged and None when there is none.
+        """
+        i = self.nearest(coord["lat"], coord["lng"], max_meters, STOP_KINDS[stop_type])
+        if i is None:
+            return coord, None
+        offset = local_distance(coord["lat"], coord["lng"], self.lat[i], self.lng[i])
+        return {"lat": self.lat[i], "lng": self.lng[i]}, {
+            "name": self.names[i],
+            "kind": KINDS[self.kinds[i]],
+            "offsetMiles": round(offset / MILES_TO_METERS, 2),
+        }
+
+
+def read_pois(path):
+    """Yields (name, kind, lat, lng) from a POI file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield row["name"].strip(), row["kind"].strip(), float(row["lat"]), float(row["lng"])
+
+
+_poi_index = None
+_poi_index_lock = threading.Lock()
+
+
+def get_poi_index():
+    """The POI index at POI_PATH, loaded on first use and kept per process."""
+    global _poi_index
+    with _poi_index_lock:
+        if _poi_index is None:
+            started = time.perf_counter()
+            _poi_index = PoiIndex.load(settings.POI_PATH, settings.POI_SNAP_MILES * MILES_TO_METERS)
+            logger.info(
+                "Loaded POI index %s: %d places in %.2fs",
+                settings.POI_PATH, len(_poi_index), time.perf_counter() - started,
+            )
+        return _poi_index
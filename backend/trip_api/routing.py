@@ -0,0 +1,43 @@
+"""
+Routing backend selection. ROUTING_BACKEND = "ors" sends every route to the
+ORS directions API; "local" answers from the offline road graph
+(road_graph.py) and falls back to ORS for routes the graph can't serve
+(a waypoint off the graph or no connecting road), unless
+ROUTING_ORS_FALLBACK is off.
+"""
+import logging
+
+from django.conf import settings
+
+from . import ors_client
+from .metrics import stage
+from .road_graph import get_graph
+
+
+logger = logging.getLogger(__name__)
+
+
+def local_route(coord_list, split_legs=False):
+    """
+    get_route from the local road graph. Returns None when ORS should be
+    asked instead: the backend is "ors", or the graph has no route and
+    ROUTING_ORS_FALLBACK is on.
+    """
+    if settings.ROUTING_BACKEND != "local":
+        return None
+    try:
+        with stage("local-route"):
+            return get_graph().route(coord_list, split_legs)
+    except ValueError as e:
+        if not settings.ROUTING_ORS_FALLBACK:
+            raise
+        logger.info("Local routing failed, falling back to ORS: %s", e)
+        return None
+
+
+def get_route(coord_list, split_legs=False):
+    """ors_client.get_route through the configured backend."""
+    route = local_route(coord_list, split_legs)
+    if route is None:
+        route = ors_client.get_route(coord_list, split_legs)
+    return route
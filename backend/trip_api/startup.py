@@ -0,0 +1,24 @@
+"""
+Per-process warm-up for servers, run by the WSGI and ASGI entry points
+(backend/wsgi.py, backend/asgi.py) once Django is set up. Management
+commands (migrate, test, shell, ors_stub) never load those modules, so they
+don't build the POI index or open a connection to ORS.
+"""
+from django.conf import settings
+
+
+def warm_up():
+    # Build the POI index before the first request; with a preloading
+    # server (gunicorn --preload) the workers share the parent's copy
+    if settings.STOP_SNAPPING:
+        from .poi import get_poi_index
+        get_poi_index()
+    # Likewise the gazetteer, so the first geocode doesn't read the file
+    if settings.GEOCODING_BACKEND == "local":
+        from .gazetteer import get_gazetteer
+        get_gazetteer()
+    # Overlaps the DNS, TCP and TLS setup for ORS with the rest of
+    # startup and the first request's URL and view imports
+    if settings.ORS_PREWARM:
+        from .transport import prewarm
+        prewarm()
@@ -1,3 +1,1563 @@
-from django.test import TestCase
+import gzip
+import heapq
+import json
+import math
+import random
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+import polyline
+import requests
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import Resolver404, resolve
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from . import cache, concurrency, geocoding, metrics, ors_client, routing, startup, urls
+from .eld_logs import (
+    CYCLE_RESTART, FUEL, REST_10H, REST_30M, RouteIndex, ScheduleCache, _bucket_into_days,
+    _simulate_events, generate_eld_sheets, replan_timeline,
+)
+from .gazetteer import Gazetteer
+from .geometry import METERS_PER_DEGREE, decode_geometry, encode_geometry, simplify
+from .models import GeocodeCacheEntry, RouteCacheEntry
+from .middleware import CompressionMiddleware, choose_encoding
+from .management.commands import ors_stub
+from .planner import assign_legs, build_plan, plan_legs, replan, round_stops, simulation_block
+from .poi import PoiIndex, local_distance
+from .renderers import PlanJSONRenderer
+from .road_graph import RoadGraph
+from .transport import CircuitBreaker, CircuitOpenError, Transport, UpstreamError, transport_options
+from .views import TripPlanBatchView, TripPlanView, TripReplanView
+
+
+MILES = 1609.34
+HOURS = 3600
+
+
+def legacy_generate_eld_sheets(route_distance_meters, route_duration_seconds, cycle_used_hours, start_time=None, route_geometry=None):
+    """
+    generate_eld_sheets as it was before the single-pass day bucketing,
+    kept verbatim (minus comments) as the reference for regression tests.
+    """
+    if start_time is None:
+        start_time = datetime.now()
+
+    HOURS_TO_SECONDS = 3600
+    MILES_TO_METERS = 1609.34
+    MAX_DRIVE_HOURS = 11
+    MAX_ON_DUTY_HOURS = 14
+    CYCLE_LIMIT_HOURS = 70
+    FUEL_RANGE_METERS = 1000 * MILES_TO_METERS
+    
+    
+    raw_events = [] # {status, start, end, duration, start_dist, end_dist}
+    stops_data = [] # {type, time, dist}
+    
+    current_time = start_time
+    remaining_distance = route_distance_meters
+    avg_speed_mps = route_distance_meters / route_duration_seconds if route_duration_seconds > 0 else 0
+    
+    cycle_used_seconds = cycle_used_hours * HOURS_TO_SECONDS
+    cycle_limit_seconds = CYCLE_LIMIT_HOURS * HOURS_TO_SECONDS
+    
+    cumulative_distance = 0
+    distance_since_fuel = 0
+    
+    shift_start_time = current_time
+    shift_drive_seconds = 0
+    shift_on_duty_seconds = 0
+    time_since_last_break = 0
+    
+    trip_complete = False
+    
+    duration = 3600
+    raw_events.append({
+        "status": "ON_DUTY",
+        "start": current_time,
+        "end": current_time + timedelta(seconds=duration),
+        "duration": duration,
+        "start_dist": cumulative_distance,
+        "end_dist": cumulative_distance
+    })
+    stops_data.append({
+        "type": "Pickup",
+        "time": current_time,
+        "dist": cumulative_distance
+    })
+    current_time += timedelta(seconds=duration)
+    shift_on_duty_seconds += duration
+    cycle_used_seconds += duration
+    
+    while not trip_complete:
+        
+        dist_to_fuel = FUEL_RANGE_METERS - distance_since_fuel
+        time_to_fuel = dist_to_fuel / avg_speed_mps if avg_speed_mps > 0 else 999999
+        
+        time_to_dest = remaining_distance / avg_speed_mps if avg_speed_mps > 0 else 0
+        
+        time_left_drive = (11 * HOURS_TO_SECONDS) - shift_drive_seconds
+        time_left_duty = (14 * HOURS_TO_SECONDS) - shift_on_duty_seconds
+        
+        time_left_cycle = cycle_limit_seconds - cycle_used_seconds
+        
+        time_to_8h_break = (8 * HOURS_TO_SECONDS) - shift_drive_seconds 
+        
+        
+        if time_left_drive <= 0 or time_left_duty <= 0:
+            duration = 10 * HOURS_TO_SECONDS
+            raw_events.append({
+                "status": "SLEEPER",
+                "start": current_time,
+                "end": current_time + timedelta(seconds=duration),
+                "duration": duration,
+                "start_dist": cumulative_distance,
+                "end_dist": cumulative_distance
+            })
+            stops_data.append({
+                "type": "Rest (10h)",
+                "time": current_time,
+                "dist": cumulative_distance
+            })
+            current_time += timedelta(seconds=duration)
+            shift_drive_seconds = 0
+            shift_on_duty_seconds = 0
+            continue # Loop again to decide next action
+            
+        if time_left_cycle <= 0:
+            duration = 34 * HOURS_TO_SECONDS
+            raw_events.append({
+                "status": "OFF_DUTY",
+                "start": current_time,
+                "end": current_time + timedelta(seconds=duration),
+                "duration": duration,
+                "start_dist": cumulative_distance,
+                "end_dist": cumulative_distance
+            })
+            stops_data.append({
+                "type": "Cycle Restart (34h)",
+                "time": current_time,
+                "dist": cumulative_distance
+            })
+            current_time += timedelta(seconds=duration)
+            cycle_used_seconds = 0
+            shift_drive_seconds = 0
+            shift_on_duty_seconds = 0
+            continue
+
+        next_event_time = min(time_to_fuel, time_to_dest, time_left_drive, time_left_duty, time_left_cycle)
+        
+        if shift_drive_seconds < 8 * HOURS_TO_SECONDS and (shift_drive_seconds + next_event_time) > 8 * HOURS_TO_SECONDS:
+            time_to_cap = (8 * HOURS_TO_SECONDS) - shift_drive_seconds
+            if time_to_cap < next_event_time:
+                next_event_time = time_to_cap
+        
+        if abs(shift_drive_seconds - 8 * HOURS_TO_SECONDS) < 60: # Tolerance
+             duration = 1800 # 30 mins
+             raw_events.append({
+                "status": "OFF_DUTY",
+                "start": current_time,
+                "end": current_time + timedelta(seconds=duration),
+                "duration": duration,
+                "start_dist": cumulative_distance,
+                "end_dist": cumulative_distance
+            })
+             stops_data.append({
+                "type": "Rest (30m)",
+                "time": current_time,
+                "dist": cumulative_distance
+            })
+             current_time += timedelta(seconds=duration)
+             shift_on_duty_seconds += duration 
+             
+             if raw_events[-1]["status"] == "OFF_DUTY":
+                 pass # Don't take another break
+             else:
+                 continue # Go take the break
+        
+        if next_event_time > 0:
+            raw_events.append({
+                "status": "DRIVING",
+                "start": current_time,
+                "end": current_time + timedelta(seconds=next_event_time),
+                "duration": next_event_time,
+                "start_dist": cumulative_distance,
+                "end_dist": cumulative_distance + (next_event_time * avg_speed_mps)
+            })
+            
+            dist_covered = next_event_time * avg_speed_mps
+            remaining_distance -= dist_covered
+            cumulative_distance += dist_covered
+            distance_since_fuel += dist_covered
+            
+            current_time += timedelta(seconds=next_event_time)
+            shift_drive_seconds += next_event_time
+            shift_on_duty_seconds += next_event_time
+            cycle_used_seconds += next_event_time
+            
+            if remaining_distance <= 100:
+                trip_complete = True
+                duration = 3600
+                raw_events.append({
+                    "status": "ON_DUTY",
+                    "start": current_time,
+                    "end": current_time + timedelta(seconds=duration),
+                    "duration": duration,
+                    "start_dist": cumulative_distance,
+                    "end_dist": cumulative_distance
+                })
+                stops_data.append({
+                    "type": "Dropoff",
+                    "time": current_time,
+                    "dist": cumulative_distance
+                })
+                current_time += timedelta(seconds=duration)
+                
+            elif distance_since_fuel >= FUEL_RANGE_METERS - 100:
+                duration = 1800
+                raw_events.append({
+                    "status": "ON_DUTY",
+                    "start": current_time,
+                    "end": current_time + timedelta(seconds=duration),
+                    "duration": duration,
+                    "start_dist": cumulative_distance,
+                    "end_dist": cumulative_distance
+                })
+                stops_data.append({
+                    "type": "Fuel",
+                    "time": current_time,
+                    "dist": cumulative_distance
+                })
+                current_time += timedelta(seconds=duration)
+                distance_since_fuel = 0
+                shift_on_duty_seconds += duration
+                cycle_used_seconds += duration
+
+    
+    daily_logs = []
+
+    route_index = RouteIndex(route_geometry) if route_geometry else None
+    
+    def get_midnight(dt):
+        return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    trip_start = raw_events[0]["start"]
+    trip_end = raw_events[-1]["end"]
+    
+    current_day_start = get_midnight(trip_start)
+    
+    while current_day_start < trip_end:
+        current_day_end = current_day_start + timedelta(days=1)
+        
+        day_log = {
+            "day_no": len(daily_logs) + 1,
+            "date": current_day_start.strftime("%Y-%m-%d"),
+            "grid_events": [],
+            "stops": [],
+            "summary": {
+                "drive_hours": 0,
+                "on_duty_hours": 0,
+                "distance_miles": 0
+            }
+        }
+        
+        for event in raw_events:
+            
+            e_start = event["start"]
+            e_end = event["end"]
+            
+            overlap_start = max(e_start, current_day_start)
+            overlap_end = min(e_end, current_day_end)
+            
+            if overlap_start < overlap_end:
+                duration = (overlap_end - overlap_start).total_seconds()
+                
+                day_log["grid_events"].append({
+                    "status": event["status"],
+                    "start": overlap_start.isoformat(),
+                    "end": overlap_end.isoformat(),
+                    "duration": duration
+                })
+                
+                if event["status"] == "DRIVING":
+                    day_log["summary"]["drive_hours"] += duration
+                    total_event_dist = event["end_dist"] - event["start_dist"]
+                    total_event_dur = event["duration"]
+                    if total_event_dur > 0:
+                        dist_fraction = duration / total_event_dur
+                        day_log["summary"]["distance_miles"] += (total_event_dist * dist_fraction / MILES_TO_METERS)
+                
+                if event["status"] in ["DRIVING", "ON_DUTY"]:
+                    day_log["summary"]["on_duty_hours"] += duration
+                    
+        for stop in stops_data:
+            if current_day_start <= stop["time"] < current_day_end:
+                coord = None
+                if route_index:
+                    coord = route_index.coordinate_at(stop["dist"])
+                
+                day_log["stops"].append({
+                    "type": stop["type"],
+                    "time": stop["time"].strftime("%H:%M"),
+                    "coord": coord
+                })
+        
+        day_log["summary"]["drive_hours"] = round(day_log["summary"]["drive_hours"] / 3600, 2)
+        day_log["summary"]["on_duty_hours"] = round(day_log["summary"]["on_duty_hours"] / 3600, 2)
+        day_log["summary"]["distance_miles"] = round(day_log["summary"]["distance_miles"], 2)
+        
+        daily_logs.append(day_log)
+        current_day_start = current_day_end
+
+    return daily_logs
+
+
+def straight_route(miles, points=500):
+    """A west-bound line from Dallas of roughly the given length."""
+    step = miles * MILES / 111320 / 0.84 / (points - 1)
+    return [[-96.80 - i * step, 32.78] for i in range(points)]
+
+
+# (miles, average mph, cycle used hours, start time)
+CORPUS = [
+    (45, 40, 0, datetime(2025, 3, 3, 8, 0)),
+    (300, 55, 10, datetime(2025, 3, 3, 23, 45)),
+    (620, 60, 0, datetime(2025, 3, 3, 0, 0)),
+    (1100, 58, 35, datetime(2025, 3, 3, 6, 30)),
+    (1500, 62, 62, datetime(2025, 3, 3, 17, 10)),
+    (2400, 57, 69.5, datetime(2025, 12, 30, 21, 0)),
+    (2800, 61, 20, datetime(2025, 2, 27, 12, 0)),
+    (4200, 55, 45, datetime(2025, 3, 3, 4, 15)),
+]
+
+
+class RouteIndexTests(SimpleTestCase):
+
+    def test_interpolates_inside_segments(self):
+        index = RouteIndex([[-96.0, 32.0], [-97.0, 32.0], [-97.0, 33.0]])
+        first = index.cumulative[1]
+        self.assertEqual(index.coordinate_at(first), {"lat": 32.0, "lng": -97.0})
+        halfway = index.coordinate_at(first / 2)
+        self.assertAlmostEqual(halfway["lng"], -96.5)
+        self.assertAlmostEqual(halfway["lat"], 32.0)
+        quarter = index.coordinate_at(first + (index.length_meters - first) / 4)
+        self.assertAlmostEqual(quarter["lng"], -97.0)
+        self.assertAlmostEqual(quarter["lat"], 32.25)
+
+    def test_clamps_to_the_ends(self):
+        index = RouteIndex([[-96.0, 32.0], [-97.0, 32.0]])
+        for distance in (-100, 0):
+            self.assertEqual(index.coordinate_at(distance), {"lat": 32.0, "lng": -96.0})
+        for distance in (index.length_meters, index.length_meters + 1, 1e12):
+            self.assertEqual(index.coordinate_at(distance), {"lat": 32.0, "lng": -97.0})
+
+    def test_zero_length_segments(self):
+        index = RouteIndex([[-96.0, 32.0], [-96.0, 32.0], [-97.0, 32.0], [-97.0, 32.0]])
+        self.assertEqual(index.coordinate_at(0), {"lat": 32.0, "lng": -96.0})
+        self.assertAlmostEqual(index.coordinate_at(index.length_meters / 2)["lng"], -96.5)
+        self.assertEqual(index.coordinate_at(index.length_meters), {"lat": 32.0, "lng": -97.0})
+
+        point = RouteIndex([[-96.0, 32.0]])
+        self.assertEqual(point.length_meters, 0)
+        self.assertEqual(point.coordinate_at(500), {"lat": 32.0, "lng": -96.0})
+        self.assertIsNone(RouteIndex([]).coordinate_at(0))
+
+
+class GenerateEldSheetsRegressionTests(SimpleTestCase):
+
+    def test_matches_legacy_implementation(self):
+        for miles, mph, cycle_used, start in CORPUS:
+            distance = miles * MILES
+            duration = miles / mph * HOURS
+            for geometry in (None, straight_route(miles)):
+                with self.subTest(miles=miles, cycle_used=cycle_used, start=start, geometry=bool(geometry)):
+                    self.assertEqual(
+                        generate_eld_sheets(distance, duration, cycle_used, start, geometry),
+                        legacy_generate_eld_sheets(distance, duration, cycle_used, start, geometry),
+                    )
+
+    def test_days_are_contiguous(self):
+        logs = generate_eld_sheets(4200 * MILES, 4200 / 55 * HOURS, 45, datetime(2025, 3, 3, 4, 15))
+        self.assertEqual([log["day_no"] for log in logs], list(range(1, len(logs) + 1)))
+        for log in logs:
+            self.assertLessEqual(sum(e["duration"] for e in log["grid_events"]), 24 * HOURS)
+
+
+class ScheduleCacheTests(SimpleTestCase):
+
+    def test_one_schedule_serves_every_start_time(self):
+        cache = ScheduleCache(max_entries=2)
+        args = (1100 * MILES, 1100 / 58 * HOURS, 35)
+        for start in (datetime(2025, 3, 3, 6, 30), datetime(2025, 3, 9, 23, 59), datetime(2025, 12, 31, 12)):
+            timeline = cache.get(*args)
+            self.assertEqual(_bucket_into_days(timeline, start), _bucket_into_days(_simulate_events(*args), start))
+        self.assertIs(cache.get(*args), timeline)
+        self.assertEqual(cache.info(), {"hits": 3, "misses": 1, "hit_ratio": 0.75, "entries": 1})
+
+        # Least recently used lanes go first
+        cache.get(300 * MILES, 300 / 55 * HOURS, 10)
+        cache.get(*args)
+        cache.get(45 * MILES, 45 / 40 * HOURS, 0)
+        self.assertIs(cache.get(*args), timeline)
+        self.assertEqual(cache.info()["entries"], 2)
+        self.assertEqual(cache.info()["misses"], 3)
+
+    def test_quantized_keys_share_a_schedule(self):
+        cache = ScheduleCache(max_entries=8, distance_quantum=100, speed_quantum=0.1, cycle_quantum=0.25)
+        timeline = cache.get(1000 * MILES + 5, 1000 * MILES / 25.02, 10.1)
+        self.assertIs(cache.get(1000 * MILES - 30, 1000 * MILES / 24.98, 9.9), timeline)
+        self.assertIsNot(cache.get(1000 * MILES + 200, 1000 * MILES / 25, 10), timeline)
+
+
+class PoiIndexTests(SimpleTestCase):
+
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(3)
+        pois = [(f"poi {i}", rng.choice(("fuel", "truck_stop", "rest_area")), rng.uniform(30, 48), rng.uniform(-120, -75))
+                for i in range(5000)]
+        index = PoiIndex(pois, 5 * MILES)
+        for _ in range(300):
+            lat, lng = rng.uniform(30, 48), rng.uniform(-120, -75)
+            radius = rng.choice((2, 5, 12)) * MILES
+            kinds = rng.choice((("fuel",), ("truck_stop", "rest_area")))
+            in_range = [(local_distance(lat, lng, p[2], p[3]), i) for i, p in enumerate(pois)
+                        if p[1] in kinds and local_distance(lat, lng, p[2], p[3]) <= radius]
+            self.assertEqual(index.nearest(lat, lng, radius, kinds), min(in_range)[1] if in_range else None)
+
+    def test_fuel_and_rest_stops_are_snapped(self):
+        geometry = straight_route(2400)
+        # A truck stop half a mile off the road every ~10 miles, nothing else
+        pois = PoiIndex([("Travel Center", "truck_stop", lat + 0.007, lng)
+                         for lng, lat in geometry[::2]], 5 * MILES)
+        with override_settings(STOP_SNAPPING=True), mock.patch("trip_api.eld_logs.get_poi_index", return_value=pois):
+            logs = generate_eld_sheets(2400 * MILES, 2400 / 57 * HOURS, 20, datetime(2025, 3, 3, 6, 30), geometry)
+        stops = [stop for log in logs for stop in log["stops"]]
+        self.assertIn("Fuel", [stop["type"] for stop in stops])
+        for stop in stops:
+            if stop["type"] in ("Pickup", "Dropoff"):
+                self.assertNotIn("poi", stop)
+            else:
+                self.assertEqual(stop["poi"]["name"], "Travel Center")
+                self.assertLess(stop["poi"]["offsetMiles"], 5)
+                self.assertAlmostEqual(stop["coord"]["lat"], 32.787)
+
+    def test_cells_have_a_minimum_size(self):
+        pois = [("Travel Center", "truck_stop", 32.78, -96.8), ("Rest Area", "rest_area", 32.79, -96.8)]
+        for cell_meters in (0, -5):
+            index = PoiIndex(pois, cell_meters)
+            self.assertEqual(index.nearest(32.78, -96.8, 0), 0)
+            self.assertEqual(index.nearest(32.785, -96.8, 2 * MILES, ("rest_area",)), 1)
+
+    def test_sample_file_loads(self):
+        index = PoiIndex.load(settings.POI_PATH, 5 * MILES)
+        self.assertGreater(len(index), 100)
+
+
+class ResponseEncodingTests(SimpleTestCase):
+
+    def test_renderer_matches_drf(self):
+        logs = generate_eld_sheets(2800 * MILES, 2800 / 61 * HOURS, 20, datetime(2025, 2, 27, 12), straight_route(2800))
+        data = {"eldLogs": logs, "note": "Saint-Jérôme", "empty": None}
+        self.assertEqual(json.loads(PlanJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_encoding_negotiation(self):
+        self.assertEqual(choose_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(choose_encoding("gzip;q=0, identity"), None)
+        self.assertEqual(choose_encoding(""), None)
+        self.assertEqual(choose_encoding("*"), choose_encoding("br, gzip"))
+        self.assertEqual(choose_encoding("br;q=0.5, gzip;q=0.8"), "gzip")
+
+    @override_settings(COMPRESSION_MIN_BYTES=1000)
+    def test_compresses_large_bodies_only(self):
+        body = json.dumps(straight_route(500)).encode()
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+
+        def respond(content):
+            response = HttpResponse(content, content_type="application/json")
+            response["ETag"] = '"abc"'
+            return CompressionMiddleware(lambda r: response)(request)
+
+        response = respond(body)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+
+        response = respond(b'{"error": "short"}')
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["ETag"], '"abc"')
+
+        stream = StreamingHttpResponse(iter([body]), content_type="application/x-ndjson")
+        self.assertFalse(CompressionMiddleware(lambda r: stream)(request).has_header("Content-Encoding"))
+
+
+class ColdStartProfileTests(SimpleTestCase):
+
+    def test_slim_urls_serve_the_api_only(self):
+        self.assertIs(resolve("/api/trip-plan/", "backend.urls_slim").func.view_class, TripPlanView)
+        with self.assertRaises(Resolver404):
+            resolve("/admin/", "backend.urls_slim")
+
+    def test_warm_up_is_not_an_ors_call(self):
+        transport = Transport(pool_size=1, **{**transport_options(), "breaker_threshold": 1})
+        with self.assertLogs("trip_api.transport", "WARNING"):
+            transport.warm_up("http://127.0.0.1:1/")
+        self.assertEqual(transport.counters()["requests"], 0)
+        self.assertEqual(transport.breaker.state, "closed")
+
+    @override_settings(ORS_PREWARM=True, STOP_SNAPPING=True, GEOCODING_BACKEND="local")
+    def test_warm_up_runs_only_from_the_server_entry_points(self):
+        with mock.patch("trip_api.transport.prewarm") as prewarm, \
+                mock.patch("trip_api.poi.get_poi_index") as poi_index, \
+                mock.patch("trip_api.gazetteer.get_gazetteer") as gazetteer:
+            # What every management command runs
+            apps.get_app_config("trip_api").ready()
+            prewarm.assert_not_called()
+            poi_index.assert_not_called()
+            gazetteer.assert_not_called()
+
+            startup.warm_up()
+        prewarm.assert_called_once()
+        poi_index.assert_called_once()
+        gazetteer.assert_called_once()
+
+    def test_slim_profile_runs_batches_in_process(self):
+        from backend import settings_slim
+        with override_settings(BATCH_SIMULATION_PROCESSES=settings_slim.BATCH_SIMULATION_PROCESSES), \
+                mock.patch.object(concurrency, "_process_pool", None), \
+                mock.patch.object(concurrency, "_process_pool_unavailable", False), \
+                mock.patch("trip_api.concurrency.ProcessPoolExecutor") as pool:
+            self.assertEqual(concurrency.map_in_processes(divmod, [(7, 2), (9, 4)]), [(3, 1), (2, 1)])
+        pool.assert_not_called()
+
+
+class ReplanTests(SimpleTestCase):
+
+    def plan(self, miles=2400, mph=57, cycle_used=20, start=datetime(2025, 3, 3, 6, 30), geometry=None,
+             detail="full"):
+        route = {"distance_meters": miles * MILES, "duration_seconds": miles / mph * HOURS,
+                 "geometry": geometry or straight_route(miles)}
+        empty = {"distance_meters": 0, "duration_seconds": 0, "geometry": route["geometry"][:1]}
+        eld_logs = generate_eld_sheets(route["distance_meters"], route["duration_seconds"], cycle_used, start,
+                                       empty["geometry"] + route["geometry"])
+        point = {"lat": 32.78, "lng": -96.80}
+        return build_plan((point, point, point), empty, route, eld_logs, detail, "json",
+                          simulation_block(empty, route, cycle_used, start))
+
+    def test_only_days_from_the_update_are_rebuilt(self):
+        plan = self.plan()
+        # Running three hours late 1000 miles in, then held up at a weigh station
+        updated = replan(plan, {"elapsedMiles": 1000, "at": "2025-03-04T22:00:00", "delayMinutes": 45})
+        reused = updated["replan"]["reusedDays"]
+        self.assertGreater(reused, 0)
+        self.assertEqual(updated["eldLogs"][:reused], plan["eldLogs"][:reused])
+        self.assertNotEqual(updated["eldLogs"][reused:], plan["eldLogs"][reused:])
+        self.assertAlmostEqual(updated["replan"]["checkpoint"]["cumulative_distance"], 1000 * MILES)
+
+        simulation = updated["simulation"]
+        timeline, _, _ = replan_timeline(
+            simulation["distanceMeters"], simulation["durationSeconds"], simulation["cycleUsed"],
+            [(1000 * MILES, (datetime(2025, 3, 4, 22) - datetime(2025, 3, 3, 6, 30)) // timedelta(microseconds=1),
+              45 * 60)],
+        )
+        start = datetime(2025, 3, 3, 6, 30)
+        self.assertEqual(
+            updated["eldLogs"],
+            [round_stops(day) for day in _bucket_into_days(timeline, start, RouteIndex(straight_route(2400)))],
+        )
+
+        # Updates chain on the re-planned trip
+        again = replan(updated, {"elapsedMiles": 2000})
+        self.assertEqual(len(again["simulation"]["updates"]), 2)
+        self.assertGreaterEqual(again["replan"]["reusedDays"], reused)
+        self.assertEqual(again["eldLogs"][:reused], plan["eldLogs"][:reused])
+
+    def test_delay_pushes_back_the_dropoff(self):
+        plan = self.plan()
+        updated = replan(plan, {"elapsedMiles": 300, "delayMinutes": 120})
+        stops = [stop["type"] for day in updated["eldLogs"] for stop in day["stops"]]
+        self.assertIn("Delay", stops)
+        self.assertEqual(stops.count("Dropoff"), 1)
+        last_end = lambda p: p["eldLogs"][-1]["grid_events"][-1]["end"]
+        self.assertGreaterEqual(
+            datetime.fromisoformat(last_end(updated)) - datetime.fromisoformat(last_end(plan)),
+            timedelta(hours=2),
+        )
+
+    def test_rejects_impossible_updates(self):
+        plan = self.plan()
+        self.assertRaises(ValueError, replan, plan, {"elapsedMiles": 2500})
+        self.assertRaises(ValueError, replan, plan, {"elapsedMiles": 500, "at": "2025-03-03T06:00:00"})
+        self.assertRaises(ValueError, replan, {"eldLogs": []}, {"elapsedMiles": 10})
+
+    def test_rejects_out_of_range_updates(self):
+        plan = self.plan()
+        for update in (
+            {"elapsedMiles": 500, "delayMinutes": "inf"},
+            {"elapsedMiles": "nan"},
+            {"elapsedMiles": "-inf"},
+            {"elapsedMiles": 500, "delayMinutes": "nan"},
+            {"elapsedMiles": 500, "delayMinutes": 169 * 60},
+            {"elapsedMiles": 500, "at": "2099-01-01T00:00:00"},
+            {"elapsedMiles": 500, "at": "0001-01-01T00:00:00+14:00"},
+            {"elapsedMiles": 500, "at": "yesterday"},
+        ):
+            with self.subTest(update=update):
+                self.assertRaises(ValueError, replan, plan, update)
+
+        # Delays add up across updates
+        delayed = replan(plan, {"elapsedMiles": 500, "delayMinutes": 100 * 60})
+        with self.assertRaisesMessage(ValueError, "Delays add up to more than 168 hours"):
+            replan(delayed, {"elapsedMiles": 600, "delayMinutes": 100 * 60})
+
+        # Overflows still get a 400 at the view
+        request = APIRequestFactory().post(
+            "/api/trip-plan/replan/", {"plan": plan, "update": {"elapsedMiles": 500, "delayMinutes": 1e300}},
+            format="json",
+        )
+        response = TripReplanView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_malformed_plans(self):
+        plan = self.plan()
+        self.assertRaises(ValueError, replan, {**plan, "eldLogs": {}}, {"elapsedMiles": 500})
+        self.assertRaises(ValueError, replan, {**plan, "eldLogs": ["day 1"]}, {"elapsedMiles": 500})
+        with self.assertRaisesMessage(ValueError, "elapsedMiles must be a number"):
+            replan(plan, {"elapsedMiles": True})
+
+        # An aware start time is compared in local time, like the update's
+        start = datetime(2025, 3, 3, 6, 30).astimezone()
+        aware = {**plan, "simulation": {**plan["simulation"], "startTime": start.isoformat()}}
+        updated = replan(aware, {"elapsedMiles": 500, "at": (start + timedelta(hours=10)).isoformat()})
+        self.assertEqual(updated["eldLogs"], replan(plan, {"elapsedMiles": 500, "at": "2025-03-03T16:30:00"})["eldLogs"])
+        self.assertRaises(ValueError, replan, aware, {"elapsedMiles": 500, "at": (start - timedelta(hours=1)).isoformat()})
+
+    def test_rejects_forged_simulation_blocks(self):
+        plan = self.plan()
+        simulation = plan["simulation"]
+        for changes in (
+            {"distanceMeters": "inf"},
+            {"distanceMeters": simulation["distanceMeters"] * 2},
+            {"durationSeconds": simulation["durationSeconds"] + HOURS},
+            {"cycleUsed": "nan"},
+            {"cycleUsed": -1},
+            {"updates": [{"elapsedMiles": "nan"}]},
+            {"updates": [{"elapsedMiles": 10}] * 200},
+            {"geometry": "}}}"},
+        ):
+            with self.subTest(changes=changes):
+                forged = {**plan, "simulation": {**simulation, **changes}}
+                self.assertRaises(ValueError, replan, forged, {"elapsedMiles": 500})
+
+        # Consistent with routeMap, but a longer trip than any route
+        miles = 20000
+        forged = {
+            **plan,
+            "routeMap": {**plan["routeMap"], "distanceMiles": miles, "durationHours": miles / 57},
+            "simulation": {**simulation, "distanceMeters": miles * MILES, "durationSeconds": miles / 57 * HOURS},
+        }
+        with self.assertRaisesMessage(ValueError, "simulation.distanceMeters must be between 0 and"):
+            replan(forged, {"elapsedMiles": 500})
+
+    def test_stops_are_placed_on_the_full_route(self):
+        geometry = ors_like_route(points=20000)
+        miles = RouteIndex(geometry).length_meters / MILES
+        start = datetime(2025, 3, 3, 6, 30)
+        plan = self.plan(miles=miles, start=start, geometry=geometry, detail="low")
+        updated = replan(plan, {"elapsedMiles": 100, "delayMinutes": 90})
+
+        timeline, _, _ = replan_timeline(
+            miles * MILES, plan["simulation"]["durationSeconds"], 20, [(100 * MILES, None, 90 * 60)],
+        )
+        on_route = [round_stops(day) for day in _bucket_into_days(timeline, start, RouteIndex(geometry))]
+        on_map = [round_stops(day) for day in _bucket_into_days(
+            timeline, start, RouteIndex(plan["routeMap"]["leg1"] + plan["routeMap"]["leg2"]),
+        )]
+        self.assertEqual(updated["eldLogs"], on_route)
+        # The simplified map route is shorter, so stops placed on it drift
+        self.assertNotEqual(updated["eldLogs"], on_map)
+
+
+try:
+    import numpy
+except ImportError:  # fleet simulator extras not installed
+    numpy = None
+
+
+@skipUnless(numpy, "numpy is required for the fleet simulator")
+class FleetSimulatorTests(SimpleTestCase):
+
+    def scalar_summary(self, distance, duration, cycle_used, start):
+        timeline = _simulate_events(distance, duration, cycle_used)
+        stop_types = list(timeline.stop_type)
+        return {
+            "arrival": start + timedelta(microseconds=timeline.end),
+            "days": len(generate_eld_sheets(distance, duration, cycle_used, start)),
+            "fuel_stops": stop_types.count(FUEL),
+            "rest_30m_stops": stop_types.count(REST_30M),
+            "rest_10h_stops": stop_types.count(REST_10H),
+            "cycle_restarts": stop_types.count(CYCLE_RESTART),
+        }
+
+    def test_matches_scalar_engine(self):
+        from .fleet_sim import simulate_fleet
+
+        scenarios = [(m * MILES, m / mph * HOURS, c, s) for m, mph, c, s in CORPUS]
+        # Sweep cycle used and start time across a week for a few lanes
+        for miles, mph in ((180, 45), (950, 57), (2700, 60)):
+            for cycle_used in range(0, 71, 7):
+                for hour in range(0, 7 * 24, 19):
+                    start = datetime(2025, 3, 3) + timedelta(hours=hour, minutes=cycle_used)
+                    scenarios.append((miles * MILES, miles / mph * HOURS, cycle_used, start))
+        scenarios.append((0, 0, 12, datetime(2025, 3, 3, 9)))
+
+        distance, duration, cycle_used, start = zip(*scenarios)
+        fleet = simulate_fleet(distance, duration, cycle_used, start)
+
+        for i, scenario in enumerate(scenarios):
+            expected = self.scalar_summary(*scenario)
+            with self.subTest(scenario=scenario):
+                self.assertEqual(fleet["arrival"][i].astype(datetime), expected["arrival"])
+                for field in ("days", "fuel_stops", "rest_30m_stops", "rest_10h_stops", "cycle_restarts"):
+                    self.assertEqual(int(fleet[field][i]), expected[field], field)
+
+    def test_log_sheets_only_on_request(self):
+        from .fleet_sim import simulate_fleet
+
+        start = datetime(2025, 3, 3, 6)
+        fleet = simulate_fleet(1500 * MILES, 1500 / 60 * HOURS, [0, 30, 69], start)
+        self.assertNotIn("log_sheets", fleet)
+
+        fleet = simulate_fleet(1500 * MILES, 1500 / 60 * HOURS, [0, 30, 69], start, log_sheets=[2])
+        self.assertEqual(list(fleet["log_sheets"]), [2])
+        self.assertEqual(
+            fleet["log_sheets"][2], generate_eld_sheets(1500 * MILES, 1500 / 60 * HOURS, 69.0, start)
+        )
+
+
+def grid_graph(size=12, seed=7):
+    """A size x size street grid around Dallas, ~1 km apart, with random speeds and some one-way streets."""
+    rng = random.Random(seed)
+    nodes = [[-96.80 + x * 0.0107, 32.78 + y * 0.009] for y in range(size) for x in range(size)]
+    edges = []
+    for y in range(size):
+        for x in range(size):
+            i = y * size + x
+            for j in ([i + 1] if x + 1 < size else []) + ([i + size] if y + 1 < size else []):
+                edge = [i, j, rng.choice([30, 50, 80, 110])]
+                if rng.random() < 0.2:
+                    edge.append(1)
+                edges.append(edge)
+    return nodes, edges
+
+
+def dijkstra_seconds(graph, source, target):
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        seconds, node = heapq.heappop(heap)
+        if node == target:
+            return seconds
+        if seconds > best[node]:
+            continue
+        for arc in range(graph.offsets[node], graph.offsets[node + 1]):
+            candidate = seconds + graph.times[arc]
+            if candidate < best.get(graph.targets[arc], float("inf")):
+                best[graph.targets[arc]] = candidate
+                heapq.heappush(heap, (candidate, graph.targets[arc]))
+    return None
+
+
+class RoadGraphTests(SimpleTestCase):
+
+    def test_astar_matches_dijkstra(self):
+        graph = RoadGraph(*grid_graph())
+        rng = random.Random(1)
+        for _ in range(50):
+            source, target = rng.randrange(graph.node_count), rng.randrange(graph.node_count)
+            expected = dijkstra_seconds(graph, source, target)
+            with self.subTest(source=source, target=target):
+                if expected is None:
+                    self.assertRaises(ValueError, graph.shortest_path, source, target)
+                    continue
+                path, meters, seconds = graph.shortest_path(source, target)
+                self.assertAlmostEqual(seconds, expected, places=3)
+                self.assertEqual((path[0], path[-1]), (source, target))
+
+    def test_oneway_edges(self):
+        graph = RoadGraph([[-96.80, 32.78], [-96.79, 32.78]], [[0, 1, 50, 1]])
+        self.assertEqual(graph.shortest_path(0, 1)[0], [0, 1])
+        self.assertRaises(ValueError, graph.shortest_path, 1, 0)
+
+    def test_route_matches_ors_contract(self):
+        nodes, edges = grid_graph()
+        graph = RoadGraph(nodes, [edge[:3] for edge in edges])
+        waypoints = [[-96.7995, 32.7801], [-96.70, 32.85], [-96.69, 32.78]]
+        route = graph.route(waypoints, split_legs=True, max_snap_meters=1000)
+
+        self.assertEqual(len(route["legs"]), 2)
+        self.assertAlmostEqual(route["distance_meters"], sum(leg["distance_meters"] for leg in route["legs"]))
+        self.assertAlmostEqual(route["duration_seconds"], sum(leg["duration_seconds"] for leg in route["legs"]))
+        leg1, leg2 = (leg["geometry"] for leg in route["legs"])
+        self.assertEqual(route["geometry"], leg1 + leg2[1:])
+        self.assertEqual(leg1[-1], leg2[0])
+        self.assertEqual(route["geometry"][0], nodes[0])
+
+        with self.assertRaisesMessage(ValueError, "No road within"):
+            graph.route([[-96.80, 32.78], [-90.0, 35.0]], max_snap_meters=1000)
+
+    def test_sample_graph_is_connected(self):
+        graph = RoadGraph.load(settings.ROAD_GRAPH_PATH)
+        # Seattle to Miami and back
+        route = graph.route([[-122.3321, 47.6062], [-80.1918, 25.7617], [-122.33, 47.61]], split_legs=True)
+        self.assertGreater(route["distance_meters"], 4000e3)
+        self.assertEqual(route["legs"][1]["geometry"][-1], [-122.3321, 47.6062])
+
+    @override_settings(ROUTING_BACKEND="local")
+    def test_falls_back_to_ors_off_the_graph(self):
+        ors_route = {"distance_meters": 1, "duration_seconds": 1, "geometry": [[0, 0], [0, 0.01]]}
+        with mock.patch("trip_api.ors_client.get_route", return_value=ors_route) as ors:
+            self.assertIs(routing.get_route([[0, 0], [0, 0.01]]), ors_route)
+            route = routing.get_route([[-87.6298, 41.8781], [-90.1994, 38.627]])
+        ors.assert_called_once()
+        self.assertEqual(route["geometry"], [[-87.6298, 41.8781], [-90.1994, 38.627]])
+
+        with override_settings(ROUTING_ORS_FALLBACK=False):
+            self.assertRaises(ValueError, routing.get_route, [[0, 0], [0, 0.01]])
+
+
+class GazetteerTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gazetteer = Gazetteer.load(settings.GAZETTEER_PATH)
+
+    def assertPlace(self, query, place):
+        found = self.gazetteer.search(query)
+        self.assertEqual(found is not None and self.gazetteer.names[found], place, query)
+
+    def test_place_names(self):
+        self.assertPlace("Chicago, IL", "Chicago, IL")
+        self.assertPlace("chicago illinois USA", "Chicago, IL")
+        self.assertPlace("Saint Louis, Missouri", "St. Louis, MO")
+        self.assertPlace("Seattle, Washington", "Seattle, WA")
+        self.assertPlace("Washington, DC", "Washington, DC")
+        # The most populous of several places with the name
+        self.assertPlace("Kansas City", "Kansas City, MO")
+        self.assertPlace("Kansas City, Kansas", "Kansas City, KS")
+        self.assertPlace("Portland", "Portland, OR")
+        self.assertPlace("Portland ME", "Portland, ME")
+
+    def test_prefixes_and_typos(self):
+        self.assertPlace("Indianap", "Indianapolis, IN")
+        self.assertPlace("Chcago, IL", "Chicago, IL")
+        self.assertPlace("Albuquerqe", "Albuquerque, NM")
+        self.assertPlace("Sprngfield, MA", "Springfield, MA")
+
+    def test_unmatched_input(self):
+        for query in ("123 Main St, Chicago, IL 60601", "Toronto, Canada", "", "Chicago, TX", "Oklahoma"):
+            self.assertIsNone(self.gazetteer.search(query), query)
+
+    @override_settings(GEOCODING_BACKEND="local")
+    def test_falls_back_to_ors_when_unmatched(self):
+        with mock.patch("trip_api.ors_client.geocode_address", return_value={"lat": 1, "lng": 2}) as ors:
+            self.assertEqual(geocoding.geocode_address("Dallas, TX"), {"lat": 32.7767, "lng": -96.797})
+            self.assertEqual(geocoding.geocode_address("1 Elm St, Dallas, TX"), {"lat": 1, "lng": 2})
+        ors.assert_called_once_with("1 Elm St, Dallas, TX")
+
+        with override_settings(GEOCODING_ORS_FALLBACK=False):
+            self.assertRaises(ValueError, geocoding.geocode_address, "1 Elm St, Dallas, TX")
+
+
+class Clock:
+    """Stands in for django.utils.timezone.now; advanced by hand."""
+
+    def __init__(self):
+        self.now = datetime(2025, 3, 3, 12, 0, tzinfo=timezone.utc)
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+class GeocodeCacheTests(TestCase):
+
+    def setUp(self):
+        cache.geocode_stats.reset()
+
+    def test_hit_after_miss(self):
+        dallas = {"lat": 32.7767, "lng": -96.797}
+        with mock.patch("trip_api.ors_client._fetch_geocode", return_value=dallas) as fetch:
+            self.assertEqual(ors_client.geocode_address("Dallas, TX"), dallas)
+            # Normalized to the same key
+            self.assertEqual(ors_client.geocode_address("  DALLAS,  tx."), dallas)
+        fetch.assert_called_once_with("Dallas, TX")
+        self.assertEqual(cache.geocode_cache_info(), {
+            "hits": 1, "misses": 1, "hit_ratio": 0.5, "entries": 1, "total_hits": 1,
+        })
+
+    @override_settings(GEOCODE_CACHE_TTL_SECONDS=60)
+    def test_expired_entries_miss(self):
+        now = Clock()
+        with mock.patch("django.utils.timezone.now", now):
+            cache.set_geocode("Dallas, TX", {"lat": 1, "lng": 2})
+            now.tick(59)
+            self.assertEqual(cache.get_geocode("Dallas, TX"), {"lat": 1, "lng": 2})
+            now.tick(2)
+            self.assertIsNone(cache.get_geocode("Dallas, TX"))
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    @override_settings(GEOCODE_CACHE_MAX_ENTRIES=2)
+    def test_evicts_least_recently_used(self):
+        now = Clock()
+        with mock.patch("django.utils.timezone.now", now):
+            for address in ("a", "b"):
+                cache.set_geocode(address, {"lat": 1, "lng": 1})
+                now.tick(1)
+            cache.get_geocode("a")
+            now.tick(1)
+            cache.set_geocode("c", {"lat": 1, "lng": 1})
+        self.assertEqual(sorted(GeocodeCacheEntry.objects.values_list("address", flat=True)), ["a", "c"])
+
+    def test_database_errors_fall_back_to_ors(self):
+        broken = mock.Mock(**{"filter.side_effect": DatabaseError, "update_or_create.side_effect": DatabaseError})
+        with mock.patch.object(GeocodeCacheEntry, "objects", broken), \
+                mock.patch("trip_api.ors_client._fetch_geocode", return_value={"lat": 1, "lng": 2}) as fetch, \
+                self.assertLogs("trip_api.cache", "WARNING"):
+            self.assertEqual(ors_client.geocode_address("Dallas, TX"), {"lat": 1, "lng": 2})
+        fetch.assert_called_once()
+
+
+def ors_route(coords):
+    """A _fetch_route result for a straight route through coords ([lng, lat])."""
+    return {
+        "distance_meters": 1000.0 * (len(coords) - 1),
+        "duration_seconds": 60.0 * (len(coords) - 1),
+        "geometry": polyline.encode([(lat, lng) for lng, lat in coords]),
+        "segments": [[1000.0, 60.0]] * (len(coords) - 1),
+        "way_points": list(range(len(coords))),
+    }
+
+
+class RouteCacheTests(TestCase):
+    WAYPOINTS = [[-96.8, 32.78], [-97.33, 32.75]]
+
+    def setUp(self):
+        cache.route_stats.reset()
+
+    def test_nearby_waypoints_share_a_route(self):
+        nearby = [[lng + 0.00002, lat - 0.00002] for lng, lat in self.WAYPOINTS]
+        elsewhere = [[lng + 0.001, lat] for lng, lat in self.WAYPOINTS]
+        self.assertEqual(cache.route_key(nearby), cache.route_key(self.WAYPOINTS))
+        self.assertNotEqual(cache.route_key(elsewhere), cache.route_key(self.WAYPOINTS))
+
+        with mock.patch("trip_api.ors_client._fetch_route", side_effect=ors_route) as fetch:
+            first = ors_client.get_route(self.WAYPOINTS)
+            self.assertEqual(ors_client.get_route(nearby), first)
+            ors_client.get_route(elsewhere)
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(first["geometry"], self.WAYPOINTS)
+        self.assertEqual(cache.route_stats.as_dict(), {"hits": 1, "misses": 2, "hit_ratio": 0.3333})
+
+    @override_settings(ROUTE_CACHE_TTL_SECONDS=60)
+    def test_expired_entries_miss(self):
+        now = Clock()
+        with mock.patch("django.utils.timezone.now", now):
+            cache.set_route(self.WAYPOINTS, ors_route(self.WAYPOINTS))
+            now.tick(59)
+            self.assertIsNotNone(cache.get_route(self.WAYPOINTS))
+            now.tick(2)
+            self.assertIsNone(cache.get_route(self.WAYPOINTS))
+        self.assertFalse(RouteCacheEntry.objects.exists())
+
+    @override_settings(ROUTE_CACHE_MAX_ENTRIES=2)
+    def test_evicts_least_recently_used(self):
+        routes = [[[lng + i, lat] for lng, lat in self.WAYPOINTS] for i in range(3)]
+        now = Clock()
+        with mock.patch("django.utils.timezone.now", now):
+            for route in routes[:2]:
+                cache.set_route(route, ors_route(route))
+                now.tick(1)
+            cache.get_route(routes[0])
+            now.tick(1)
+            cache.set_route(routes[2], ors_route(routes[2]))
+        self.assertIsNotNone(cache.get_route(routes[0]))
+        self.assertIsNone(cache.get_route(routes[1]))
+        self.assertIsNotNone(cache.get_route(routes[2]))
+
+    def test_database_errors_fall_back_to_ors(self):
+        broken = mock.Mock(**{"filter.side_effect": DatabaseError, "update_or_create.side_effect": DatabaseError})
+        with mock.patch.object(RouteCacheEntry, "objects", broken), \
+                mock.patch("trip_api.ors_client._fetch_route", side_effect=ors_route) as fetch, \
+                self.assertLogs("trip_api.cache", "WARNING"):
+            route = ors_client.get_route(self.WAYPOINTS)
+        fetch.assert_called_once()
+        self.assertEqual(route["distance_meters"], 1000.0)
+
+
+def http_response(status, headers=None):
+    return mock.Mock(status_code=status, headers=headers or {})
+
+
+class TransportTests(SimpleTestCase):
+
+    def transport(self, **options):
+        return Transport(pool_size=1, **{**transport_options(), **options})
+
+    def test_retries_with_backoff(self):
+        transport = self.transport(max_retries=2, backoff_base=0.25, backoff_max=2)
+        responses = [http_response(503), http_response(429, {"Retry-After": "7"}), http_response(200)]
+        with mock.patch.object(transport.session, "request", side_effect=responses), \
+                mock.patch("trip_api.transport.time.sleep") as sleep:
+            self.assertEqual(transport.get("http://ors/").status_code, 200)
+        first, second = [call.args[0] for call in sleep.call_args_list]
+        self.assertTrue(0 <= first <= 0.25)
+        # Retry-After is honoured, capped at backoff_max
+        self.assertEqual(second, 2)
+        counters = transport.counters()
+        self.assertEqual((counters["attempts"], counters["retries"], counters["failures"]), (3, 2, 0))
+
+    def test_gives_up_after_max_retries(self):
+        transport = self.transport(max_retries=1)
+        with mock.patch.object(transport.session, "request", return_value=http_response(502)) as request, \
+                mock.patch("trip_api.transport.time.sleep"):
+            self.assertRaisesMessage(UpstreamError, "HTTP 502", transport.get, "http://ors/")
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(transport.counters()["failures"], 1)
+
+    def test_breaker_cycle(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=30)
+        with mock.patch("trip_api.transport.time.monotonic", return_value=100):
+            breaker.record_failure()
+            self.assertEqual(breaker.state, "closed")
+            breaker.record_failure()
+            self.assertEqual(breaker.state, "open")
+            self.assertFalse(breaker.allow())
+        with mock.patch("trip_api.transport.time.monotonic", return_value=130):
+            self.assertEqual(breaker.state, "half-open")
+            self.assertTrue(breaker.allow())
+            # One trial call at a time
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+            self.assertEqual(breaker.state, "closed")
+            self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.times_opened, 1)
+
+    def test_failed_trial_reopens_the_breaker(self):
+        transport = self.transport(max_retries=0, breaker_threshold=1, breaker_cooldown=30)
+        errors = [requests.ConnectionError("refused"), requests.exceptions.ChunkedEncodingError("cut off")]
+        with mock.patch.object(transport.session, "request", side_effect=[*errors, http_response(200)]), \
+                mock.patch("trip_api.transport.time.monotonic") as monotonic:
+            monotonic.return_value = 100
+            self.assertRaises(UpstreamError, transport.get, "http://ors/")
+            self.assertRaises(CircuitOpenError, transport.get, "http://ors/")
+            # The half-open trial fails with something other than a connection error
+            monotonic.return_value = 130
+            self.assertRaises(UpstreamError, transport.get, "http://ors/")
+            self.assertEqual(transport.breaker.state, "open")
+            monotonic.return_value = 160
+            self.assertEqual(transport.get("http://ors/").status_code, 200)
+        self.assertEqual(transport.breaker.state, "closed")
+        self.assertEqual(transport.counters()["rejected_by_breaker"], 1)
+
+
+class RouteLegSplitTests(TestCase):
+
+    def test_legs_are_cut_at_way_points(self):
+        geometry = [[round(-96.8 - i * 0.1, 5), 32.78 + (i % 2) * 0.01] for i in range(8)]
+        data = {"routes": [{
+            "summary": {"distance": 3000.0, "duration": 180.0},
+            "geometry": polyline.encode([(lat, lng) for lng, lat in geometry]),
+            "segments": [{"distance": 1000.0, "duration": 50.0}, {"distance": 2000.0, "duration": 130.0}],
+            "way_points": [0, 3, 7],
+        }]}
+        transport = mock.Mock(**{"post.return_value.json.return_value": data})
+        waypoints = [geometry[0], geometry[3], geometry[7]]
+        with mock.patch("trip_api.ors_client.get_transport", return_value=transport):
+            route = ors_client.get_route(waypoints, split_legs=True)
+
+        self.assertEqual(transport.post.call_args.kwargs["json"]["coordinates"], waypoints)
+        self.assertEqual(route["distance_meters"], 3000.0)
+        self.assertEqual(route["geometry"], geometry)
+        first, second = route["legs"]
+        # Adjacent legs share the waypoint vertex
+        self.assertEqual(first["geometry"], geometry[0:4])
+        self.assertEqual(second["geometry"], geometry[3:8])
+        self.assertEqual((first["distance_meters"], first["duration_seconds"]), (1000.0, 50.0))
+        self.assertEqual((second["distance_meters"], second["duration_seconds"]), (2000.0, 130.0))
+
+    def test_asks_for_the_segments_legs_are_split_by(self):
+        waypoints = [[-96.8, 32.78], [-97.74, 30.27], [-95.37, 29.76]]
+        _, kwargs = ors_client._route_request(waypoints)
+        self.assertTrue(kwargs["json"]["instructions"])
+
+        # The stand-in answers like ORS: no segments without instructions
+        status, data = ors_stub.synthetic_directions({"coordinates": waypoints, "instructions": False})
+        self.assertEqual(status, 200)
+        self.assertNotIn("segments", data["routes"][0])
+        _, data = ors_stub.synthetic_directions({"coordinates": waypoints, "instructions": True})
+        self.assertEqual(len(data["routes"][0]["segments"]), 2)
+
+    def test_missing_legs_are_an_upstream_error(self):
+        routes, waypoints, to_route = plan_legs(*(fake_geocode(place) for place in ("Dallas", "Houston", "Austin")))
+        route = {**fake_route(waypoints), "legs": []}
+        with self.assertRaisesMessage(UpstreamError, "Routing returned 0 legs, expected 2"):
+            assign_legs(routes, to_route, route)
+
+
+def ors_like_route(points=5000, seed=3):
+    """A winding route with ~30 m between vertices, at ORS's precision 5."""
+    rng = random.Random(seed)
+    heading = 0.0
+    lng, lat = -96.8, 32.78
+    route = []
+    for _ in range(points):
+        heading += rng.gauss(0, 0.15)
+        lng += 0.0003 * math.cos(heading)
+        lat += 0.0003 * math.sin(heading)
+        route.append((lat, lng))
+    return [[lng, lat] for lat, lng in polyline.decode(polyline.encode(route, 5), 5)]
+
+
+def segment_distance(point, a, b):
+    """Meters from point to the segment a-b, all [lng, lat]."""
+    kx = METERS_PER_DEGREE * math.cos(math.radians(point[1]))
+    px, py = (point[0] - a[0]) * kx, (point[1] - a[1]) * METERS_PER_DEGREE
+    dx, dy = (b[0] - a[0]) * kx, (b[1] - a[1]) * METERS_PER_DEGREE
+    length_sq = dx * dx + dy * dy
+    t = min(1, max(0, (px * dx + py * dy) / length_sq)) if length_sq else 0
+    return math.hypot(px - t * dx, py - t * dy)
+
+
+class GeometryTests(SimpleTestCase):
+
+    def test_simplify_stays_within_tolerance(self):
+        route = ors_like_route()
+        for tolerance in (5, 25, 100):
+            simplified = simplify(route, tolerance)
+            with self.subTest(tolerance=tolerance):
+                self.assertLess(len(simplified), len(route) / 2)
+                self.assertEqual((simplified[0], simplified[-1]), (route[0], route[-1]))
+                # Kept vertices are unchanged and in order; every dropped
+                # one is near the segment that replaced it
+                kept = [route.index(point) for point in simplified]
+                self.assertEqual(kept, sorted(kept))
+                worst = max(
+                    segment_distance(route[i], route[start], route[end])
+                    for start, end in zip(kept, kept[1:])
+                    for i in range(start + 1, end)
+                )
+                self.assertLessEqual(worst, 2 * tolerance)
+
+    def test_encodings_round_trip(self):
+        graph_route = RoadGraph.load(settings.ROAD_GRAPH_PATH).route([[-122.3321, 47.6062], [-80.1918, 25.7617]])
+        for route in (graph_route["geometry"], ors_like_route()):
+            for geometry_format in ("json", "polyline", "int32-delta"):
+                with self.subTest(geometry_format=geometry_format, vertices=len(route)):
+                    self.assertEqual(decode_geometry(encode_geometry(route, geometry_format), geometry_format), route)
+            # float32 keeps ~7 significant digits
+            decoded = decode_geometry(encode_geometry(route, "float32"), "float32")
+            self.assertLess(max(abs(a - b) for p, q in zip(decoded, route) for a, b in zip(p, q)), 1e-5)
+
+
+PLACES = {
+    "dallas": {"lat": 32.7767, "lng": -96.797},
+    "houston": {"lat": 29.7604, "lng": -95.3698},
+    "austin": {"lat": 30.2672, "lng": -97.7431},
+}
+
+
+def fake_geocode(address):
+    coord = PLACES.get(cache.normalize_address(address).split(" ")[0])
+    if coord is None:
+        raise ValueError(f"Address not found: {address}")
+    return coord
+
+
+def fake_route(waypoints, split_legs=False):
+    legs = [
+        {"distance_meters": 250 * MILES, "duration_seconds": 4.5 * HOURS, "geometry": [start, end]}
+        for start, end in zip(waypoints, waypoints[1:])
+    ]
+    return {
+        "distance_meters": sum(leg["distance_meters"] for leg in legs),
+        "duration_seconds": sum(leg["duration_seconds"] for leg in legs),
+        "geometry": waypoints,
+        "legs": legs,
+    }
+
+
+def trip(current, pickup, dropoff, cycle_used=10):
+    return {"currentLocation": current, "pickupLocation": pickup, "dropoffLocation": dropoff, "cycleUsed": cycle_used}
+
+
+@override_settings(BATCH_SIMULATION_PROCESSES=0)
+class TripPlanBatchTests(SimpleTestCase):
+
+    def post_batch(self, trips):
+        request = APIRequestFactory().post("/api/trip-plan/batch/", {"trips": trips}, format="json")
+        with mock.patch("trip_api.views.geocode_address", side_effect=fake_geocode) as geocode, \
+                mock.patch("trip_api.views.get_route", side_effect=fake_route) as route:
+            response = TripPlanBatchView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data, geocode, route
+
+    def test_deduplicates_and_isolates_failures(self):
+        data, geocode, route = self.post_batch([
+            trip("Dallas, TX", "Houston, TX", "Austin, TX"),
+            trip("dallas tx.", "HOUSTON,  TX", "Austin, TX"),
+            trip("Dallas, TX", "Nowhere", "Austin, TX"),
+            {"currentLocation": "Dallas, TX"},
+            trip("Dallas, TX", "Houston, TX", "Austin, TX", cycle_used="lots"),
+        ])
+        first, second, unknown, incomplete, bad_cycle = data["results"]
+        self.assertEqual(first, second)
+        self.assertTrue(first["eldLogs"])
+        self.assertEqual(unknown, {"error": "Address not found: Nowhere"})
+        self.assertIn("Trip needs", incomplete["error"])
+        self.assertEqual(bad_cycle, {"error": "cycleUsed must be a number"})
+
+        # Every distinct address and waypoint list went upstream once
+        self.assertEqual(geocode.call_count, 4)
+        route.assert_called_once()
+        stats = data["stats"]
+        self.assertEqual((stats["uniqueAddresses"], stats["uniqueRoutes"], stats["failed"]), (4, 1, 3))
+
+    def test_rejects_malformed_options(self):
+        for options in ({"detail": []}, {"detail": {}}, {"geometryFormat": ["json"]}, {"detail": "huge"}):
+            with self.subTest(options=options):
+                body = {"trips": [trip("Dallas, TX", "Houston, TX", "Austin, TX")], **options}
+                request = APIRequestFactory().post("/api/trip-plan/batch/", body, format="json")
+                response = TripPlanBatchView.as_view()(request)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("Unknown", response.data["error"])
+
+    def test_runs_on_the_batch_pool(self):
+        with mock.patch("trip_api.views.get_batch_executor", return_value=concurrency.get_executor()) as pool:
+            self.post_batch([trip("Dallas, TX", "Houston, TX", "Austin, TX")])
+        self.assertEqual(pool.call_count, 2)
+        self.assertIsNot(concurrency.get_batch_executor(), concurrency.get_executor())
+
+    @override_settings(BATCH_SIMULATION_PROCESSES=2)
+    def test_falls_back_inline_when_the_process_pool_cannot_start(self):
+        with mock.patch.object(concurrency, "_process_pool", None), \
+                mock.patch.object(concurrency, "_process_pool_unavailable", False), \
+                mock.patch("trip_api.concurrency.ProcessPoolExecutor", side_effect=OSError("no /dev/shm")) as pool:
+            with self.assertLogs("trip_api.concurrency", "WARNING"):
+                quotient, error = concurrency.map_in_processes(divmod, [(7, 2), (1, 0)])
+            self.assertEqual(quotient, (3, 1))
+            self.assertIsInstance(error, ZeroDivisionError)
+
+            # Later batches don't try again
+            data, _, _ = self.post_batch([trip("Dallas, TX", "Houston, TX", "Austin, TX")])
+            self.assertIn("eldLogs", data["results"][0])
+        pool.assert_called_once()
+
+
+class TripPlanViewTests(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def post_plan(self, body, path="/api/trip-plan/", **headers):
+        with mock.patch("trip_api.views.geocode_address", side_effect=fake_geocode), \
+                mock.patch("trip_api.views.get_route", side_effect=fake_route):
+            return self.client.post(path, body, content_type="application/json", headers=headers)
+
+    def test_server_timing_lists_the_stages(self):
+        response = self.post_plan(trip("Dallas, TX", "Houston, TX", "Austin, TX"))
+        self.assertEqual(response.status_code, 200)
+        entries = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(list(entries)[-1], "total")
+        for name in ("geocode", "route", "simulate", "build", "render"):
+            self.assertRegex(entries[name], r"^dur=\d+\.\d$")
+        # Lookup and store
+        self.assertRegex(entries["cache"], r'^dur=\d+\.\d;desc="2 calls"$')
+
+    def test_prometheus_output(self):
+        self.post_plan(trip("Dallas, TX", "Houston, TX", "Austin, TX"))
+        self.post_plan(trip("Dallas, TX", "Nowhere", "Austin, TX"))
+        response = self.client.get("/api/metrics/", {"format": "prometheus"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        lines = response.content.decode().splitlines()
+        for line in (
+            "# TYPE trip_api_stage_duration_seconds histogram",
+            'trip_api_stage_duration_seconds_bucket{stage="simulate",le="+Inf"} 1',
+            'trip_api_stage_duration_seconds_count{stage="simulate"} 1',
+            'trip_api_request_duration_seconds_count{endpoint="TripPlanView"} 2',
+            'trip_api_request_errors_total{endpoint="TripPlanView"} 1',
+        ):
+            self.assertIn(line, lines)
+        # Every sample is `name{labels} value`, buckets cumulative
+        buckets = []
+        for line in lines:
+            if not line.startswith("#"):
+                sample, value = line.rsplit(" ", 1)
+                float(value)
+                if sample.startswith('trip_api_request_duration_seconds_bucket{endpoint="TripPlanView"'):
+                    buckets.append(int(value))
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 2)
+        # Cache counters run for the life of the process
+        self.assertRegex(response.content.decode(), r'\ntrip_api_cache_misses_total\{cache="plan"\} [1-9]')
+
+    @override_settings(COMPRESSION_MIN_BYTES=0)
+    def test_revalidation_sends_the_validator_of_the_200(self):
+        body = trip("Dallas, TX", "Houston, TX", "Austin, TX")
+        first = self.post_plan(body, accept_encoding="gzip")
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        etag = first["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        for tag in (etag, etag.removeprefix("W/"), f'"stale", {etag}'):
+            response = self.post_plan(body, accept_encoding="gzip", if_none_match=tag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+            self.assertIn("Accept-Encoding", response["Vary"])
+            self.assertEqual(response.content, b"")
+
+        # Uncompressed, the 200 still sends the same validator
+        self.assertEqual(self.post_plan(body)["ETag"], etag)
+
+    def test_mismatched_etag_gets_the_plan(self):
+        body = trip("Dallas, TX", "Houston, TX", "Austin, TX")
+        etag = self.post_plan(body)["ETag"]
+        response = self.post_plan(body, if_none_match='W/"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], etag)
+        self.assertTrue(json.loads(response.content)["eldLogs"])
+
+    def test_stream_matches_the_plan(self):
+        # Near the 70 hour limit, so a restart spreads the trip over days
+        body = trip("Dallas, TX", "Houston, TX", "Austin, TX", cycle_used=65)
+        with mock.patch("trip_api.views.plan_start_time", return_value=datetime(2025, 3, 3, 6, 30)):
+            plan = json.loads(self.post_plan(body).content)
+            response = self.post_plan({**body, "stream": True})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertNotIn("ETag", response)
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+        days = len(plan["eldLogs"])
+        self.assertGreater(days, 1)
+        self.assertEqual([record.pop("type") for record in records], ["summary", "legs"] + ["day"] * days + ["end"])
+        summary, legs, *day_records, end = records
+        self.assertEqual(summary["geocoded"], plan["geocoded"])
+        self.assertEqual({**summary["routeMap"], **legs}, plan["routeMap"])
+        self.assertEqual([record["day"] for record in day_records], plan["eldLogs"])
+        self.assertEqual(end, {"days": days})
+
+
+@skipUnless(urls.TripPlanAsyncView, "aiohttp is required for the async endpoint")
+@override_settings(PLAN_CACHE_GRANULARITY_MINUTES=0)
+class TripPlanAsyncViewTests(SimpleTestCase):
+
+    def post_plan(self, body, **headers):
+        with mock.patch("trip_api.async_views.geocode", side_effect=fake_geocode), \
+                mock.patch("trip_api.async_views.route_legs", side_effect=fake_route):
+            return self.client.post("/api/trip-plan/async/", body, content_type="application/json", headers=headers)
+
+    def test_plan_and_revalidation(self):
+        body = trip("Dallas, TX", "Houston, TX", "Austin, TX")
+        with mock.patch("trip_api.async_views.plan_start_time", return_value=datetime(2025, 3, 3, 6, 30)):
+            response = self.post_plan(body)
+            self.assertEqual(response.status_code, 200)
+            plan = json.loads(response.content)
+            self.assertTrue(plan["eldLogs"])
+            self.assertIn("simulate", response["Server-Timing"])
+
+            revalidated = self.post_plan(body, if_none_match=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated["ETag"], response["ETag"])
+        self.assertIn("Accept-Encoding", revalidated["Vary"])
+        self.assertEqual(revalidated.content, b"")
+
+    def test_rejects_bad_json(self):
+        for body in ("{not json", "[1, 2]"):
+            response = self.post_plan(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(json.loads(response.content)["error"].startswith("Invalid JSON body"))
+
+        response = self.post_plan(trip("Dallas, TX", "Nowhere", "Austin, TX"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {"error": "Address not found: Nowhere"})
+
+    @override_settings(GEOCODING_BACKEND="local")
+    def test_first_local_geocode_loads_off_the_loop(self):
+        from . import async_views
+        loop_thread = []
+
+        def lookup(address):
+            loop_thread.append(threading.current_thread())
+            return (-96.8, 32.78)
+
+        async def geocode():
+            loaded.return_value = False
+            await async_views.geocode("Dallas, TX")
+            loaded.return_value = True
+            await async_views.geocode("Dallas, TX")
+            return threading.current_thread()
+
+        with mock.patch("trip_api.async_views.gazetteer_loaded") as loaded, \
+                mock.patch("trip_api.async_views.local_geocode", side_effect=lookup), \
+                mock.patch.object(async_views, "_local_geocode_async", async_views.sync_to_async(lookup, thread_sensitive=False)):
+            loop = async_to_sync(geocode)()
+        self.assertNotEqual(loop_thread[0], loop)
+        self.assertEqual(loop_thread[1], loop)
+
+    def test_session_failure_leaves_the_breaker_alone(self):
+        from .async_transport import AsyncTransport
+        transport = AsyncTransport(pool_size=2, **transport_options())
+        for _ in range(transport.breaker.threshold):
+            transport.breaker.record_failure()
+        transport.breaker._opened_at -= transport.breaker.cooldown
+        with mock.patch.object(transport, "_session", side_effect=RuntimeError("no loop")):
+            with self.assertRaises(RuntimeError):
+                async_to_sync(transport.get)("http://127.0.0.1:1/")
+        self.assertEqual(transport.counters()["requests"], 0)
+        # The half-open probe is still there for the next call
+        self.assertTrue(transport.breaker.allow())
+
+
+@contextmanager
+def ors_stand_in(**options):
+    """A manage.py ors_stub server on a free port, yielding (server, base URL)."""
+    server = ors_stub.StubServer(("127.0.0.1", 0), **options)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class OrsStubTests(SimpleTestCase):
+
+    def setUp(self):
+        # A transport of its own, so injected errors can't open the shared breaker
+        transport = Transport(pool_size=2, **{**transport_options(), "max_retries": 0})
+        patcher = mock.patch("trip_api.ors_client.get_transport", return_value=transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def plan_upstream(self, base_url):
+        """What ors_client makes of the stand-in at base_url for one trip."""
+        with override_settings(ORS_BASE_URL=base_url):
+            points = [ors_client._fetch_geocode(address) for address in ("Dallas, TX", "Houston, TX", "Austin, TX")]
+            waypoints = [[point["lng"], point["lat"]] for point in points]
+            route = ors_client._route_result(ors_client._fetch_route(waypoints), split_legs=True)
+        return points, waypoints, route
+
+    def test_synthetic_answers_have_the_ors_shape(self):
+        with ors_stand_in() as (server, base_url):
+            points, waypoints, route = self.plan_upstream(base_url)
+            self.assertEqual(self.plan_upstream(base_url), (points, waypoints, route))
+        for point in points:
+            self.assertTrue(30 <= point["lat"] <= 45 and -120 <= point["lng"] <= -75)
+
+        first, second = route["legs"]
+        self.assertAlmostEqual(first["distance_meters"] + second["distance_meters"], route["distance_meters"], delta=1)
+        self.assertEqual(first["geometry"][-1], second["geometry"][0])
+        # Legs run between the waypoints, at the polyline's precision
+        for leg, ends in zip(route["legs"], zip(waypoints, waypoints[1:])):
+            for vertex, waypoint in zip((leg["geometry"][0], leg["geometry"][-1]), ends):
+                self.assertLess(max(abs(a - b) for a, b in zip(vertex, waypoint)), 1e-5)
+        self.assertEqual(server.counters["synthetic"], 8)
+
+    def test_record_and_replay_round_trip(self):
+        directory = tempfile.TemporaryDirectory(prefix="ors_fixtures_")
+        self.addCleanup(directory.cleanup)
+        fixtures = directory.name
+        with ors_stand_in() as (_, upstream), \
+                ors_stand_in(fixtures=fixtures, record=True, upstream=upstream) as (recorder, base_url):
+            recorded = self.plan_upstream(base_url)
+        self.assertEqual(recorder.counters["recorded"], 4)
+        saved = [json.loads(path.read_text()) for path in Path(fixtures).glob("*.json")]
+        self.assertEqual(len(saved), 4)
+        # Credentials are never written out
+        self.assertTrue(all(name != "api_key" for fixture in saved for name, _ in fixture["request"]["params"]))
+
+        with ors_stand_in(fixtures=fixtures) as (replayer, base_url):
+            self.assertEqual(self.plan_upstream(base_url), recorded)
+            self.assertEqual(replayer.counters["replayed"], 4)
+            # Without --fallback an unrecorded request is a 404
+            with override_settings(ORS_BASE_URL=base_url), self.assertRaises(ValueError):
+                ors_client._fetch_geocode("Nowhere, TX")
+
+    def test_fixture_key_ignores_credentials_and_key_order(self):
+        key = ors_stub.fixture_key("POST", ors_stub.DIRECTIONS_PATH, [("api_key", "a")], {"a": 1, "b": [1, 2]})
+        self.assertEqual(key, ors_stub.fixture_key("POST", ors_stub.DIRECTIONS_PATH, [("api_key", "b")],
+                                                   {"b": [1, 2], "a": 1}))
+        self.assertNotEqual(key, ors_stub.fixture_key("POST", ors_stub.DIRECTIONS_PATH, [], {"a": 1, "b": [2, 1]}))
+        self.assertNotEqual(key, ors_stub.fixture_key("GET", ors_stub.DIRECTIONS_PATH, [], {"a": 1, "b": [1, 2]}))
+
+    def test_injected_errors(self):
+        with ors_stand_in(error_rate=1.0, error_status=503, seed=1) as (server, base_url):
+            with override_settings(ORS_BASE_URL=base_url), \
+                    self.assertRaisesMessage(UpstreamError, "Routing service error (HTTP 503)"):
+                ors_client._fetch_geocode("Dallas, TX")
+            # The counters endpoint is never failed
+            stats = requests.get(base_url + "/__stats", timeout=5).json()
+        self.assertEqual((stats["requests"], stats["injected_errors"]), (1, 1))
+
+
+class RunConcurrentlyTests(SimpleTestCase):
+
+    def setUp(self):
+        self.executor = concurrency.ThreadPoolExecutor(max_workers=2)
+        self.release = threading.Event()
+        # Unblock stragglers before the pool is shut down
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def slow(self):
+        self.release.wait(5)
+        return "slow"
+
+    def test_results_keep_the_call_order(self):
+        calls = [(divmod, (7, 2)), (max, (1, 5)), (str.upper, ("ors",))]
+        self.assertEqual(concurrency.run_concurrently(calls, executor=self.executor), [(3, 1), 5, "ORS"])
+
+    def test_slow_calls_time_out(self):
+        started = time.monotonic()
+        with self.assertRaisesMessage(TimeoutError, "slow timed out after 0.05s"):
+            concurrency.run_concurrently([(self.slow, ()), (abs, (-1,))], timeout=0.05, executor=self.executor)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_first_failure_is_raised_and_the_rest_discarded(self):
+        started = time.monotonic()
+        with self.assertRaises(ZeroDivisionError):
+            concurrency.run_concurrently([(self.slow, ()), (divmod, (1, 0))], timeout=5, executor=self.executor)
+        # Raised as soon as it happened, not after the slow call finished
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_return_exceptions_keeps_every_result(self):
+        results = concurrency.run_concurrently(
+            [(divmod, (1, 0)), (self.slow, ()), (abs, (-1,))],
+            timeout=0.05, return_exceptions=True, executor=self.executor,
+        )
+        self.assertIsInstance(results[0], ZeroDivisionError)
+        self.assertIsInstance(results[1], TimeoutError)
+        self.assertEqual(results[2], 1)
+
+    def test_pool_threads_close_their_connections(self):
+        with mock.patch("trip_api.concurrency.connections") as connections:
+            concurrency.run_concurrently([(abs, (-1,)), (divmod, (1, 0))], return_exceptions=True,
+                                         executor=self.executor)
+        self.assertEqual(connections.close_all.call_count, 2)
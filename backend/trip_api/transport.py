@@ -0,0 +1,280 @@
+"""
+Shared HTTP transport for the ORS client.
+
+One keep-alive requests.Session per worker process, with connect/read
+timeouts, bounded retries with jittered exponential backoff on 429/5xx and
+a circuit breaker that fails fast while ORS is down. stats() reports pool,
+retry and breaker counters for tuning under load. prewarm() opens the
+first connection ahead of the first request (ORS_PREWARM).
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """ORS could not be reached or kept failing after all retries."""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without a network call while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. While open every call is
+    rejected until `cooldown` seconds pass, then a single trial call is let
+    through (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    self.times_opened += 1
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class BaseTransport:
+    """
+    Retry, backoff, breaker and counter bookkeeping shared by the blocking
+    Transport and async_transport.AsyncTransport.
+    """
+
+    def __init__(self, pool_size, connect_timeout, read_timeout, max_retries,
+                 backoff_base, backoff_max, breaker_threshold, breaker_cooldown):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "rejected_by_breaker": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backoff(self, attempt, response=None):
+        # Honour Retry-After on 429 when ORS sends one, otherwise full jitter
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return min(float(response.headers["Retry-After"]), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _start(self):
+        if not self.breaker.allow():
+            self._count("rejected_by_breaker")
+            raise CircuitOpenError("Routing service temporarily unavailable")
+        self._count("requests")
+
+    def _start_attempt(self, attempt):
+        if attempt:
+            self._count("retries")
+        self._count("attempts")
+
+    def _succeeded(self, response):
+        """True (and the breaker is told) unless the response is retryable."""
+        if response.status_code in RETRY_STATUSES:
+            return False
+        self.breaker.record_success()
+        return True
+
+    def _give_up(self, response, error):
+        self._count("failures")
+        if response is not None and response.status_code == 429:
+            # Rate limited: ORS is up, so don't trip the breaker
+            self.breaker.record_success()
+            raise UpstreamError("Routing service rate limit exceeded")
+
+        self.breaker.record_failure()
+        if error is not None:
+            raise UpstreamError(f"Routing service unreachable: {error}") from error
+        raise UpstreamError(f"Routing service error (HTTP {response.status_code})")
+
+    def counters(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "breaker_state": self.breaker.state,
+            "breaker_times_opened": self.breaker.times_opened,
+            "pool_size": self.pool_size,
+        }
+
+
+class Transport(BaseTransport):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = (self.connect_timeout, self.read_timeout)
+
+        # Retries are handled here (not by urllib3) so they can be counted
+        # and fed to the breaker.
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends the request and returns the response. 4xx responses other than
+        429 are returned as-is for the caller to interpret; exhausted retries
+        raise UpstreamError and an open breaker raises CircuitOpenError.
+        """
+        self._start()
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            self._start_attempt(attempt)
+
+            response = None
+            error = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as exc:
+                # Not just ConnectionError and Timeout: a broken chunked body
+                # or a redirect loop must reach the breaker too, or a failed
+                # half-open trial would leave it rejecting calls for good
+                error = exc
+            else:
+                if self._succeeded(response):
+                    return response
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+
+        self._give_up(response, error)
+
+    def warm_up(self, url):
+        """
+        Connects to url's host and leaves the connection in the keep-alive
+        pool. Bypasses retries, breaker and counters: it isn't an ORS call.
+        """
+        started = time.perf_counter()
+        try:
+            self.session.get(url, timeout=self.timeout).close()
+        except requests.RequestException as exc:
+            logger.warning("ORS pre-warm of %s failed: %s", url, exc)
+            return
+        logger.info("Pre-warmed ORS connection to %s in %.2fs", url, time.perf_counter() - started)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        pools = []
+        for key in self.adapter.poolmanager.pools.keys():
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            # urllib3 pre-fills the queue with None placeholders
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            pools.append({
+                "host": f"{key.key_scheme}://{key.key_host}:{key.key_port}",
+                "idle_connections": idle,
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+            })
+
+        return {**self.counters(), "pools": pools}
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    # Built on first use so each forked worker gets its own connection pool
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport(pool_size=settings.ORS_POOL_SIZE, **transport_options())
+        return _transport
+
+
+def prewarm():
+    """Opens the ORS connection on a background thread; returns the thread."""
+    thread = threading.Thread(
+        target=get_transport().warm_up, args=(settings.ORS_BASE_URL + "/",),
+        name="ors-prewarm", daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def transport_options():
+    """Timeouts, retry and breaker settings common to both transports."""
+    return {
+        "connect_timeout": settings.ORS_CONNECT_TIMEOUT_SECONDS,
+        "read_timeout": settings.ORS_READ_TIMEOUT_SECONDS,
+        "max_retries": settings.ORS_MAX_RETRIES,
+        "backoff_base": settings.ORS_BACKOFF_BASE_SECONDS,
+        "backoff_max": settings.ORS_BACKOFF_MAX_SECONDS,
+        "breaker_threshold": settings.ORS_BREAKER_THRESHOLD,
+        "breaker_cooldown": settings.ORS_BREAKER_COOLDOWN_SECONDS,
+    }
+
+
+def stats():
+    return get_transport().stats()
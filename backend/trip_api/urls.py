@@ -1,6 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from .views import TripPlanView
+from django.views.decorators.csrf import csrf_exempt
+from .views import MetricsView, TripPlanBatchView, TripPlanView, TripReplanView
+
+TripPlanAsyncView = None
+if settings.TRIP_PLAN_ASYNC_ENDPOINT:
+    try:
+        from .async_views import TripPlanAsyncView
+    except ImportError:  # aiohttp not installed, see requirements-async.txt
+        pass
 
 urlpatterns = [
     path("trip-plan/", TripPlanView.as_view()),
-]
\ No newline at end of file
+    path("trip-plan/batch/", TripPlanBatchView.as_view()),
+    path("trip-plan/replan/", TripReplanView.as_view()),
+    path("metrics/", MetricsView.as_view()),
+]
+
+if TripPlanAsyncView is not None:
+    # Exempt like the DRF views, which don't use session auth either
+    urlpatterns.append(path("trip-plan/async/", csrf_exempt(TripPlanAsyncView.as_view())))
@@ -1,90 +1,291 @@
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 
-from .ors_client import geocode_address, get_route
-from .eld_logs import generate_daily_logs
-from .eld_logs import generate_eld_sheets
+from .geocoding import geocode_address
+from .routing import get_route
+from .cache import get_plan, normalize_address, plan_etag, plan_key, route_key, set_plan
+from .concurrency import get_batch_executor, map_in_processes, run_concurrently
+from .metrics import PrometheusRenderer, ServerTimingMixin, snapshot, stage
+from .planner import (
+    assign_legs, build_plan, coords_are_same, plan_legs, plan_records, plan_start_time, replan,
+    simulation_args, simulation_block, validate_options,
+)
+from .renderers import PlanJSONRenderer, dumps
+from .eld_logs import generate_eld_sheets, iter_eld_sheets
 
-from datetime import datetime
+import time
 
-class TripPlanView(APIView):
+from django.http import StreamingHttpResponse
+from django.utils.cache import parse_etags, quote_etag
+
+def etag_matches(if_none_match, etag):
+    """Weak If-None-Match comparison against an unquoted etag, as for GET (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    tags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+    return "*" in tags or quote_etag(etag) in tags
+
+
+def etag_header(etag):
+    """
+    The ETag a plan response carries, weak from the start: a compressed 200
+    has to send a weak one (see CompressionMiddleware), and a 304 must send
+    the same validator as the 200 it stands for.
+    """
+    return "W/" + quote_etag(etag)
+
+
+class TripPlanView(ServerTimingMixin, APIView):
+    renderer_classes = [PlanJSONRenderer, BrowsableAPIRenderer]
 
     # Helper to check if two coordinates are very close
     def coords_are_same(self, c1, c2):
-        return abs(c1["lat"] - c2["lat"]) < 0.0001 and abs(c1["lng"] - c2["lng"]) < 0.0001
+        return coords_are_same(c1, c2)
+
+    # Plans carry an ETag; a matching If-None-Match gets an empty 304
+    def plan_response(self, request, plan, etag):
+        headers = {"ETag": etag_header(etag)}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            # Vary as on the 200, which CompressionMiddleware adds
+            headers["Vary"] = "Accept-Encoding"
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(plan, status=status.HTTP_200_OK, headers=headers)
+
+    # One JSON document per line, flushed as each record is produced
+    def stream_response(self, records):
+        response = StreamingHttpResponse(
+            (dumps(record) + b"\n" for record in records),
+            content_type="application/x-ndjson",
+        )
+        # Keep nginx from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
 
     def post(self, request):
         current = request.data.get("currentLocation")
         pickup = request.data.get("pickupLocation")
         dropoff = request.data.get("dropoffLocation")
         cycle_used = request.data.get("cycleUsed")
+        # Map detail level for leg geometries, see geometry.DETAIL_TOLERANCES
+        detail = request.data.get("detail", settings.ROUTE_DEFAULT_DETAIL)
+        # Leg geometry wire format, see geometry.GEOMETRY_FORMATS. Not called
+        # "format" because DRF reserves that for renderer selection.
+        geometry_format = request.data.get("geometryFormat", "json")
+        # Opt-in NDJSON response, see planner.plan_records. Streams skip the
+        # plan cache and ETags since the plan is never held whole.
+        stream = str(request.data.get("stream", "")).lower() in ("1", "true")
 
         try:
-            #  Geocode all 3 locations
-            current_c = geocode_address(current)
-            pickup_c = geocode_address(pickup)
-            dropoff_c = geocode_address(dropoff)
-
-            #  ROUTE LEG 1: current -> pickup
-            if self.coords_are_same(current_c, pickup_c):
-                route1 = {
-                    "distance_meters": 0,
-                    "duration_seconds": 0,
-                    "geometry": [[current_c["lng"], current_c["lat"]]]
-                }
-            else:
-                route1 = get_route([
-                    [current_c["lng"], current_c["lat"]],
-                    [pickup_c["lng"], pickup_c["lat"]],
-                ])
+            validate_options(detail, geometry_format)
+            cycle_used = float(request.data.get("cycleUsed", 0))
+            start_time = plan_start_time()
+
+            # Resubmitted inputs are answered without any upstream or
+            # simulation work
+            caching = bool(settings.PLAN_CACHE_GRANULARITY_MINUTES) and not stream
+            if caching:
+                key, inputs = plan_key(current, pickup, dropoff, cycle_used, start_time, detail, geometry_format)
+                with stage("cache"):
+                    cached = get_plan(key)
+                if cached is not None:
+                    return self.plan_response(request, *cached)
 
-            #  ROUTE LEG 2: pickup -> dropoff
-            if self.coords_are_same(pickup_c, dropoff_c):
-                route2 = {
-                    "distance_meters": 0,
-                    "duration_seconds": 0,
-                    "geometry": [[pickup_c["lng"], pickup_c["lat"]]]
-                }
-            else:
-                route2 = get_route([
-                    [pickup_c["lng"], pickup_c["lat"]],
-                    [dropoff_c["lng"], dropoff_c["lat"]],
+            #  Geocode all 3 locations concurrently
+            with stage("geocode"):
+                current_c, pickup_c, dropoff_c = run_concurrently([
+                    (geocode_address, (current,)),
+                    (geocode_address, (pickup,)),
+                    (geocode_address, (dropoff,)),
                 ])
 
-            #  Combine legs
-            total_distance = route1["distance_meters"] + route2["distance_meters"]
-            total_duration = route1["duration_seconds"] + route2["duration_seconds"]
-            combined_geometry = route1["geometry"] + route2["geometry"]
+            # Both legs come back from a single multi-waypoint directions call
+            routes, waypoints, to_route = plan_legs(current_c, pickup_c, dropoff_c)
+            if to_route:
+                with stage("route"):
+                    assign_legs(routes, to_route, get_route(waypoints, split_legs=True))
+            route1, route2 = routes
 
-            # Inside TripPlanView.post, after total_distance and total_duration
-            cycle_used = float(request.data.get("cycleUsed", 0))
-            start_time = datetime.now()
+            if stream:
+                # Days are simulated and bucketed as the client reads them
+                days = iter_eld_sheets(*simulation_args(route1, route2, cycle_used, start_time))
+                return self.stream_response(plan_records(
+                    (current_c, pickup_c, dropoff_c), route1, route2, days, detail, geometry_format,
+                ))
 
-            eld_logs = generate_eld_sheets(
-                total_distance, 
-                total_duration, 
-                cycle_used, 
-                start_time=start_time,
-                route_geometry=combined_geometry
-            )
+            with stage("simulate"):
+                eld_logs = generate_eld_sheets(*simulation_args(route1, route2, cycle_used, start_time))
 
             #  Return response
-            return Response({
-                "routeMap": {
-                    "leg1": route1["geometry"],  # current -> pickup
-                    "leg2": route2["geometry"],  # pickup -> dropoff
-                    "distanceMiles": round(total_distance / 1609.34, 2),
-                    "durationHours": round(total_duration / 3600, 2),
-                    # "polyline": combined_geometry,
-                },
-                "geocoded": {
-                    "current": current_c,
-                    "pickup": pickup_c,
-                    "dropoff": dropoff_c
-                },
-                "eldLogs": eld_logs
-            }, status=status.HTTP_200_OK)
+            with stage("build"):
+                plan = build_plan(
+                    (current_c, pickup_c, dropoff_c), route1, route2, eld_logs, detail, geometry_format,
+                    simulation_block(route1, route2, cycle_used, start_time),
+                )
+                etag = plan_etag(plan)
+            if caching:
+                with stage("cache"):
+                    set_plan(key, inputs, plan, etag)
+            return self.plan_response(request, plan, etag)
 
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TripPlanBatchView(ServerTimingMixin, APIView):
+    """
+    Plans many trips in one request: {"trips": [{currentLocation, ...}, ...]}
+    plus optional batch-wide "detail" and "geometryFormat".
+
+    Identical addresses (after normalization) and identical waypoint lists
+    are resolved once for the whole batch, the unique upstream calls fan out
+    over the batch thread pool (apart from the one interactive plans use)
+    and the HOS simulations run on the process pool. Each entry of
+    "results" is either a plan or {"error": ...}.
+    """
+    renderer_classes = [PlanJSONRenderer, BrowsableAPIRenderer]
+
+    def post(self, request):
+        trips = request.data.get("trips")
+        detail = request.data.get("detail", settings.ROUTE_DEFAULT_DETAIL)
+        geometry_format = request.data.get("geometryFormat", "json")
+
+        try:
+            validate_options(detail, geometry_format)
+            if not isinstance(trips, list) or not trips:
+                raise ValueError("trips must be a non-empty list")
+            if len(trips) > settings.BATCH_MAX_TRIPS:
+                raise ValueError(f"At most {settings.BATCH_MAX_TRIPS} trips per batch")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        started = time.perf_counter()
+        results = [None] * len(trips)
+        fields = ("currentLocation", "pickupLocation", "dropoffLocation")
+
+        #  Geocode every distinct address once
+        addresses = {}
+        for i, trip in enumerate(trips):
+            if not isinstance(trip, dict) or not all(trip.get(f) for f in fields):
+                results[i] = {"error": f"Trip needs {', '.join(fields)}"}
+                continue
+            for field in fields:
+                addresses.setdefault(normalize_address(trip[field]), trip[field])
+
+        with stage("geocode"):
+            geocoded = dict(zip(addresses, run_concurrently(
+                [(geocode_address, (address,)) for address in addresses.values()],
+                timeout=settings.BATCH_TIMEOUT_SECONDS,
+                return_exceptions=True,
+                executor=get_batch_executor(),
+            )))
+
+        #  Route every distinct waypoint list once
+        plans = {}
+        unique_routes = {}
+        for i, trip in enumerate(trips):
+            if results[i] is not None:
+                continue
+            points = [geocoded[normalize_address(trip[f])] for f in fields]
+            failed = next((p for p in points if isinstance(p, Exception)), None)
+            if failed is not None:
+                results[i] = {"error": str(failed)}
+                continue
+            routes, waypoints, to_route = plan_legs(*points)
+            key = route_key(waypoints)[0] if to_route else None
+            if key is not None:
+                unique_routes.setdefault(key, waypoints)
+            plans[i] = (points, routes, to_route, key)
+
+        route_keys = list(unique_routes)
+        with stage("route"):
+            fetched = dict(zip(route_keys, run_concurrently(
+                [(get_route, (unique_routes[key], True)) for key in route_keys],
+                timeout=settings.BATCH_TIMEOUT_SECONDS,
+                return_exceptions=True,
+                executor=get_batch_executor(),
+            )))
+
+        #  Simulate the remaining trips in parallel
+        start_time = plan_start_time()
+        to_simulate = []
+        sim_args = []
+        cycles = {}
+        for i, (points, routes, to_route, key) in plans.items():
+            if key is not None:
+                route = fetched[key]
+                if isinstance(route, Exception):
+                    results[i] = {"error": str(route)}
+                    continue
+                assign_legs(routes, to_route, route)
+            try:
+                cycle_used = float(trips[i].get("cycleUsed", 0))
+            except (TypeError, ValueError):
+                results[i] = {"error": "cycleUsed must be a number"}
+                continue
+            to_simulate.append(i)
+            sim_args.append(simulation_args(routes[0], routes[1], cycle_used, start_time))
+            cycles[i] = cycle_used
+
+        with stage("simulate"):
+            eld_results = map_in_processes(generate_eld_sheets, sim_args)
+
+        with stage("build"):
+            for i, eld_logs in zip(to_simulate, eld_results):
+                if isinstance(eld_logs, Exception):
+                    results[i] = {"error": str(eld_logs)}
+                    continue
+                points, routes, _, _ = plans[i]
+                try:
+                    results[i] = build_plan(
+                        points, routes[0], routes[1], eld_logs, detail, geometry_format,
+                        simulation_block(routes[0], routes[1], cycles[i], start_time),
+                    )
+                except Exception as e:
+                    results[i] = {"error": str(e)}
+
+        elapsed = time.perf_counter() - started
+        return Response({
+            "results": results,
+            "stats": {
+                "trips": len(trips),
+                "failed": sum(1 for r in results if "error" in r),
+                "uniqueAddresses": len(addresses),
+                "uniqueRoutes": len(unique_routes),
+                "seconds": round(elapsed, 3),
+                "tripsPerSecond": round(len(trips) / elapsed, 2) if elapsed > 0 else None,
+            },
+        }, status=status.HTTP_200_OK)
+
+
+class TripReplanView(ServerTimingMixin, APIView):
+    """
+    Re-plans a trip already under way: {"plan": a trip-plan response,
+    "update": {"elapsedMiles", "at", "delayMinutes"}}, see planner.replan.
+    No geocoding or routing; the returned plan takes further updates the
+    same way.
+    """
+    renderer_classes = [PlanJSONRenderer, BrowsableAPIRenderer]
+
+    def post(self, request):
+        try:
+            with stage("replan"):
+                plan = replan(request.data.get("plan"), request.data.get("update"))
+        # Overflow: times or durations past what datetime can represent
+        except (ValueError, OverflowError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(plan, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    Per-process stage and endpoint latency histograms (with p50/p90/p99),
+    ORS transport counters and cache hit ratios. JSON by default,
+    ?format=prometheus for a scraper.
+    """
+    renderer_classes = [JSONRenderer, PrometheusRenderer]
+
+    def get(self, request):
+        return Response(snapshot(), status=status.HTTP_200_OK)